@@ -14,6 +14,9 @@ class PySysTest(TenNetworkTest):
         network = self.get_network_connection()
         for fn in Properties().accounts(): self.reset(fn.__name__, *network.connect(self, fn(), check_funds=False))
 
+        self.log.info("")
+        self.log.info('Compacted %d historic nonce entries', self.nonce_db.compact(self.env))
+
     def reset(self, name, web3, account):
         self.log.info("")
         self.log.info("Resetting persistence for  %s:", name, extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
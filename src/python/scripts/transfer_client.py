@@ -0,0 +1,70 @@
+# Utility script for a funded client to transfer funds to a set of random recipients, either bulk loading all
+# transactions into the network at once, or offering them at a constant rate. Used by the throughput tests that run
+# external concurrent clients. The receipt block timestamp of each transaction is written to <client_name>.log, and
+# the per transaction timings to <client_name>.samples. Note that it is assumed the client / account has been
+# registered outside the scope of this script (e.g. for use against Ten)
+#
+from web3 import Web3
+import secrets
+import logging, argparse, sys
+from ten.test.load.arrivals import Bulk, Constant
+from ten.test.load.builders import TransferBuilder
+from ten.test.load.generator import LoadGenerator
+
+logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', stream=sys.stdout, level=logging.INFO)
+
+
+def run(name, url, chainId, web3, account, num_accounts, num_iterations, amount, gas_limit, rate):
+    """Offer transfers to the network in bulk or at a constant rate, waiting for their receipts, and collate results.
+
+    Every transaction may be in flight at once so that none are dropped. In bulk they are sent from a single thread
+    so that they arrive in nonce order.
+    """
+    accounts = [Web3().eth.account.from_key(x).address for x in [secrets.token_hex() for y in range(0, num_accounts)]]
+    gas_price = web3.eth.gas_price
+    builder = TransferBuilder(account, 0, chainId, gas_price, gas_limit, accounts, amount)
+    if rate > 0:
+        logging.info('Offering %d transactions at %d per second', num_iterations, rate)
+        generator = LoadGenerator(url, builder, Constant(rate), max_in_flight=num_iterations, timeout=600)
+    else:
+        logging.info('Bulk loading %d transactions', num_iterations)
+        generator = LoadGenerator(url, builder, Bulk(), max_in_flight=num_iterations, timeout=600, workers=1)
+
+    samples = generator.run(count=num_iterations)
+    failures = len([sample for sample in samples if sample.dropped or sample.error is not None])
+    logging.warning('Ratio failures = %.2f', float(failures) / len(samples))
+    summary = generator.summary()
+    logging.info('Achieved rate %.2f per second, latency mean %.3f, p50 %.3f, p99 %.3f',
+                 summary['achieved_rate'], summary['mean'], summary['p50'], summary['p99'])
+    logging.info('Dropped requests = %d, unconfirmed transactions = %d', summary['dropped'], summary['unconfirmed'])
+    generator.write('%s.samples' % name)
+
+    logging.info('Constructing binned data from the transaction receipts')
+    with open('%s.log' % name, 'w') as fp:
+        for sample in samples:
+            if sample.timestamp is not None: fp.write('%d %d\n' % (sample.index, int(sample.timestamp)))
+
+    logging.info('Client %s completed', name)
+    logging.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='transfer_client')
+    parser.add_argument('-u', '--network_http', help='Connection URL')
+    parser.add_argument('-c', '--chainId', help='The network chain Id')
+    parser.add_argument('-p', '--pk', help='The accounts private key')
+    parser.add_argument('-a', '--num_accounts', help='Number of accounts to send funds to')
+    parser.add_argument('-i', '--num_iterations', help='Number of iterations')
+    parser.add_argument('-n', '--client_name', help='The logical name of the client')
+    parser.add_argument('-x', '--amount', help='The amount to send in wei')
+    parser.add_argument('-y', '--gas_limit', help='The gas limit')
+    parser.add_argument('-r', '--rate', help='The rate of transactions per second, or 0 to bulk load', default=0)
+    args = parser.parse_args()
+
+    web3 = Web3(Web3.HTTPProvider(args.network_http))
+    account = web3.eth.account.from_key(args.pk)
+    name = args.client_name
+    logging.info('Starting client %s', name)
+
+    run(name, args.network_http, int(args.chainId), web3, account, int(args.num_accounts), int(args.num_iterations),
+        int(args.amount), int(args.gas_limit), float(args.rate))
@@ -1,19 +1,29 @@
-import os, shutil, sys, json, requests
+import os, shutil, sys, json, requests, pkgutil, importlib, inspect
+import ten.test.contracts
+from concurrent.futures import ThreadPoolExecutor
 from collections import OrderedDict
 from web3 import Web3
 from pathlib import Path
-from eth_account import Account
-from eth_account.messages import encode_typed_data
 from pysys.constants import PROJECT, BACKGROUND
 from pysys.exceptions import AbortExecution
 from pysys.constants import LOG_TRACEBACK
 from pysys.utils.logutils import BaseLogFormatter
+from ten.test.persistence.database import Database
 from ten.test.persistence.nonce import NoncePersistence
 from ten.test.persistence.funds import FundsPersistence
 from ten.test.persistence.counts import CountsPersistence
 from ten.test.persistence.results import ResultsPersistence
 from ten.test.persistence.contract import ContractPersistence
+from ten.test.persistence.ephemeral import EphemeralPersistence
 from ten.test.utils.properties import Properties
+from ten.test.utils.accounts import AccountPool
+from ten.test.utils.compiler import CompilationCache
+from ten.test.contracts.default import DefaultContract
+from ten.test.networks.provider import ProviderFactory, BatchRequest
+from ten.test.networks.receipts import ReceiptTracker
+from ten.test.networks.costs import CostLedger
+from ten.test.networks.gateway import GatewayCache
+from ten.test.helpers.wallet_extension import WalletExtensionPool
 
 
 class TenRunnerPlugin():
@@ -57,7 +67,8 @@ class TenRunnerPlugin():
         if os.path.exists(runner.output): shutil.rmtree(runner.output)
         os.makedirs(runner.output)
 
-        # create the nonce db if it does not already exist, clean it out if using ganache
+        # create the persistence if it does not already exist, migrating from any legacy files, clean it out if
+        # using ganache
         db_dir = os.path.join(str(Path.home()), '.tentest')
         if not os.path.exists(db_dir): os.makedirs(db_dir)
         nonce_db = NoncePersistence(db_dir)
@@ -70,13 +81,23 @@ class TenRunnerPlugin():
         counts_db.create()
         results_db = ResultsPersistence(db_dir)
         results_db.create()
-
-        if self.is_ten() and runner.threads > 3:
-            raise Exception('Max threads against Ten cannot be greater than 3')
-        elif self.env == 'arbitrum.sepolia' and runner.threads > 1:
+        ephemeral_db = EphemeralPersistence(db_dir)
+        ephemeral_db.create()
+        ephemeral_db.reset_environment(self.env)
+        migrated = Database.get(db_dir).migrate()
+        if len(migrated) > 0: runner.log.info('Migrated persistence tables %s', ', '.join(migrated))
+        AccountPool.configure(db_dir, self.env, Properties().account_sets())
+
+        runner.addCleanupFunction(Database.close_all)
+        runner.addCleanupFunction(lambda: self.__print_compilation_stats(runner))
+        runner.addCleanupFunction(lambda: self.__print_connection_stats(runner))
+        runner.addCleanupFunction(lambda: self.__print_cost(runner))
+        runner.addCleanupFunction(NoncePersistence.flush_all)
+        runner.addCleanupFunction(ReceiptTracker.close_all)
+        self.__precompile_contracts(runner)
+
+        if self.env == 'arbitrum.sepolia' and runner.threads > 1:
             raise Exception('Max threads against Arbitrum cannot be greater than 1')
-        elif self.env == 'ganache' and runner.threads > 3:
-            raise Exception('Max threads against Ganache cannot be greater than 3')
         elif self.env == 'sepolia' and runner.threads > 1:
             raise Exception('Max threads against Sepolia cannot be greater than 1')
 
@@ -89,16 +110,15 @@ class TenRunnerPlugin():
                 account = Web3().eth.account.from_key(props.fundacntpk())
                 gateway_url = '%s:%d' % (props.host_http(self.env), props.port_http(self.env))
                 runner.log.info('Joining network using url %s', '%s/v1/join/' % gateway_url)
-                user_id = self.__join('%s/v1/join/' % gateway_url)
+                user_id = GatewayCache.join(gateway_url)
                 runner.log.info('User id is %s', user_id)
+                GatewayCache.prejoin(gateway_url, 2*runner.threads)
 
                 runner.log.info('Registering account %s with the network', account.address)
-                response = self.__register(account, '%s/v1/authenticate/?token=%s' % (gateway_url, user_id), user_id)
-                runner.log.info('Registration success was %s', response.ok)
-                web3 = Web3(Web3.HTTPProvider('%s/v1/?token=%s' % (gateway_url, user_id)))
-                runner.addCleanupFunction(lambda: self.__print_cost(runner,
-                                                                    '%s/v1/authenticate/?token=%s' % (gateway_url, user_id),
-                                                                    web3, user_id))
+                registered = self.__register(account, gateway_url, user_id)
+                runner.log.info('Registration success was %s', registered)
+                web3 = Web3(ProviderFactory.http_provider('%s/v1/?token=%s' % (gateway_url, user_id)))
+                runner.addCleanupFunction(lambda: self.__drain_ephemeral(runner, gateway_url, web3, user_id, db_dir))
 
                 tx_count = web3.eth.get_transaction_count(account.address)
                 balance = web3.from_wei(web3.eth.get_balance(account.address), 'ether')
@@ -107,39 +127,59 @@ class TenRunnerPlugin():
                     runner.log.info('Funded key tx count is zero ... clearing persistence')
                     nonce_db.delete_environment(self.env)
                     contracts_db.delete_environment(self.env)
+                    ephemeral_db.delete_environment(self.env)
 
                 if balance < 200 and not self.is_sepolia_ten():
                     runner.log.info('Funded key balance below threshold ... making faucet call')
                     self.fund_eth_from_faucet_server(runner)
                     self.fund_eth_from_faucet_server(runner)
 
+                self.__start_wallet_pool(runner)
+
                 runner.log.info('')
                 runner.log.info('Accounts with non-zero funds;')
-                for fn in Properties().accounts():
-                    account = web3.eth.account.from_key(fn())
-                    self.__register(account, '%s/v1/authenticate/?token=%s' % (gateway_url, user_id), user_id)
-                    self.balances[fn.__name__] = web3.from_wei(web3.eth.get_balance(account.address), 'ether')
-                    if self.balances[fn.__name__] > 0:
-                        runner.log.info("  Funds for %s: %.18f ETH", fn.__name__, self.balances[fn.__name__],
+                accounts = [(fn.__name__, web3.eth.account.from_key(fn())) for fn in Properties().accounts()]
+                accounts.extend([(name, web3.eth.account.from_key(pk)) for name, pk in AccountPool.generated()])
+                with ThreadPoolExecutor(max_workers=16) as executor:
+                    list(executor.map(lambda x: self.__register(x[1], gateway_url, user_id), accounts))
+                batch = BatchRequest('%s/v1/?token=%s' % (gateway_url, user_id))
+                for _, account in accounts:
+                    batch.get_balance(account.address)
+                    batch.get_transaction_count(account.address)
+                results = batch.execute()
+                balances, tx_counts = results[0::2], results[1::2]
+
+                for (name, account), balance in zip(accounts, balances):
+                    balance = self.__retry(runner, 'balance', name, balance,
+                                           lambda: web3.eth.get_balance(account.address))
+                    if balance is None: continue
+                    self.balances[name] = web3.from_wei(balance, 'ether')
+                    if self.balances[name] > 0:
+                        runner.log.info("  Funds for %s: %.18f ETH", name, self.balances[name],
                                         extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
 
                 runner.log.info('')
                 runner.log.info('Checking alignment of account nonce persistence;')
-                for fn in Properties().accounts():
-                    account = web3.eth.account.from_key(fn())
-                    persisted = nonce_db.get_latest_nonce(account.address, self.env)
-                    tx_count = web3.eth.get_transaction_count(account.address)
-                    if (persisted is not None) and (persisted != tx_count-1) > 0:
+                for (name, account), tx_count in zip(accounts, tx_counts):
+                    tx_count = self.__retry(runner, 'transaction count', name, tx_count,
+                                            lambda: web3.eth.get_transaction_count(account.address))
+                    if tx_count is None:
+                        runner.log.warn("  Skipping nonce recovery for %s", name,
+                                        extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+                        continue
+                    persisted = nonce_db.recover(account.address, self.env, tx_count)
+                    if (persisted is not None) and (persisted != tx_count-1):
                         # persisted is the last persisted nonce, tx_count is the number of txs for this account
                         # as nonces started at zero, 1 tx count should mean last persisted was zero (one less)
-                        runner.log.warn("  Resetting persistence for %s, persisted %d, count %d", fn.__name__,
+                        runner.log.warn("  Reset persistence for %s, persisted %d, count %d", name,
                                         persisted, tx_count, extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
-                        if (persisted > tx_count-1): nonce_db.delete_from(account.address, self.env, tx_count)
-                        nonce_db.insert(account.address, self.env, tx_count-1, 'RESET')
+                compacted = nonce_db.compact(self.env)
+                if compacted > 0: runner.log.info('Compacted %d historic nonce entries', compacted)
                 runner.log.info('')
 
             elif self.env == 'ganache':
                 nonce_db.delete_environment('ganache')
+                ephemeral_db.delete_environment('ganache')
                 hprocess = self.run_ganache(runner)
                 runner.addCleanupFunction(lambda: self.__stop_process(hprocess))
 
@@ -153,6 +193,24 @@ class TenRunnerPlugin():
         nonce_db.close()
         contracts_db.close()
         funds_db.close()
+        counts_db.close()
+        results_db.close()
+        ephemeral_db.close()
+
+    def __retry(self, runner, request, name, result, fn):
+        """Return the result of a request for an account in a batch, retried as a direct call should it have failed.
+
+        Returns None if the direct call also fails, with a warning logged for each failure.
+        """
+        if isinstance(result, int): return result
+        runner.log.warn("  Batched %s request failed for %s, retrying, %s", request, name, result,
+                        extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        try:
+            return fn()
+        except Exception as e:
+            runner.log.warn("  Direct %s request failed for %s, %s", request, name, e,
+                            extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+            return None
 
     def run_ganache(self, runner):
         """Run ganache for use by the tests. """
@@ -172,6 +230,22 @@ class TenRunnerPlugin():
         runner.waitForSignal(stdout, expr='Listening on 127.0.0.1:%d' % port, timeout=30)
         return hprocess
 
+    def __start_wallet_pool(self, runner):
+        """Start the pool of local wallet extensions leased by tests, sized with -XWALLET_POOL=<size>.
+
+        The pool is opt-in, as most tests only use the primary gateway. Without it, tests requesting a named gateway
+        start their own wallet extension.
+        """
+        size = int(runner.getXArg('WALLET_POOL', 0))
+        binary = os.path.join(PROJECT.root, 'artifacts', 'wallet_extension', 'wallet_extension')
+        if size <= 0 or not os.path.exists(binary): return
+
+        props = Properties()
+        runner.log.info('Starting pool of %d local wallet extensions', size)
+        WalletExtensionPool.start(runner, size, props.node_host(self.env, self.NODE_HOST),
+                                  props.node_port_http(self.env), props.node_port_ws(self.env))
+        runner.addCleanupFunction(lambda: self.__print_wallet_stats(runner))
+
     def run_wallet(self, runner):
         """Run a single wallet extension for use by the tests. """
         runner.log.info('Starting wallet extension to run tests')
@@ -218,54 +292,148 @@ class TenRunnerPlugin():
         response = requests.post(url, data=json.dumps(data), headers=headers)
         if not response.ok: runner.log.info('Request for funds was not successful, response text: %s', response.text)
 
-    def __print_cost(self, runner, url, web3, user_id):
-        """Print out balances. """
+    def __print_cost(self, runner):
+        """Print out the total cost of all transactions made by the tests, as recorded from their receipts.
+
+        The cost is the fees plus the value transferred. Only transactions made through the test network connections
+        are recorded, so the spend of transactions sent by client processes, or sent raw, is only counted as the value
+        used to fund their accounts.
+        """
+        totals = CostLedger.totals()
+        if totals['transactions'] == 0: return
+        cost = totals['fees'] + totals['value']
+        runner.log.info(' ')
+        runner.log.info("  %s: %d Wei", 'Total cost', cost, extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        runner.log.info("  %s: %.9f ETH", 'Total cost', Web3().from_wei(cost, 'ether'),
+                        extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        runner.log.info("  %s: %.9f ETH fees, %.9f ETH value", 'Total cost', Web3().from_wei(totals['fees'], 'ether'),
+                        Web3().from_wei(totals['value'], 'ether'), extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        runner.log.info("  %s: %d in %d transactions", 'Total gas used', totals['gas'], totals['transactions'],
+                        extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        runner.log.info("  %s: %s", 'Total cost', 'spend by client processes is only counted as the value funded',
+                        extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+
+    def __drain_ephemeral(self, runner, gateway_url, web3, user_id, db_dir):
+        """Sweep the balances of all free ephemeral accounts back to the funded account.
+
+        All accounts are first registered against the gateway token in parallel so that their balances can be read,
+        and balances and transaction counts are then read in a single batch request. The drain transactions for all
+        accounts with a balance above the cost of the transfer are signed and sent in parallel, with the receipts waited
+        for together. The recorded balances are updated for any successful drains.
+        """
         try:
-            delta = 0
-            for fn in Properties().accounts():
-                account = web3.eth.account.from_key(fn())
-                self.__register(account, url, user_id)
-
-                balance = web3.from_wei(web3.eth.get_balance(account.address), 'ether')
-                if fn.__name__ in self.balances:
-                    delta = delta + (self.balances[fn.__name__] - balance)
+            ephemeral_db = EphemeralPersistence(db_dir)
+            keys = ephemeral_db.get_free_keys(self.env)
+            if len(keys) == 0: return
+
+            accounts = [web3.eth.account.from_key(pk) for _, pk, _ in keys]
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                list(executor.map(lambda account: self.__register(account, gateway_url, user_id), accounts))
+
+            batch = BatchRequest(web3.provider.endpoint_uri)
+            for address, _, _ in keys:
+                batch.get_balance(address)
+                batch.get_transaction_count(address)
+            results = batch.execute()
+            gas_price = web3.eth.gas_price
+            chain_id = web3.eth.chain_id
+            funded = web3.eth.account.from_key(Properties().fundacntpk()).address
+            drains = [(account, balance, nonce)
+                      for account, balance, nonce in zip(accounts, results[0::2], results[1::2])
+                      if isinstance(balance, int) and isinstance(nonce, int) and balance > 2*21000*gas_price]
+            if len(drains) == 0: return
+
+            def drain(account, balance, nonce):
+                gas = web3.eth.estimate_gas({'from': account.address, 'to': funded, 'value': 1, 'gasPrice': gas_price})
+                tx = {'to': funded, 'value': balance - gas*gas_price, 'gas': gas, 'gasPrice': gas_price,
+                      'nonce': nonce, 'chainId': chain_id}
+                return web3.eth.send_raw_transaction(account.sign_transaction(tx).rawTransaction), tx['value']
 
-            sign = '-' if delta < 0 else ''
             runner.log.info(' ')
-            runner.log.info("  %s: %s%d Wei", 'Total cost', sign, Web3().to_wei(abs(delta), 'ether'),
+            runner.log.info('Draining %d ephemeral accounts to the funded account', len(drains))
+            with ThreadPoolExecutor(max_workers=16) as executor:
+                futures = [executor.submit(drain, *args) for args in drains]
+            sent = []
+            for (account, balance, _), future in zip(drains, futures):
+                try:
+                    tx_hash, value = future.result()
+                    sent.append((account, balance, tx_hash, value))
+                except Exception as e:
+                    runner.log.warn('  Unable to drain %s, %s', account.address, e)
+
+            drained, balances = 0, []
+            receipts = ReceiptTracker.get(web3).wait_all([tx_hash for _, _, tx_hash, _ in sent], timeout=60)
+            for (account, balance, _, value), receipt in zip(sent, receipts):
+                if receipt is None or receipt.status != 1: continue
+                drained += value
+                balances.append((account.address, balance - value - receipt.gasUsed*gas_price))
+            ephemeral_db.release_keys(self.env, balances)
+            runner.log.info("  %s: %.9f ETH from %d accounts", 'Drained', web3.from_wei(drained, 'ether'), len(balances),
                             extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
-            runner.log.info("  %s: %s%.9f ETH", 'Total cost', sign, abs(delta), extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
         except Exception as e:
-            pass
+            runner.log.warn('Unable to drain ephemeral accounts, %s', e)
+
+    def __precompile_contracts(self, runner):
+        """Compile all contracts used by the ten.test.contracts abstractions prior to running the tests.
+
+        Compilation is performed in a process pool, with the outputs held in memory by the compilation cache so that
+        tests constructing a contract do not incur the cost of compilation within their execution.
+        """
+        sources = set()
+        root = os.path.join(PROJECT.root, 'src', 'solidity', 'contracts')
+        for module_info in pkgutil.iter_modules(ten.test.contracts.__path__):
+            module = importlib.import_module('ten.test.contracts.%s' % module_info.name)
+            for _, cls in inspect.getmembers(module, inspect.isclass):
+                if issubclass(cls, DefaultContract) and cls.SOURCE is not None and cls.SOURCE.startswith(root):
+                    sources.add(cls.SOURCE)
+
+        try:
+            solc_binary = Properties().solc_binary()
+        except Exception as e:
+            runner.log.warn('Unable to precompile contracts, %s', e)
+            return
+
+        runner.log.info('Precompiling %d contracts', len(sources))
+        for source, duration, error in CompilationCache.precompile(sources, solc_binary):
+            name = os.path.relpath(source, root)
+            if error is not None:
+                runner.log.warn("  Error compiling %s: %s", name, error, extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+            elif duration is None:
+                runner.log.info("  Loaded %s from cache", name, extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+            else:
+                runner.log.info("  Compiled %s in %.3f secs", name, duration, extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        runner.log.info('')
+
+    def __print_compilation_stats(self, runner):
+        """Print out the hit and miss counts of the contract compilation cache. """
+        hits, misses = CompilationCache.stats()
+        runner.log.info(' ')
+        runner.log.info("  %s: %d hits, %d misses", 'Compilation cache', hits, misses,
+                        extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+
+    def __print_connection_stats(self, runner):
+        """Print out the number of HTTP connections opened and reused by the pooled web3 providers. """
+        opened, reused = ProviderFactory.stats()
+        runner.log.info(' ')
+        runner.log.info("  %s: %d opened, %d reused", 'HTTP connections', opened, reused,
+                        extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        ProviderFactory.close()
+
+    def __print_wallet_stats(self, runner):
+        """Print out the CPU and memory usage of each gateway in the wallet extension pool. """
+        runner.log.info(' ')
+        for name, port, pcpu, cpu_time, rss in WalletExtensionPool.stats():
+            runner.log.info("  Gateway %s (port %d): %.1f%% CPU, %s CPU time, %.1f MB RSS", name, port, pcpu, cpu_time,
+                            rss / 1024, extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
 
     @staticmethod
     def __stop_process(hprocess):
         """Stop a process started by this runner plugin. """
         hprocess.stop()
 
-    def __join(self, url):
-        """Join the ten network to get a token."""
-        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
-        response = requests.get(url,  headers=headers)
-        return response.text
-
-    def __register(self, account, url, user_id):
-        """Authenticate a user against the token. """
-        domain = {'name': 'Ten', 'version': '1.0', 'chainId': Properties().chain_id(self.env)}
-        types = {
-            'Authentication': [
-                {'name': 'Encryption Token', 'type': 'address'},
-            ],
-        }
-        message = {'Encryption Token': "0x"+user_id}
-
-        signable_msg_from_dict = encode_typed_data(domain, types, message)
-        signed_msg_from_dict = Account.sign_message(signable_msg_from_dict, account.key)
-
-        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
-        data = {"signature": signed_msg_from_dict.signature.hex(), "address": account.address}
-        response = requests.post(url, data=json.dumps(data), headers=headers)
-        return response
+    def __register(self, account, gateway_url, user_id):
+        """Authenticate a user against the token, skipping accounts already registered on it. """
+        return GatewayCache.register(gateway_url, Properties().chain_id(self.env), user_id, account)
 
     def __set_contract_addresses(self, runner):
         """Get the contract addresses and set into the properties. """
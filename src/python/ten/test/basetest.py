@@ -1,4 +1,4 @@
-import os, copy, sys, json, base64, re
+import os, copy, sys, json, base64, re, secrets
 import threading, requests
 from web3 import Web3
 from pathlib import Path
@@ -11,19 +11,30 @@ from ten.test.persistence.funds import FundsPersistence
 from ten.test.persistence.counts import CountsPersistence
 from ten.test.persistence.results import ResultsPersistence
 from ten.test.persistence.contract import ContractPersistence
+from ten.test.persistence.ephemeral import EphemeralPersistence
 from ten.test.utils.properties import Properties
+from ten.test.contracts.erc20 import ERC20Token
+from ten.test.contracts.multisend import MultiSend
+from ten.test.contracts.registry import ABIRegistry
+from ten.test.utils.accounts import AccountPool
 from ten.test.networks.default import DefaultPostLondon
-from ten.test.networks.ganache import Ganache
+from ten.test.networks.provider import BatchRequest
+from ten.test.networks.costs import CostLedger
+from ten.test.networks.ganache import Ganache, AsyncGanache
 from ten.test.networks.goerli import Goerli
 from ten.test.networks.arbitrum import ArbitrumSepolia
 from ten.test.networks.sepolia import Sepolia
-from ten.test.networks.ten import Ten, TenL1Geth, TenL1Sepolia
+from ten.test.networks.ten import Ten, TenGateways, TenL1Geth, TenL1Sepolia
+from ten.test.networks.async_ten import AsyncTen
+from ten.test.networks.async_default import AsyncDefaultPostLondon
 
 
 class GenericNetworkTest(BaseTest):
     """The base test used by all tests cases, against any request environment. """
     MSG_ID = 1                      # global used for http message requests numbers
     NODE_HOST = None                # if not none overrides the node host from the properties file
+    MULTI_SEND_SIZE = 100           # max number of accounts funded in a single multi send transaction
+    GAS_BUDGET = None               # if not none the max gas the test can use in its transactions before failing
 
     def __init__(self, descriptor, outsubdir, runner):
         """Call the parent constructor but set the mode to ten if non is set. """
@@ -32,40 +43,61 @@ class GenericNetworkTest(BaseTest):
         self.block_time = Properties().block_time_secs(self.env)
         self.log.info('Running test in thread %s', threading.currentThread().getName())
 
-        # every test has its own connection to the nonce and contract db
+        # every test has its own persistence instances, sharing the pooled connections to the database
         db_dir = os.path.join(str(Path.home()), '.tentest')
         self.nonce_db = NoncePersistence(db_dir)
         self.contract_db = ContractPersistence(db_dir)
         self.funds_db = FundsPersistence(db_dir)
         self.counts_db = CountsPersistence(db_dir)
         self.results_db = ResultsPersistence(db_dir)
+        self.ephemeral_db = EphemeralPersistence(db_dir)
         self.addCleanupFunction(self.close_db)
 
+        # every test leases its own set of accounts for the duration of the test
+        self.account_slot = AccountPool.lease()
+        self.addCleanupFunction(lambda: AccountPool.release(self.account_slot))
+
+        # every test records the cost of its transactions from their receipts
+        self.costs = CostLedger()
+        self.addCleanupFunction(self.__test_cost)
+
         # every test has a unique connection for the funded account
         self.connections = {}
         self.network_funding = self.get_network_connection()
-        self.balance = 0
-        self.accounts = []
         self.transfer_costs = []
+        self.ephemeral_accounts = []
 
-        for fn in Properties().accounts():
-            web3, account = self.network_funding.connect(self, fn(), check_funds=False, verbose=False)
-            self.accounts.append((web3, account))
-            self.balance = self.balance + web3.eth.get_balance(account.address)
-        self.addCleanupFunction(self.__test_cost)
+    def __balances(self, accounts):
+        """Return the balances of a list of accounts read through the funding connection in a single batch request. """
+        self.network_funding.register_accounts(self, accounts)
+        batch = BatchRequest(self.network_funding.connection_url())
+        for account in accounts: batch.get_balance(account.address)
+        return batch.execute()
 
     def __test_cost(self):
-        balance = 0
-        for web3, account in self.accounts: balance = balance + web3.eth.get_balance(account.address)
-        delta = abs(self.balance - balance)
-        sign = '-' if (self.balance - balance) < 0 else ''
-        self.log.info("  %s: %s%d Wei", 'Test cost', sign, delta, extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
-        self.log.info("  %s: %s%.9f ETH", 'Test cost', sign, Web3().from_wei(delta, 'ether'), extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        """Log the cost of the transactions made by the test, and check the gas used against any budget. """
+        fees, value, gas = self.costs.total('fees'), self.costs.total('value'), self.costs.total('gas')
+        self.log.info("  %s: %d Wei", 'Test cost', fees, extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        self.log.info("  %s: %.9f ETH", 'Test cost', Web3().from_wei(fees, 'ether'), extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        self.log.info("  %s: %d in %d transactions", 'Gas used', gas, self.costs.total('transactions'),
+                      extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        self.log.info("  %s: %.9f ETH", 'Value sent', Web3().from_wei(value, 'ether'), extra=BaseLogFormatter.tag(LOG_TRACEBACK, 0))
+        if self.GAS_BUDGET is not None: self.assert_gas_budget(self.GAS_BUDGET)
+
+    def assert_gas_budget(self, budget):
+        """Fail the test if the gas used in all transactions made by the test so far exceeds a budget. """
+        gas = self.costs.total('gas')
+        if gas > budget:
+            self.addOutcome(FAILED, outcomeReason='Gas used %d exceeds budget %d' % (gas, budget), abortOnError=False)
 
     def close_db(self):
-        """Close the connection to the nonce database on completion. """
+        """Release the persistence instances on completion. """
         self.nonce_db.close()
         self.contract_db.close()
+        self.funds_db.close()
+        self.counts_db.close()
+        self.results_db.close()
+        self.ephemeral_db.close()
 
     def is_ten(self):
         """Return true if we are running against a Ten network. """
@@ -87,6 +119,11 @@ class GenericNetworkTest(BaseTest):
         if workingDir is None: workingDir = self.output
 
         environ = copy.deepcopy(os.environ)
+        python_path = os.path.join(PROJECT.root, 'src', 'python')
+        if "PYTHONPATH" in environ:
+            environ["PYTHONPATH"] = python_path + ":" + environ["PYTHONPATH"]
+        else:
+            environ["PYTHONPATH"] = python_path
         hprocess = self.startProcess(command=sys.executable, displayName='python', workingDir=workingDir,
                                      arguments=arguments, environs=environ, stdout=stdout, stderr=stderr,
                                      state=state, timeout=timeout)
@@ -140,16 +177,74 @@ class GenericNetworkTest(BaseTest):
         needs to also connect, hence to avoid recursion we don't check funds on the call.
         """
         web3_pk, account_pk = self.network_funding.connect(self, Properties().fundacntpk(), check_funds=False, verbose=verbose)
-        balance_before = web3_pk.eth.get_balance(account_pk.address)
-
         tx = {'to': account.address, 'value': web3_pk.to_wei(amount, 'ether'), 'gasPrice': web3_pk.eth.gas_price}
         tx['gas'] = web3_pk.eth.estimate_gas(tx)
         if verbose: self.log.info('Gas estimate for distribute native is %d', tx['gas'])
 
         if verbose: self.log.info('Sending %.6f ETH to account %s', amount, account.address)
-        self.network_funding.tx(self, web3_pk, tx, account_pk, verbose=verbose)
-        balance_after = web3_pk.eth.get_balance(account_pk.address)
-        self.transfer_costs.append((balance_before - web3_pk.to_wei(amount, 'ether') - balance_after))
+        tx_recp = self.network_funding.tx(self, web3_pk, tx, account_pk, verbose=verbose)
+        self.transfer_costs.append(CostLedger.fee(tx_recp, tx['gasPrice']))
+
+    def distribute_native_many(self, accounts, amounts, verbose=True):
+        """A native transfer of funds from the funded account to a list of accounts in as few transactions as possible.
+
+        Transfers are made through a MultiSend contract, deployed once per environment and persisted for reuse, with up
+        to MULTI_SEND_SIZE accounts funded in each transaction. Amounts are in ETH, and can be a single amount for all
+        accounts, or a list of amounts in the same order as the accounts.
+        """
+        if not isinstance(amounts, (list, tuple)): amounts = [amounts] * len(accounts)
+        if len(accounts) == 0: return
+        web3_pk, account_pk = self.network_funding.connect(self, Properties().fundacntpk(), check_funds=False, verbose=verbose)
+        multi_send = MultiSend(self, web3_pk)
+        multi_send.get_or_deploy(self.network_funding, account_pk)
+        fees = self.costs.total('fees')
+
+        values = [web3_pk.to_wei(amount, 'ether') for amount in amounts]
+        for i in range(0, len(accounts), self.MULTI_SEND_SIZE):
+            recipients = [account.address for account in accounts[i:i+self.MULTI_SEND_SIZE]]
+            batch_values = values[i:i+self.MULTI_SEND_SIZE]
+            if verbose: self.log.info('Sending %.6f ETH in total to %d accounts', web3_pk.from_wei(sum(batch_values), 'ether'), len(recipients))
+            target = multi_send.contract.functions.multiSend(recipients, batch_values)
+            gas_limit = MultiSend.GAS_LIMIT_BASE + MultiSend.GAS_LIMIT_PER_RECIPIENT*len(recipients)
+            self.network_funding.transact(self, web3_pk, target, account_pk, gas_limit, verbose=verbose,
+                                          value=sum(batch_values))
+        fees = self.costs.total('fees') - fees
+        self.transfer_costs.extend([int(fees / len(accounts))] * len(accounts))
+
+    def get_ephemeral_keys(self, count, amount, verbose=True):
+        """Return a list of private keys for ephemeral accounts, each funded with at least an amount in ETH.
+
+        Free keys from the ephemeral persistence are reused where possible, and new keys are created and recorded for
+        the remainder. Any keys with a balance below the amount are funded in bulk through distribute_native_many. On
+        completion of the test the balances of all keys are recorded, and the keys freed for reuse by later tests or to
+        be drained back to the funded account by the runner.
+        """
+        leased = [(Web3().eth.account.from_key(pk), balance)
+                  for _, pk, balance in self.ephemeral_db.lease_keys(self.env, count)]
+        created = [Web3().eth.account.from_key(secrets.token_hex(32)) for _ in range(count - len(leased))]
+        self.ephemeral_db.insert_keys(self.env, [(account.address, account.key.hex()) for account in created])
+
+        accounts = [account for account, _ in leased] + created
+        if len(self.ephemeral_accounts) == 0: self.addCleanupFunction(self.__release_ephemeral_keys)
+        self.ephemeral_accounts.extend(accounts)
+
+        required = Web3.to_wei(amount, 'ether')
+        balances = [balance for _, balance in leased] + [0] * len(created)
+        if len(leased) > 0: balances[:len(leased)] = self.__balances([account for account, _ in leased])
+        top_ups = [(account, required - balance if isinstance(balance, int) else required)
+                   for account, balance in zip(accounts, balances)]
+        top_ups = [(account, value) for account, value in top_ups if value > 0]
+        if verbose: self.log.info('Using %d ephemeral accounts, %d reused, %d requiring funds',
+                                  count, len(leased), len(top_ups))
+        self.distribute_native_many([account for account, _ in top_ups],
+                                    [Web3.from_wei(value, 'ether') for _, value in top_ups], verbose=verbose)
+        return [account.key.hex() for account in accounts]
+
+    def __release_ephemeral_keys(self):
+        """Record the balances of all ephemeral accounts used by the test, freeing them for reuse. """
+        balances = self.__balances(self.ephemeral_accounts)
+        self.ephemeral_db.release_keys(self.env, [(account.address, balance if isinstance(balance, int) else 0)
+                                                  for account, balance in zip(self.ephemeral_accounts, balances)])
 
     def drain_native(self, web3, account, network):
         """A native transfer of all funds from and account to the funded account."""
@@ -185,8 +280,7 @@ class GenericNetworkTest(BaseTest):
         """Transfer an ERC20 token amount from a recipient account to an address. """
         self.log.info('Running for token %s', token_name)
 
-        with open(os.path.join(PROJECT.root, 'src', 'solidity', 'contracts', 'erc20', 'erc20.json')) as f:
-            token = web3_from.eth.contract(address=token_address, abi=json.load(f))
+        token = ABIRegistry.contract(web3_from, ABIRegistry.load(ERC20Token.ABI_PATH), token_address)
 
         balance = token.functions.balanceOf(account_from.address).call({"from":account_from.address})
         self.log.info('%s User balance   = %d ', token_name, balance)
@@ -197,21 +291,25 @@ class GenericNetworkTest(BaseTest):
 
     def print_token_balance(self, token_name, token_address, web3, account):
         """Print an ERC20 token balance of a recipient account. """
-        with open(os.path.join(PROJECT.root, 'src', 'solidity', 'contracts', 'erc20', 'erc20.json')) as f:
-            token = web3.eth.contract(address=token_address, abi=json.load(f))
+        token = ABIRegistry.contract(web3, ABIRegistry.load(ERC20Token.ABI_PATH), token_address)
 
         balance = token.functions.balanceOf(account.address).call()
         self.log.info('%s User balance   = %d ', token_name, balance)
 
     def get_token_balance(self, token_address, web3, account):
         """Get the ERC20 token balance of a recipient account. """
-        with open(os.path.join(PROJECT.root, 'src', 'solidity', 'contracts', 'erc20', 'erc20.json')) as f:
-            token = web3.eth.contract(address=token_address, abi=json.load(f))
+        token = ABIRegistry.contract(web3, ABIRegistry.load(ERC20Token.ABI_PATH), token_address)
         return token.functions.balanceOf(account.address).call()
 
     def get_network_connection(self, name='primary', **kwargs):
-        """Get the network connection."""
-        if self.is_ten():
+        """Get the network connection.
+
+        On Ten, supplying gateways=<count> (and optionally strategy) returns a connection spreading its accounts across
+        that many gateways.
+        """
+        if self.is_ten() and 'gateways' in kwargs:
+            return TenGateways(self, 'gateways' if name == 'primary' else name, **kwargs)
+        elif self.is_ten():
             return Ten(self, name, **kwargs)
         elif self.env == 'goerli':
             return Goerli(self, name, **kwargs)
@@ -224,6 +322,14 @@ class GenericNetworkTest(BaseTest):
 
         return DefaultPostLondon(self, name, **kwargs)
 
+    def get_async_network_connection(self, name='primary', **kwargs):
+        """Get an asyncio network connection, where connect and transact are coroutines."""
+        if self.is_ten():
+            return AsyncTen(self, name, **kwargs)
+        elif self.env == 'ganache':
+            return AsyncGanache(self, name, **kwargs)
+        return AsyncDefaultPostLondon(self, name, **kwargs)
+
     def get_l1_network_connection(self, name='primary_l1_connection', **kwargs):
         """Get the layer 1 network connection used by a layer 2."""
         if self.is_ten() and self.env != 'ten.sepolia':
@@ -422,6 +528,13 @@ class TenNetworkTest(GenericNetworkTest):
 
     def ratio_failures(self, file, threshold=0.05):
         """Search through a log for failure ratios and fail if above a threshold. """
+        ratio = self.get_ratio_failures(file)
+        self.log.info('Ratio of failures is %.2f' % ratio)
+        if ratio > threshold: self.addOutcome(FAILED, outcomeReason='Failure ratio > 0.05', abortOnError=False)
+        return ratio
+
+    def get_ratio_failures(self, file):
+        """Search through a log for the last failure ratio, without checking it against a threshold. """
         ratio = 0
         regex = re.compile('Ratio failures = (?P<ratio>.*)$', re.M)
         with open(file, 'r') as fp:
@@ -429,6 +542,4 @@ class TenNetworkTest(GenericNetworkTest):
                 result = regex.search(line)
                 if result is not None:
                     ratio = float(result.group('ratio'))
-        self.log.info('Ratio of failures is %.2f' % ratio)
-        if ratio > threshold: self.addOutcome(FAILED, outcomeReason='Failure ratio > 0.05', abortOnError=False)
         return ratio
\ No newline at end of file
@@ -1,6 +1,7 @@
-import os.path, json
+import os.path
 from pysys.constants import *
 from ten.test.utils.properties import Properties
+from ten.test.contracts.registry import ABIRegistry
 
 
 class Management:
@@ -12,9 +13,8 @@ class Management:
         self.address = Properties().l1_management_address()
         self.abi_path = os.path.join(PROJECT.root, 'artifacts', 'contracts', 'management', 'ManagementContract.sol',
                                      'ManagementContract.json')
-        with open(self.abi_path, 'r') as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
 
 
 class L1MessageBus:
@@ -26,9 +26,8 @@ class L1MessageBus:
         self.address = Properties().l1_message_bus_address()
         self.abi_path = os.path.join(PROJECT.root, 'artifacts', 'contracts', 'messaging', 'MessageBus.sol',
                                      'MessageBus.json')
-        with open(self.abi_path, 'r') as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
 
 
 class L2MessageBus:
@@ -40,9 +39,8 @@ class L2MessageBus:
         self.address = Properties().l2_message_bus_address()
         self.abi_path = os.path.join(PROJECT.root, 'artifacts', 'contracts', 'messaging', 'MessageBus.sol',
                                      'MessageBus.json')
-        with open(self.abi_path, 'r') as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
 
 
 class L1CrossChainMessenger:
@@ -54,9 +52,8 @@ class L1CrossChainMessenger:
         self.address = Properties().l1_cross_chain_messenger_address()
         self.abi_path = os.path.join(PROJECT.root, 'artifacts', 'contracts', 'messaging', 'messenger',
                                      'CrossChainMessenger.sol', 'CrossChainMessenger.json')
-        with open(self.abi_path, 'r') as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
 
 
 class L2CrossChainMessenger:
@@ -68,9 +65,8 @@ class L2CrossChainMessenger:
         self.address = Properties().l2_cross_chain_messenger_address()
         self.abi_path = os.path.join(PROJECT.root, 'artifacts', 'contracts', 'messaging', 'messenger',
                                      'CrossChainMessenger.sol', 'CrossChainMessenger.json')
-        with open(self.abi_path, 'r') as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
 
 
 class ObscuroBridge:
@@ -82,9 +78,8 @@ class ObscuroBridge:
         self.address = Properties().l1_bridge_address()
         self.abi_path = os.path.join(PROJECT.root, 'artifacts', 'contracts', 'bridge', 'L1', 'ObscuroBridge.sol',
                                      'ObscuroBridge.json')
-        with open(self.abi_path, 'r') as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
 
 
 class EthereumBridge:
@@ -96,9 +91,8 @@ class EthereumBridge:
         self.address = Properties().l2_bridge_address()
         self.abi_path =os.path.join(PROJECT.root, 'artifacts', 'contracts', 'bridge', 'L2', 'EthereumBridge.sol',
                                     'EthereumBridge.json')
-        with open(self.abi_path, 'r') as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
 
 
 class ObsERC20:
@@ -109,9 +103,8 @@ class ObsERC20:
         self.web3 = web3
         self.address = Properties().l2_bridge_address()
         self.abi_path = os.path.join(PROJECT.root, 'artifacts', 'contracts', 'common', 'ObsERC20.sol', 'ObsERC20.json')
-        with open(self.abi_path, 'r') as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
 
 
 class WrappedERC20:
@@ -125,6 +118,5 @@ class WrappedERC20:
         self.address = address
         self.abi_path = os.path.join(PROJECT.root, 'artifacts', 'contracts', 'common', 'WrappedERC20.sol',
                                      'WrappedERC20.json')
-        with open(self.abi_path, 'r') as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
\ No newline at end of file
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
\ No newline at end of file
@@ -1,10 +1,11 @@
 import json
 from copy import copy
-from solcx import compile_source
 from pysys.constants import *
 from pysys.constants import LOG_WARN
 from pysys.utils.logutils import BaseLogFormatter
 from ten.test.utils.properties import Properties
+from ten.test.utils.compiler import CompilationCache
+from ten.test.contracts.registry import ABIRegistry
 
 
 class DefaultContract:
@@ -18,7 +19,7 @@ class DefaultContract:
         clone = copy(contract)
         clone.web3 = web3
         clone.account = account
-        clone.contract = web3.eth.contract(address=contract.address, abi=contract.abi)
+        clone.contract = ABIRegistry.contract(web3, contract.abi, contract.address)
         return clone
 
     def __init__(self, test, web3, *args):
@@ -36,13 +37,10 @@ class DefaultContract:
 
     def construct(self):
         """Compile and construct contract instance. """
-        with open(self.SOURCE, 'r') as fp:
-            compiled_sol = compile_source(source=fp.read(), output_values=['abi', 'bin'],
-                                          solc_binary=Properties().solc_binary(),
-                                          base_path=os.path.dirname(self.SOURCE))
-            contract_interface = compiled_sol['<stdin>:%s' % self.CONTRACT]
-            self.bytecode = contract_interface['bin']
-            self.abi = contract_interface['abi']
+        compiled_sol = CompilationCache.compile(self.SOURCE, Properties().solc_binary(), output_values=['abi', 'bin'])
+        contract_interface = compiled_sol['<stdin>:%s' % self.CONTRACT]
+        self.bytecode = contract_interface['bin']
+        self.abi = contract_interface['abi']
 
         self.abi_path = os.path.join(self.test.output, '%s.abi' % self.CONTRACT)
         with open(self.abi_path, 'w') as f: json.dump(self.abi, f)
@@ -56,7 +54,7 @@ class DefaultContract:
         tx_receipt = network.transact(self.test, self.web3, self.contract, account,
                                       self.GAS_LIMIT, persist_nonce, timeout=timeout)
         self.address = tx_receipt.contractAddress
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
         self.test.log.info('Contract %s deployed at %s', self.CONTRACT, tx_receipt.contractAddress, extra=BaseLogFormatter.tag(LOG_WARN, 0))
         return tx_receipt
 
@@ -71,7 +69,7 @@ class DefaultContract:
                 self.test.contract_db.insert_contract(self.CONTRACT, self.test.env, self.address, json.dumps(self.abi))
             else:
                 self.address = address
-                self.contract = self.web3.eth.contract(address=address, abi=abi)
+                self.contract = ABIRegistry.contract(self.web3, abi, address)
         else:
             self.test.log.warn('Contract does not appear to be deployed ... deploying')
             self.deploy(network, account, persist_nonce=persist_nonce)
@@ -1,10 +1,11 @@
-import json
 from pysys.constants import *
 from ten.test.contracts.default import DefaultContract
+from ten.test.contracts.registry import ABIRegistry
 
 
 class ERC20Token:
     GAS_LIMIT = 3_000_000
+    ABI_PATH = os.path.join(PROJECT.root, 'src', 'solidity', 'contracts', 'erc20', 'erc20.json')
 
     def __init__(self, test, web3, name, symbol, address):
         self.test = test
@@ -12,10 +13,9 @@ class ERC20Token:
         self.name = name
         self.symbol = symbol
         self.address = address
-        self.abi_path = os.path.join(PROJECT.root, 'src', 'solidity', 'contracts', 'erc20', 'erc20.json')
-        with open(self.abi_path) as fp:
-            self.abi = json.load(fp)
-        self.contract = self.web3.eth.contract(address=self.address, abi=self.abi)
+        self.abi_path = self.ABI_PATH
+        self.abi = ABIRegistry.load(self.abi_path)
+        self.contract = ABIRegistry.contract(self.web3, self.abi, self.address)
 
 
 class MintedERC20Token(DefaultContract):
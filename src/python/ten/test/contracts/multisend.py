@@ -0,0 +1,9 @@
+from pysys.constants import *
+from ten.test.contracts.default import DefaultContract
+
+
+class MultiSend(DefaultContract):
+    GAS_LIMIT_BASE = 50_000             # gas limit for a multi send is the base plus the limit per recipient
+    GAS_LIMIT_PER_RECIPIENT = 40_000
+    SOURCE = os.path.join(PROJECT.root, 'src', 'solidity', 'contracts', 'multisend', 'MultiSend.sol')
+    CONTRACT = 'MultiSend'
@@ -0,0 +1,45 @@
+import json, threading, weakref
+
+
+class ABIRegistry:
+    """A process wide registry of contract ABIs and the web3 contract instances created from them.
+
+    ABIs loaded from artifact files are parsed once on first use and then shared, and web3 contract instances are cached
+    against the connection they were created on, keyed by the ABI and contract address. Creating a web3 contract parses
+    the ABI into its functions and events, which for the larger bridge artifacts is significant, hence tests that create
+    many abstractions on the same contracts reuse the same instance. Instances are held weakly against the connection so
+    are released along with it.
+    """
+    _lock = threading.Lock()                    # guards the abis and contracts
+    _abis = {}                                  # artifact path to parsed abi
+    _keys = {}                                  # id of a parsed abi held in the registry to its path
+    _contracts = weakref.WeakKeyDictionary()    # web3 connection to (abi key, address) to contract
+
+    @classmethod
+    def load(cls, path):
+        """Return the parsed ABI from an artifact file, reading it from disk on first use only. """
+        with cls._lock:
+            if path not in cls._abis:
+                with open(path, 'r') as fp: abi = json.load(fp)
+                cls._abis[path] = abi
+                cls._keys[id(abi)] = path
+            return cls._abis[path]
+
+    @classmethod
+    def contract(cls, web3, abi, address):
+        """Return the web3 contract for an ABI at an address on a connection, creating it on first use.
+
+        The ABI can be one returned from load, a parsed ABI, or its json string e.g. as held in the contract persistence.
+        """
+        key = (cls.__key(abi), address)
+        with cls._lock:
+            contracts = cls._contracts.setdefault(web3, {})
+            if key not in contracts: contracts[key] = web3.eth.contract(address=address, abi=abi)
+            return contracts[key]
+
+    @classmethod
+    def __key(cls, abi):
+        """Return the key for an ABI, avoiding serialising ABIs loaded through the registry. """
+        if isinstance(abi, str): return abi
+        with cls._lock: key = cls._keys.get(id(abi))
+        return key if key is not None else json.dumps(abi, sort_keys=True)
@@ -1,4 +1,4 @@
-import os
+import os, subprocess, threading
 from pysys.constants import PROJECT, BACKGROUND
 from ten.test.utils.properties import Properties
 
@@ -38,8 +38,8 @@ class WalletExtension:
             test.log.info('Removing wallet extension persistence file')
             os.remove(self.databasePath)
 
-    def run(self):
-        """Run an instance of the wallet extension."""
+    def run(self, wait=True):
+        """Run an instance of the wallet extension, optionally waiting for it to have started."""
         self.test.log.info('Starting %s wallet extension on port=%d, ws_port=%d', self.name, self.port, self.ws_port)
 
         arguments = []
@@ -54,5 +54,60 @@ class WalletExtension:
         hprocess = self.test.startProcess(command=self.binary, displayName='wallet_extension',
                                           workingDir=self.test.output, environs=os.environ, quiet=True,
                                           arguments=arguments, stdout=self.stdout, stderr=self.stderr, state=BACKGROUND)
-        self.test.waitForSignal(self.stdout, expr='Wallet extension started', timeout=30)
+        if wait: self.test.waitForSignal(self.stdout, expr='Wallet extension started', timeout=30)
         return hprocess
+
+
+class WalletExtensionPool:
+    """A pool of local wallet extensions started by the runner, which tests can lease rather than start their own.
+
+    Starting a wallet extension takes several seconds, so the runner starts the pool in parallel before any tests are
+    run, each with a fresh database. A connection requesting a named local gateway leases one from the pool for the
+    duration of the test, falling back to starting its own should the pool be exhausted. On release the gateway is
+    returned to the pool as is; as every connection joins for a new token, users from earlier tests are not visible to
+    later ones, and gateways whose process has exited are dropped rather than returned. Any pooled gateway processes
+    are stopped by the runner on completion.
+    """
+    _lock = threading.Lock()        # guards the free and leased gateways
+    _free = []                      # gateways available to lease
+    _all = []                       # all gateways in the pool, as (wallet extension, process)
+
+    @classmethod
+    def start(cls, runner, size, node_host, node_port_http, node_port_ws):
+        """Start a pool of wallet extensions on behalf of the runner, waiting for all to have started. """
+        started = []
+        for i in range(size):
+            wallet = WalletExtension(runner, name='pool_%d' % i, verbose=False, node_host=node_host,
+                                     node_port_http=node_port_http, node_port_ws=node_port_ws)
+            started.append((wallet, wallet.run(wait=False)))
+        for wallet, _ in started:
+            runner.waitForSignal(wallet.stdout, expr='Wallet extension started', timeout=30)
+        with cls._lock:
+            cls._all.extend(started)
+            cls._free.extend(started)
+
+    @classmethod
+    def lease(cls):
+        """Lease a wallet extension from the pool, returning None if there are none free. """
+        with cls._lock: return cls._free.pop(0) if len(cls._free) > 0 else None
+
+    @classmethod
+    def release(cls, entry):
+        """Return a leased wallet extension to the pool, dropping it if the process has exited. """
+        if not entry[1].running(): return
+        with cls._lock: cls._free.append(entry)
+
+    @classmethod
+    def stats(cls):
+        """Return a list of (name, port, cpu %, cpu time, rss in KB) for each running gateway in the pool. """
+        with cls._lock: entries = list(cls._all)
+        stats = []
+        for wallet, hprocess in entries:
+            if not hprocess.running(): continue
+            try:
+                output = subprocess.check_output(['ps', '-o', 'pcpu=,time=,rss=', '-p', str(hprocess.pid)], text=True)
+                pcpu, cpu_time, rss = output.split()
+                stats.append((wallet.name, wallet.port, float(pcpu), cpu_time, int(rss)))
+            except Exception:
+                pass
+        return stats
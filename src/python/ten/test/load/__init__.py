@@ -0,0 +1,2 @@
+"""Package of open-loop load generation.
+"""
\ No newline at end of file
@@ -0,0 +1,93 @@
+import random
+
+
+class Arrival:
+    """Base class for an arrival process, giving the times at which requests are offered to the network.
+
+    Times are offsets in seconds from the start of the run, and are independent of when earlier requests complete,
+    i.e. the load offered is open loop. Subclasses implement the interval to the next arrival at a given time.
+    """
+
+    def interval(self, now):
+        """Return the interval in seconds from an arrival at time now to the next arrival. """
+        raise NotImplementedError()
+
+    def times(self, duration=None, count=None):
+        """Yield the arrival times until either the duration in seconds or the count of arrivals is reached. """
+        now, arrived = 0.0, 0
+        while (duration is None or now < duration) and (count is None or arrived < count):
+            yield now
+            arrived += 1
+            interval = self.interval(now)
+            if interval is None: return
+            now += interval
+
+
+class Constant(Arrival):
+    """Arrivals at a constant rate per second. """
+
+    def __init__(self, rate):
+        self.rate = rate
+
+    def interval(self, now):
+        return 1.0 / self.rate
+
+
+class Poisson(Arrival):
+    """Arrivals as a Poisson process with a mean rate per second, i.e. with exponentially distributed intervals. """
+
+    def __init__(self, rate, seed=None):
+        self.rate = rate
+        self.random = random.Random(seed)
+
+    def interval(self, now):
+        return self.random.expovariate(self.rate)
+
+
+class Step(Arrival):
+    """Arrivals at a constant rate that steps through a list of (duration, rate) stages, ending after the last. """
+
+    def __init__(self, steps):
+        self.steps = steps
+
+    def rate(self, now):
+        """Return the rate at a time, or None if past the last stage. """
+        end = 0.0
+        for duration, rate in self.steps:
+            end += duration
+            if now < end: return rate
+        return None
+
+    def interval(self, now):
+        rate = self.rate(now)
+        return 1.0 / rate if rate is not None else None
+
+
+class Ramp(Arrival):
+    """Arrivals at a rate that changes linearly from a start to an end rate per second over a duration.
+
+    Both rates must be greater than zero.
+    """
+
+    def __init__(self, start_rate, end_rate, duration):
+        self.start_rate = start_rate
+        self.end_rate = end_rate
+        self.duration = duration
+
+    def rate(self, now):
+        """Return the rate at a time, held at the end rate once the ramp is complete. """
+        if now >= self.duration: return self.end_rate
+        return self.start_rate + (self.end_rate - self.start_rate) * now / self.duration
+
+    def interval(self, now):
+        return 1.0 / self.rate(now)
+
+
+class Bulk(Arrival):
+    """Arrivals all at the start of the run, i.e. offered as fast as they can be sent.
+
+    Should be run to a count of arrivals rather than a duration.
+    """
+
+    def interval(self, now):
+        return 0.0
@@ -0,0 +1,142 @@
+import random, heapq, threading
+from web3 import Web3
+from ten.test.utils.signer import BulkSigner
+
+
+class Request:
+    """A JSON-RPC request to be offered to the network, and whether it is a transaction to wait on the receipt for.
+
+    For a transaction the nonce it was signed with is also held, so that it can be returned to the builder should the
+    request not be sent.
+    """
+    __slots__ = ('method', 'params', 'transaction', 'nonce')
+
+    def __init__(self, method, params, transaction=False, nonce=None):
+        self.method = method
+        self.params = params
+        self.transaction = transaction
+        self.nonce = nonce
+
+
+class Builder:
+    """Base class for a request builder, returning the request to make for each arrival.
+
+    Builders are pluggable into the load generator, which calls prepare with the number of requests to be made (when
+    known) before the run starts, and then build with the index of each arrival that is to be sent. Build is called
+    from the worker threads of the generator, so must be thread safe, and should be cheap, so that sends are not
+    delayed, and hence any expensive work such as signing should be done in prepare. Requests that were built but
+    failed to be sent are passed back to release.
+    """
+
+    def prepare(self, count):
+        """Prepare for a known number of requests before the run starts. """
+        pass
+
+    def build(self, index):
+        """Return the request for the arrival with a given index. """
+        raise NotImplementedError()
+
+    def release(self, request):
+        """Return a request that was built but not accepted by the network, so that anything it holds can be reused. """
+        pass
+
+
+class CallBuilder(Builder):
+    """Builds read requests for a JSON-RPC method, with the params for each arrival returned from a function. """
+
+    def __init__(self, method, params):
+        self.method = method
+        self.params = params if callable(params) else (lambda index: params)
+
+    def build(self, index):
+        return Request(self.method, self.params(index))
+
+
+class EthCallBuilder(CallBuilder):
+    """Builds eth_call requests against the latest block for a contract function. """
+
+    def __init__(self, function, sender=None):
+        call = {'to': function.address, 'data': function._encode_transaction_data()}
+        if sender is not None: call['from'] = sender
+        super().__init__('eth_call', [call, 'latest'])
+
+
+class TransactionBuilder(Builder):
+    """Base class for building signed transactions from an account with consecutive nonces.
+
+    Subclasses return the transaction dictionary for each index, excluding the nonce. Transactions can either be
+    signed as built, or all signed in bulk over a process pool in prepare when the count is known. Nonces are taken
+    in order as requests are built rather than from the arrival index, so that arrivals dropped by the load generator
+    leave no gap in the nonces sent. The nonce of a request released after a failed send is reused by the next build
+    (up to a number of retries), as otherwise all later transactions from the account would be stuck behind it.
+    """
+    RETRIES = 3                     # number of times the nonce of a failed send is reused
+
+    def __init__(self, account, start_nonce, presign=True):
+        self.account = account
+        self.start_nonce = start_nonce
+        self.presign = presign
+        self.signed = None
+        self._lock = threading.Lock()
+        self._next = 0                  # offset from the start nonce of the next unused nonce
+        self._released = []             # heap of the offsets released for reuse
+        self._retries = {}              # offset to the number of times it has been released
+
+    def transaction(self, index):
+        """Return the transaction dictionary for the arrival with a given index. """
+        raise NotImplementedError()
+
+    def prepare(self, count):
+        if not self.presign or count is None: return
+        txs = [dict(self.transaction(index), nonce=self.start_nonce+index) for index in range(count)]
+        with BulkSigner(self.account.key) as signer: self.signed = list(signer.sign(txs))
+
+    def build(self, index):
+        with self._lock:
+            if len(self._released) > 0: offset = heapq.heappop(self._released)
+            else: offset, self._next = self._next, self._next + 1
+        nonce = self.start_nonce + offset
+        if self.signed is not None: raw = self.signed[offset]
+        else: raw = self.account.sign_transaction(dict(self.transaction(index), nonce=nonce)).rawTransaction
+        return Request('eth_sendRawTransaction', [Web3.to_hex(raw)], transaction=True, nonce=nonce)
+
+    def release(self, request):
+        offset = request.nonce - self.start_nonce
+        with self._lock:
+            self._retries[offset] = self._retries.get(offset, 0) + 1
+            if self._retries[offset] <= self.RETRIES: heapq.heappush(self._released, offset)
+
+
+class TransferBuilder(TransactionBuilder):
+    """Builds native value transfers to a random choice from a list of recipient addresses. """
+
+    def __init__(self, account, start_nonce, chain_id, gas_price, gas_limit, recipients, value, presign=True):
+        super().__init__(account, start_nonce, presign)
+        self.template = {'value': value, 'gas': gas_limit, 'gasPrice': gas_price, 'chainId': chain_id}
+        self.recipients = recipients
+
+    def prepare(self, count):
+        """Sign all transfers in bulk in template mode, so only the nonce and recipient are sent per transaction. """
+        if not self.presign or count is None: return
+        recipients = [random.choice(self.recipients) for _ in range(count)]
+        with BulkSigner(self.account.key, self.template) as signer:
+            self.signed = list(signer.sign_template(range(self.start_nonce, self.start_nonce+count), recipients))
+
+    def transaction(self, index):
+        return dict(self.template, to=random.choice(self.recipients))
+
+
+class ContractCallBuilder(TransactionBuilder):
+    """Builds contract function transactions, with the function for each arrival returned from a function.
+
+    The gas limit is supplied rather than estimated, so that building makes no request to the network.
+    """
+
+    def __init__(self, account, start_nonce, chain_id, gas_price, gas_limit, function, presign=True):
+        super().__init__(account, start_nonce, presign)
+        self.template = {'value': 0, 'gas': gas_limit, 'gasPrice': gas_price, 'chainId': chain_id}
+        self.function = function
+
+    def transaction(self, index):
+        function = self.function(index)
+        return dict(self.template, to=function.address, data=function._encode_transaction_data())
@@ -0,0 +1,213 @@
+import threading, time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from ten.test.networks.provider import ProviderFactory, BatchRequest
+from ten.test.networks.receipts import ReceiptTracker
+from ten.test.utils.histogram import LatencyHistogram
+
+
+class Sample:
+    """The timings of a single request offered by the load generator, in seconds from the start of the run.
+
+    Scheduled is when the request was due to be offered, sent when it was actually sent, acked when the response was
+    received, and confirmed when the receipt was received for a transaction. Dropped requests are those not sent as
+    the in-flight window was full at the scheduled time, and unconfirmed are transactions accepted by the network for
+    which no receipt was received, which are also recorded as errors. The nonce is set for transactions only.
+    """
+    __slots__ = ('index', 'scheduled', 'sent', 'acked', 'confirmed', 'block_number', 'timestamp', 'error', 'dropped',
+                 'unconfirmed', 'nonce')
+
+    def __init__(self, index, scheduled):
+        self.index = index
+        self.scheduled = scheduled
+        self.sent = None
+        self.acked = None
+        self.confirmed = None
+        self.block_number = None
+        self.timestamp = None           # timestamp of the block including a transaction
+        self.error = None
+        self.dropped = False
+        self.unconfirmed = False
+        self.nonce = None
+
+    def latency(self):
+        """Return the latency from scheduled to confirmed for transactions, or to acked for calls, if completed. """
+        end = self.confirmed if self.confirmed is not None else self.acked
+        return end - self.scheduled if end is not None and self.error is None else None
+
+
+class LoadGenerator:
+    """An open loop, rate controlled load generator against a node or gateway.
+
+    Requests are offered at the times given by an arrival process regardless of whether earlier requests have
+    completed, so that the latency can be measured under a fixed offered load, rather than the load being throttled
+    by the latency as in a closed loop client. Each request is built by a pluggable builder, and sent from a pool of
+    worker threads over the pooled session for the url. The number of requests in flight (sent and not yet acked, or
+    for transactions not yet confirmed) is bounded by a window; a request due when the window is full is dropped and
+    recorded as such, rather than delaying the schedule. The number of worker threads defaults to the window, but can
+    be set lower, e.g. to one so that transactions due at the same time are sent in nonce order. Requests are only
+    built by a worker when they are to be sent, and are released back to the builder should the send fail, so that
+    transaction builders only assign nonces to transactions accepted by the network. Transaction receipts are
+    resolved through the receipt tracker for the url, so confirmation times are at the resolution of its polling.
+    Scheduling sleeps to just before the due time and then spins, so that requests are offered to within a fraction of
+    a millisecond of their due time.
+    """
+    SPIN = 0.002                    # time before a due time to stop sleeping and spin
+
+    def __init__(self, url, builder, arrival, max_in_flight=256, timeout=30, workers=None):
+        """Create a generator for a url, with the builder for requests and the arrival process to offer them. """
+        self.url = url
+        self.builder = builder
+        self.arrival = arrival
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.workers = workers or max_in_flight
+        self.samples = []
+        self.duration = 0.0
+        self._window = threading.BoundedSemaphore(max_in_flight)
+        self._outstanding = threading.Condition()
+        self._in_flight = 0
+        self._session = ProviderFactory.session(url)
+        self._tracker = None
+
+    def run(self, duration=None, count=None):
+        """Run the generator until the duration in seconds or count of requests, waiting for those in flight. """
+        self.builder.prepare(count)
+        times = self.arrival.times(duration, count)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            start = time.perf_counter()
+            for index, offset in enumerate(times):
+                self.__wait_until(start + offset)
+                sample = Sample(index, offset)
+                self.samples.append(sample)
+                if not self._window.acquire(blocking=False):
+                    sample.dropped = True
+                    continue
+                with self._outstanding: self._in_flight += 1
+                executor.submit(self.__send, start, sample)
+
+            with self._outstanding:
+                self._outstanding.wait_for(lambda: self._in_flight == 0, timeout=self.timeout)
+            self.duration = time.perf_counter() - start
+        self.__set_timestamps()
+        return self.samples
+
+    def summary(self):
+        """Return a dictionary of the offered and achieved rates, counts, and latency percentiles in seconds.
+
+        Unconfirmed are the transactions accepted by the network for which no receipt was received.
+        """
+        completed = sorted([sample.latency() for sample in self.samples if sample.latency() is not None])
+        offered = self.samples[-1].scheduled if len(self.samples) > 0 else 0
+
+        def percentile(p): return completed[min(len(completed)-1, int(p * len(completed)))] if completed else 0.0
+        return {'requests': len(self.samples),
+                'completed': len(completed),
+                'dropped': len([sample for sample in self.samples if sample.dropped]),
+                'errors': len([sample for sample in self.samples if sample.error is not None]),
+                'unconfirmed': len(self.unconfirmed()),
+                'offered_rate': len(self.samples) / offered if offered > 0 else 0.0,
+                'achieved_rate': len(completed) / self.duration if self.duration > 0 else 0.0,
+                'mean': sum(completed) / len(completed) if completed else 0.0,
+                'p50': percentile(0.50), 'p90': percentile(0.90), 'p99': percentile(0.99),
+                'max': completed[-1] if completed else 0.0}
+
+    def unconfirmed(self):
+        """Return the samples of transactions accepted by the network for which no receipt was received. """
+        return [sample for sample in self.samples if sample.unconfirmed]
+
+    def histogram(self):
+        """Return a latency histogram of the completed requests.
+
+        As latencies are measured from when each request was scheduled rather than sent, the histogram is already
+        free of coordinated omission, and should not be corrected further.
+        """
+        histogram = LatencyHistogram()
+        for sample in self.samples:
+            if sample.latency() is not None: histogram.record(sample.latency())
+        return histogram
+
+    def write(self, path):
+        """Write the samples to a file, one per line as index, scheduled, sent, acked, confirmed and status. """
+        def fmt(value): return '%.6f' % value if value is not None else '-'
+        with open(path, 'w') as fp:
+            for sample in self.samples:
+                if sample.dropped: status = 'DROPPED'
+                elif sample.unconfirmed: status = 'UNCONFIRMED'
+                elif sample.error is not None: status = 'ERROR'
+                else: status = 'OK'
+                fp.write('%d %s %s %s %s %s\n' % (sample.index, fmt(sample.scheduled), fmt(sample.sent),
+                                                  fmt(sample.acked), fmt(sample.confirmed), status))
+
+    def __wait_until(self, due):
+        """Sleep until just before a due time, and then spin until it is reached. """
+        remaining = due - time.perf_counter()
+        if remaining > self.SPIN: time.sleep(remaining - self.SPIN)
+        while time.perf_counter() < due: pass
+
+    def __send(self, start, sample):
+        """Build and send a request from a worker, releasing the window when acked, or for transactions confirmed. """
+        request, accepted, release = None, False, True
+        try:
+            request = self.builder.build(sample.index)
+            sample.nonce = request.nonce
+            payload = {'jsonrpc': '2.0', 'method': request.method, 'params': request.params, 'id': sample.index}
+            sample.sent = time.perf_counter() - start
+            response = self._session.post(self.url, json=payload, timeout=self.timeout)
+            sample.acked = time.perf_counter() - start
+            response.raise_for_status()
+            result = response.json()
+            if 'error' in result:
+                sample.error = result['error'].get('message')
+                self.builder.release(request)
+            elif request.transaction:
+                accepted = True
+                future = self.__tracker().track(result['result'])
+                future.add_done_callback(lambda f: self.__confirmed(start, sample, f))
+                release = False
+        except Exception as e:
+            sample.error = str(e)
+            if accepted: sample.unconfirmed = True
+            elif request is not None: self.builder.release(request)
+        finally:
+            if release: self.__release()
+
+    def __confirmed(self, start, sample, future):
+        """Record the confirmation of a transaction from its resolved receipt future. """
+        try:
+            receipt = future.result()
+            sample.confirmed = time.perf_counter() - start
+            sample.block_number = receipt.blockNumber
+            if receipt.status != 1: sample.error = 'Transaction failed'
+        except Exception as e:
+            sample.unconfirmed = True
+            sample.error = str(e)
+        finally:
+            self.__release()
+
+    def __release(self):
+        """Release a slot in the in-flight window. """
+        self._window.release()
+        with self._outstanding:
+            self._in_flight -= 1
+            self._outstanding.notify_all()
+
+    def __tracker(self):
+        """Return the receipt tracker for the url, created on first use. """
+        if self._tracker is None: self._tracker = ReceiptTracker(self.url)
+        return self._tracker
+
+    def __set_timestamps(self):
+        """Set the block timestamps of confirmed transactions, from the tracker or in a single batch if not scanned. """
+        if self._tracker is None: return
+        self._tracker.close()
+        timestamps = dict(self._tracker.timestamps)
+        missing = sorted(set([sample.block_number for sample in self.samples
+                              if sample.block_number is not None and sample.block_number not in timestamps]))
+        if len(missing) > 0:
+            batch = BatchRequest(self.url)
+            for number in missing: batch.get_block(number)
+            for block in batch.execute():
+                if isinstance(block, Mapping): timestamps[block.number] = block.timestamp
+        for sample in self.samples:
+            if sample.block_number is not None: sample.timestamp = timestamps.get(sample.block_number)
@@ -0,0 +1,88 @@
+class Probe:
+    """The outcome of running at a single offered load, and whether it was within the service level objectives. """
+    __slots__ = ('load', 'throughput', 'errors', 'latency', 'passed', 'reason')
+
+    def __init__(self, load, throughput, errors, latency=None):
+        self.load = load
+        self.throughput = throughput
+        self.errors = errors            # ratio of failed to total requests
+        self.latency = latency          # latency histogram, if recorded
+        self.passed = True
+        self.reason = None
+
+
+class SaturationSearch:
+    """Searches for the maximum sustainable throughput by adaptively raising the offered load.
+
+    The load, e.g. the number of closed loop clients or the rate of an open loop generator, is doubled from a start
+    value until a probe breaks the objectives (the error ratio, or the latency at a percentile), or the maximum load
+    is reached. The load is then binary searched between the last passing and first failing probe to a resolution.
+    Each probe is made by calling a function with the load, which runs the workload and returns the throughput, the
+    ratio of errors, and a latency histogram (or None if latency is not recorded). The result is the passing probe
+    with the highest throughput, which need not be at the highest load should throughput fall off before the
+    objectives are broken.
+    """
+
+    def __init__(self, probe, start=1, maximum=None, resolution=1, error_ratio=0.05, latency=None, percentile=99.0,
+                 log=None):
+        """Create a search over a probe function, with the objectives as a max error ratio and latency in seconds. """
+        self.probe = probe
+        self.start = start
+        self.maximum = maximum
+        self.resolution = resolution
+        self.error_ratio = error_ratio
+        self.latency = latency
+        self.percentile = percentile
+        self.log = log
+        self.probes = []
+
+    def run(self):
+        """Run the search, returning the passing probe with the highest throughput, or None if none passed. """
+        good, bad = None, None
+        load = self.start
+        while True:
+            probe = self.__probe(load)
+            if not probe.passed:
+                bad = load
+                break
+            good = load
+            if self.maximum is not None and load >= self.maximum: break
+            load = self.__bound(load * 2)
+
+        while good is not None and bad is not None and bad - good > self.resolution:
+            load = self.__bound((good + bad) / 2)
+            if load in [good, bad]: break
+            if self.__probe(load).passed: good = load
+            else: bad = load
+        return self.best()
+
+    def best(self):
+        """Return the passing probe with the highest throughput, or None if none passed. """
+        passed = [probe for probe in self.probes if probe.passed]
+        return max(passed, key=lambda probe: probe.throughput) if len(passed) > 0 else None
+
+    def sorted(self):
+        """Return the probes made in order of increasing load. """
+        return sorted(self.probes, key=lambda probe: probe.load)
+
+    def __probe(self, load):
+        """Run and check a probe at a load. """
+        if self.log is not None: self.log.info('Probing at a load of %s', load)
+        throughput, errors, latency = self.probe(load)
+        probe = Probe(load, throughput, errors, latency)
+        if errors > self.error_ratio:
+            probe.passed, probe.reason = False, 'Error ratio %.2f > %.2f' % (errors, self.error_ratio)
+        elif self.latency is not None and latency is not None and latency.percentile(self.percentile) > self.latency:
+            probe.passed, probe.reason = False, 'Latency p%g %.3f > %.3f' % (
+                self.percentile, latency.percentile(self.percentile), self.latency)
+        if self.log is not None:
+            self.log.info('Throughput %.2f at a load of %s %s', throughput, load,
+                          'passed' if probe.passed else 'failed (%s)' % probe.reason)
+        self.probes.append(probe)
+        return probe
+
+    def __bound(self, load):
+        """Round a load to the resolution and cap at the maximum. """
+        load = int(load / self.resolution) * self.resolution
+        if isinstance(self.resolution, int): load = int(load)
+        return min(load, self.maximum) if self.maximum is not None else load
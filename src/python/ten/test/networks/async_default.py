@@ -0,0 +1,259 @@
+import asyncio
+from web3 import AsyncWeb3
+from pysys.constants import *
+from ten.test.utils.properties import Properties
+from ten.test.networks.default import DefaultPostLondon, DefaultPreLondon
+from ten.test.networks.receipts import ReceiptTracker
+
+
+class AsyncDefaultPostLondon(DefaultPostLondon):
+    """An asyncio twin of the default connection, built on AsyncWeb3 over aiohttp.
+
+    Connecting, building, sending and waiting for transactions are coroutines, so that a single test process can drive
+    many concurrent accounts and in-flight transactions from one event loop, rather than launching a client process
+    per account. Only HTTP connections are supported. Receipts are resolved through the shared receipt tracker for the
+    endpoint, so that any number of waiting coroutines result in a block scan rather than a poll per transaction. The
+    nonce persistence, cost accounting and funding of accounts are shared with the synchronous connections; the
+    persistence is written behind so does not block the event loop, and funding runs in a worker thread.
+    """
+
+    async def connect(self, test, private_key, web_socket=False, check_funds=True, verbose=True):
+        """Connect to the network using a given private key, returning the AsyncWeb3 instance and account."""
+        web3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(self.connection_url()))
+        account = web3.eth.account.from_key(private_key)
+        await self.register(test, account)
+        balance = web3.from_wei(await web3.eth.get_balance(account.address), 'ether')
+        if verbose: self.log.info('Account %s connected to %s (%.6f ETH)', account.address, self.__class__.__name__, balance)
+
+        if check_funds and balance < self.ETH_LIMIT:
+            if verbose: self.log.info('Account %s balance is below threshold %s ... need to distribute funds', account.address, self.ETH_LIMIT)
+            await asyncio.to_thread(test.distribute_native, account, self.ETH_ALLOC)
+            if verbose:
+                balance = web3.from_wei(await web3.eth.get_balance(account.address), 'ether')
+                self.log.info('Account %s balance is now %.6f ETH', account.address, balance)
+        return web3, account
+
+    async def register(self, test, account):
+        """Register an account with the connection so that its state can be read, if required."""
+        pass
+
+    async def connect_account1(self, test, web_socket=False, check_funds=True, verbose=True):
+        """Connect account 1 to the network."""
+        return await self.connect(test, Properties().account1pk(test), web_socket, check_funds, verbose)
+
+    async def connect_account2(self, test, web_socket=False, check_funds=True, verbose=True):
+        """Connect account 2 to the network."""
+        return await self.connect(test, Properties().account2pk(test), web_socket, check_funds, verbose)
+
+    async def connect_account3(self, test, web_socket=False, check_funds=True, verbose=True):
+        """Connect account 3 to the network."""
+        return await self.connect(test, Properties().account3pk(test), web_socket, check_funds, verbose)
+
+    async def connect_account4(self, test, web_socket=False, check_funds=True, verbose=True):
+        """Connect account 4 to the network."""
+        return await self.connect(test, Properties().account4pk(test), web_socket, check_funds, verbose)
+
+    async def tx(self, test, web3, tx, account, persist_nonce=True, verbose=True, timeout=30):
+        """Transact using the supplied transaction dictionary, adding in the nonce and chainId."""
+        if verbose: self.log.info('Account %s performing transaction', account.address)
+        nonce = await self.get_next_nonce(test, web3, account, persist_nonce, verbose)
+        tx['nonce'] = nonce
+        tx['chainId'] = await web3.eth.chain_id
+        tx_sign = self.sign_transaction(test, tx, nonce, account, persist_nonce)
+        tx_hash = await self.send_transaction(test, web3, nonce, account, tx_sign, persist_nonce, verbose)
+        tx_recp = await self.wait_for_transaction(test, web3, nonce, account, tx_hash, persist_nonce, verbose, timeout)
+        if tx_recp.status != 1:
+            await self.replay_transaction(web3, tx, tx_recp)
+            test.addOutcome(FAILED, abortOnError=True)
+        return tx_recp
+
+    async def transact(self, test, web3, target, account, gas_limit, persist_nonce=True, verbose=True, timeout=30,
+                       **kwargs):
+        """Transact using either a contract constructor or contract function as the target."""
+        if verbose: self.log.info('Account %s performing transaction', account.address)
+        nonce = await self.get_next_nonce(test, web3, account, persist_nonce, verbose)
+        tx = await self.build_transaction(test, web3, target, nonce, account, gas_limit, verbose, **kwargs)
+        tx_sign = self.sign_transaction(test, tx, nonce, account, persist_nonce)
+        tx_hash = await self.send_transaction(test, web3, nonce, account, tx_sign, persist_nonce, verbose)
+        tx_recp = await self.wait_for_transaction(test, web3, nonce, account, tx_hash, persist_nonce, verbose, timeout)
+        if tx_recp.status != 1:
+            await self.replay_transaction(web3, tx, tx_recp)
+            test.addOutcome(FAILED, abortOnError=True)
+        return tx_recp
+
+    async def tx_many(self, test, web3, txs, account, persist_nonce=True, verbose=True, timeout=30):
+        """Transact a list of transaction dictionaries, pipelining their submission."""
+        if verbose: self.log.info('Account %s performing %d transactions', account.address, len(txs))
+        nonces = await self.get_next_nonces(test, web3, account, len(txs), persist_nonce, verbose)
+        chain_id = await web3.eth.chain_id
+        for tx, nonce in zip(txs, nonces):
+            tx['nonce'] = nonce
+            tx['chainId'] = chain_id
+        return await self.__pipeline(test, web3, txs, nonces, account, persist_nonce, verbose, timeout)
+
+    async def transact_many(self, test, web3, targets, account, gas_limit, persist_nonce=True, verbose=True,
+                            timeout=30, **kwargs):
+        """Transact using a list of contract constructors or contract functions as the targets, pipelining submission.
+        """
+        if verbose: self.log.info('Account %s performing %d transactions', account.address, len(targets))
+        nonces = await self.get_next_nonces(test, web3, account, len(targets), persist_nonce, verbose)
+        txs = await asyncio.gather(*[self.build_transaction(test, web3, target, nonce, account, gas_limit, verbose,
+                                                            **kwargs) for target, nonce in zip(targets, nonces)])
+        return await self.__pipeline(test, web3, list(txs), nonces, account, persist_nonce, verbose, timeout)
+
+    async def __pipeline(self, test, web3, txs, nonces, account, persist_nonce, verbose, timeout):
+        """Sign and send a list of transactions in nonce order, and then wait for all of their receipts."""
+        tx_hashes = []
+        for tx, nonce in zip(txs, nonces):
+            tx_sign = self.sign_transaction(test, tx, nonce, account, persist_nonce)
+            tx_hashes.append(await self.send_transaction(test, web3, nonce, account, tx_sign, persist_nonce, verbose))
+        tx_recps = await self.wait_for_transactions(test, web3, nonces, account, tx_hashes, persist_nonce, verbose,
+                                                    timeout)
+        failed = False
+        for tx, tx_recp in zip(txs, tx_recps):
+            if tx_recp is not None and tx_recp.status != 1:
+                await self.replay_transaction(web3, tx, tx_recp)
+                failed = True
+        if failed: test.addOutcome(FAILED, abortOnError=True)
+        return tx_recps
+
+    async def get_next_nonce(self, test, web3, account, persist_nonce, verbose=True):
+        """Get the next nonce, either from persistence or from the transaction count."""
+        return (await self.get_next_nonces(test, web3, account, 1, persist_nonce, verbose))[0]
+
+    async def get_next_nonces(self, test, web3, account, count, persist_nonce, verbose=True):
+        """Get a run of consecutive nonces, either from persistence or from the transaction count.
+
+        The transaction count is only read from the network when not persisting, or to seed the allocator for the
+        account on first use.
+        """
+        tx_count = None
+        if not persist_nonce or not test.nonce_db.is_allocating(account.address, test.env):
+            tx_count = await web3.eth.get_transaction_count(account.address)
+        return test.nonce_db.get_next_nonces(test, None, account.address, test.env, count, persist_nonce, verbose,
+                                             transaction_count=tx_count)
+
+    async def build_transaction(self, test, web3, target, nonce, account, gas_limit, verbose=True, **kwargs):
+        """Build the transaction dictionary from the contract constructor or function target."""
+        estimate = kwargs['estimate'] if 'estimate' in kwargs else True
+        gas_attempts = int(kwargs['gas_attempts']) if 'gas_attempts' in kwargs else 1
+        base_fee_per_gas = (await web3.eth.get_block('latest')).baseFeePerGas
+        max_priority_fee_per_gas = web3.to_wei(1, 'gwei')
+        max_fee_per_gas = (5 * base_fee_per_gas) + max_priority_fee_per_gas
+
+        params = {
+            'from': account.address,                          # the account originating the transaction
+            'nonce': nonce,                                   # the nonce to use
+            'chainId': await web3.eth.chain_id,               # the chain id
+            'maxFeePerGas': max_fee_per_gas,                  # Maximum amount you’re willing to pay
+            'maxPriorityFeePerGas': max_priority_fee_per_gas  # Priority fee to include the transaction in the block
+        }
+        gas_estimate = await self._estimate_gas(target, params, gas_limit, estimate, gas_attempts, **kwargs)
+        if verbose: self.log.info('Gas %d, base fee %d WEI', gas_estimate, base_fee_per_gas)
+        params['gas'] = int(1.1*gas_estimate)
+        return await target.build_transaction(params)
+
+    async def _estimate_gas(self, target, params, gas_limit, estimate, gas_attempts, **kwargs):
+        """Add any access list and value into the params, and return the gas estimate or limit if not estimating."""
+        if 'access_list' in kwargs: params['accessList'] = kwargs['access_list']
+        if 'value' in kwargs: params['value'] = kwargs['value']
+        gas_estimate = gas_limit
+        if estimate:
+            while gas_attempts > 0:
+                try:
+                    gas_estimate = await target.estimate_gas(params)
+                    break
+                except Exception as e:
+                    self.log.warn('Error estimating gas needed, %s' % e.args[0])
+                    gas_attempts -= 1
+                    await asyncio.sleep(5)
+        return gas_estimate
+
+    async def send_transaction(self, test, web3, nonce, account, signed_tx, persist_nonce, verbose=True):
+        """Send the signed transaction to the network."""
+        tx_hash = None
+        try:
+            tx_hash = await web3.eth.send_raw_transaction(signed_tx.rawTransaction)
+            if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'SENT')
+        except Exception as e:
+            self.log.error('Error sending raw transaction %s', e)
+            if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'TIMEDOUT')
+            test.addOutcome(BLOCKED, abortOnError=True)
+        if verbose: self.log.info('Transaction sent with hash %s', tx_hash.hex())
+        return tx_hash
+
+    async def wait_for_transaction(self, test, web3, nonce, account, tx_hash, persist_nonce, verbose=True, timeout=30):
+        """Wait for the transaction from the network to be acknowledged, recording its cost against the test."""
+        tracker = ReceiptTracker.get(web3)
+        future = tracker.track(tx_hash)
+        try:
+            # shield the tracker future as it may be shared with other waiters on the same hash
+            tx_receipt = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+            self.confirm_transaction(test, nonce, account, tx_receipt, persist_nonce, verbose)
+            return tx_receipt
+        except asyncio.TimeoutError:
+            tracker.untrack(tx_hash, future)
+            self.log.error('Transaction timed out, %s is not in the chain after %d seconds', AsyncWeb3.to_hex(tx_hash),
+                           timeout)
+            if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'TIMEDOUT')
+            test.addOutcome(TIMEDOUT, abortOnError=True)
+        except Exception as e:
+            self.log.error('Transaction %s receipt was not received, %s', AsyncWeb3.to_hex(tx_hash), e)
+            if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'TIMEDOUT')
+            test.addOutcome(TIMEDOUT, abortOnError=True)
+
+    async def wait_for_transactions(self, test, web3, nonces, account, tx_hashes, persist_nonce, verbose=True,
+                                    timeout=30):
+        """Wait for a set of transactions from the network to be acknowledged.
+
+        Receipts are returned in the order of the supplied transaction hashes, with None for any transaction that
+        timed out or whose receipt could not be fetched.
+        """
+        tracker = ReceiptTracker.get(web3)
+        tracked = [tracker.track(tx_hash) for tx_hash in tx_hashes]
+        futures = [asyncio.wrap_future(future) for future in tracked]
+        if len(futures) > 0: await asyncio.wait(futures, timeout=timeout)
+
+        tx_receipts = []
+        for nonce, tx_hash, future, tracked_future in zip(nonces, tx_hashes, futures, tracked):
+            if not future.done() or future.exception() is not None:
+                tracker.untrack(tx_hash, tracked_future)
+                if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'TIMEDOUT')
+                tx_receipts.append(None)
+            else:
+                self.confirm_transaction(test, nonce, account, future.result(), persist_nonce, verbose)
+                tx_receipts.append(future.result())
+
+        pending = [tx_receipt for tx_receipt in tx_receipts if tx_receipt is None]
+        if len(pending) > 0:
+            self.log.error('Timed out waiting for %d of %d transactions', len(pending), len(tx_hashes))
+            test.addOutcome(TIMEDOUT, abortOnError=True)
+        return tx_receipts
+
+    async def replay_transaction(self, web3, tx, tx_recp):
+        """Replay a transaction to get a failure reason."""
+        try:
+            await web3.eth.call(tx, block_identifier=tx_recp.blockNumber)
+            self.log.warn('Replaying the transaction did not throw an error')
+        except Exception as e:
+            self.log.error('Replay call: %s', e)
+
+
+class AsyncDefaultPreLondon(AsyncDefaultPostLondon, DefaultPreLondon):
+    """An asyncio twin of the default connection pre the london fork."""
+
+    async def build_transaction(self, test, web3, target, nonce, account, gas_limit, verbose=True, **kwargs):
+        """Build the transaction dictionary from the contract constructor or function target. """
+        estimate = kwargs['estimate'] if 'estimate' in kwargs else True
+        gas_attempts = int(kwargs['gas_attempts']) if 'gas_attempts' in kwargs else 1
+        gas_price = await web3.eth.gas_price
+        params = {
+            'from': account.address,              # the account originating the transaction
+            'nonce': nonce,                       # the nonce to use
+            'chainId': await web3.eth.chain_id,   # the chain id
+            'gasPrice': gas_price                 # the current gas price
+        }
+        gas_estimate = await self._estimate_gas(target, params, gas_limit, estimate, gas_attempts, **kwargs)
+        if verbose: self.log.info('Gas %d, price %d WEI', gas_estimate, gas_price)
+        params['gas'] = int(1.1*gas_estimate)
+        return await target.build_transaction(params)
@@ -0,0 +1,15 @@
+from ten.test.networks.ten import Ten
+from ten.test.networks.gateway import GatewayCache
+from ten.test.networks.async_default import AsyncDefaultPreLondon
+
+
+class AsyncTen(AsyncDefaultPreLondon, Ten):
+    """An asyncio twin of the L2 connection for Ten.
+
+    The gateway is selected and joined as for the synchronous connection when the instance is created, with accounts
+    registered against the token from a coroutine on connection, skipping any already registered.
+    """
+
+    async def register(self, test, account):
+        """Register an account against the token of the connection. """
+        await GatewayCache.register_async(self.gateway_url(), self.CHAIN_ID, self.ID, account)
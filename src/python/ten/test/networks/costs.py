@@ -0,0 +1,49 @@
+import threading
+
+
+class CostLedger:
+    """Accumulates the cost of transactions per account from their receipts, rather than from balance deltas.
+
+    The network connection notes the value and gas price of each transaction as it is signed, and records the cost
+    when the receipt is received, as gasUsed * effectiveGasPrice in fees plus the value transferred. As costs are
+    attributed to the transactions a test made itself, they are exact even when accounts are shared with other tests
+    running in parallel. Each test holds its own ledger, with the totals across all ledgers held for the runner.
+    """
+    _lock = threading.Lock()        # guards the run totals
+    _totals = {'gas': 0, 'fees': 0, 'value': 0, 'transactions': 0}
+
+    def __init__(self):
+        """Instantiate an instance."""
+        self.accounts = {}          # address to dictionary of gas, fees, value and transactions
+        self._pending = {}          # (address, nonce) to (value, gas price) of signed transactions
+        self._lock = threading.Lock()
+
+    @classmethod
+    def totals(cls):
+        """Return a dictionary of the total gas, fees, value and transactions across all ledgers. """
+        with cls._lock: return dict(cls._totals)
+
+    @staticmethod
+    def fee(receipt, gas_price=0):
+        """Return the fee paid for a transaction from its receipt, using the supplied gas price if not reported. """
+        return receipt.gasUsed * receipt.get('effectiveGasPrice', gas_price)
+
+    def signed(self, address, nonce, tx):
+        """Note the value and gas price of a transaction dictionary when signed. """
+        gas_price = tx.get('gasPrice', tx.get('maxFeePerGas', 0))
+        with self._lock: self._pending[(address, nonce)] = (tx.get('value', 0), gas_price)
+
+    def record(self, address, nonce, receipt):
+        """Record the cost of a transaction from its receipt, where value is only transferred on success. """
+        with self._lock: value, gas_price = self._pending.pop((address, nonce), (0, 0))
+        cost = {'gas': receipt.gasUsed, 'fees': self.fee(receipt, gas_price),
+                'value': value if receipt.status == 1 else 0, 'transactions': 1}
+        with self._lock:
+            account = self.accounts.setdefault(address, {'gas': 0, 'fees': 0, 'value': 0, 'transactions': 0})
+            for key, amount in cost.items(): account[key] += amount
+        with CostLedger._lock:
+            for key, amount in cost.items(): CostLedger._totals[key] += amount
+
+    def total(self, key):
+        """Return the total of the gas, fees, value or transactions across all accounts in the ledger. """
+        with self._lock: return sum(account[key] for account in self.accounts.values())
@@ -4,6 +4,8 @@ from web3.datastructures import AttributeDict
 from web3.exceptions import TimeExhausted
 from pysys.constants import *
 from ten.test.utils.properties import Properties
+from ten.test.networks.provider import ProviderFactory, BatchRequest
+from ten.test.networks.receipts import ReceiptTracker
 
 
 def attributedict_to_dict(obj):
@@ -55,7 +57,7 @@ class DefaultPostLondon:
         """Connect to the network using a given private key."""
         url = self.connection_url(web_socket)
 
-        if not web_socket: web3 = Web3(Web3.HTTPProvider(url))
+        if not web_socket: web3 = Web3(ProviderFactory.http_provider(url))
         else: web3 = Web3(Web3.WebsocketProvider(url, websocket_timeout=120))
         account = web3.eth.account.from_key(private_key)
         balance = web3.from_wei(web3.eth.get_balance(account.address), 'ether')
@@ -69,21 +71,55 @@ class DefaultPostLondon:
                 self.log.info('Account %s balance is now %.6f ETH', account.address, balance)
         return web3, account
 
+    def register_accounts(self, test, accounts):
+        """Register a list of accounts with the connection so that their state can be read, if required."""
+        pass
+
+    def batch(self, web3):
+        """Return a JSON-RPC batch request against the endpoint of an HTTP connection."""
+        return BatchRequest(web3.provider.endpoint_uri)
+
+    def get_balances(self, web3, addresses, block='latest'):
+        """Get the balance of a list of addresses in a single round trip."""
+        batch = self.batch(web3)
+        for address in addresses: batch.get_balance(address, block)
+        return batch.execute()
+
+    def get_transaction_counts(self, web3, addresses, block='latest'):
+        """Get the transaction count of a list of addresses in a single round trip."""
+        batch = self.batch(web3)
+        for address in addresses: batch.get_transaction_count(address, block)
+        return batch.execute()
+
+    def get_transaction_receipts(self, web3, tx_hashes):
+        """Get the transaction receipts for a list of transaction hashes in a single round trip.
+
+        The receipt will be None for any transaction not yet mined."""
+        batch = self.batch(web3)
+        for tx_hash in tx_hashes: batch.get_transaction_receipt(tx_hash)
+        return batch.execute()
+
+    def get_blocks(self, web3, start, end, full_transactions=False):
+        """Get the blocks within an inclusive range of block numbers in a single round trip."""
+        batch = self.batch(web3)
+        for number in range(start, end+1): batch.get_block(number, full_transactions)
+        return batch.execute()
+
     def connect_account1(self, test, web_socket=False, check_funds=True, verbose=True):
         """Connect account 1 to the network."""
-        return self.connect(test, Properties().account1pk(), web_socket, check_funds, verbose)
+        return self.connect(test, Properties().account1pk(test), web_socket, check_funds, verbose)
 
     def connect_account2(self, test, web_socket=False, check_funds=True, verbose=True):
         """Connect account 2 to the network."""
-        return self.connect(test, Properties().account2pk(), web_socket, check_funds, verbose)
+        return self.connect(test, Properties().account2pk(test), web_socket, check_funds, verbose)
 
     def connect_account3(self, test, web_socket=False, check_funds=True, verbose=True):
         """Connect account 3 to the network."""
-        return self.connect(test, Properties().account3pk(), web_socket, check_funds, verbose)
+        return self.connect(test, Properties().account3pk(test), web_socket, check_funds, verbose)
 
     def connect_account4(self, test, web_socket=False, check_funds=True, verbose=True):
         """Connect account 4 to the network."""
-        return self.connect(test, Properties().account4pk(), web_socket, check_funds, verbose)
+        return self.connect(test, Properties().account4pk(test), web_socket, check_funds, verbose)
 
     def tx(self, test, web3, tx, account, persist_nonce=True, verbose=True, timeout=30):
         """Transact using the supplied transaction dictionary.
@@ -121,11 +157,59 @@ class DefaultPostLondon:
             test.addOutcome(FAILED, abortOnError=True)
         return tx_recp
 
+    def tx_many(self, test, web3, txs, account, persist_nonce=True, verbose=True, timeout=30):
+        """Transact a list of transaction dictionaries, pipelining their submission.
+
+        A run of nonces is allocated for all transactions up front, all transactions are signed and sent, and the
+        receipts are then waited for together, so that the total time is not one block time per transaction. As for tx,
+        the nonce and chainId are added into each transaction dictionary. Receipts are returned in submission order.
+        """
+        if verbose: self.log.info('Account %s performing %d transactions', account.address, len(txs))
+        nonces = self.get_next_nonces(test, web3, account, len(txs), persist_nonce, verbose)
+        chain_id = web3.eth.chain_id
+        for tx, nonce in zip(txs, nonces):
+            tx['nonce'] = nonce
+            tx['chainId'] = chain_id
+        return self.__pipeline(test, web3, txs, nonces, account, persist_nonce, verbose, timeout)
+
+    def transact_many(self, test, web3, targets, account, gas_limit, persist_nonce=True, verbose=True, timeout=30,
+                      **kwargs):
+        """Transact using a list of contract constructors or contract functions as the targets, pipelining submission.
+
+        As for tx_many, but with each transaction built from its target as in transact. Receipts are returned in the
+        order the targets were supplied.
+        """
+        self.log.info('Account %s performing %d transactions', account.address, len(targets))
+        nonces = self.get_next_nonces(test, web3, account, len(targets), persist_nonce, verbose)
+        txs = [self.build_transaction(test, web3, target, nonce, account, gas_limit, verbose, **kwargs)
+               for target, nonce in zip(targets, nonces)]
+        return self.__pipeline(test, web3, txs, nonces, account, persist_nonce, verbose, timeout)
+
+    def __pipeline(self, test, web3, txs, nonces, account, persist_nonce, verbose, timeout):
+        """Sign and send a list of transactions, and then wait for all of their receipts."""
+        tx_hashes = []
+        for tx, nonce in zip(txs, nonces):
+            tx_sign = self.sign_transaction(test, tx, nonce, account, persist_nonce)
+            tx_hashes.append(self.send_transaction(test, web3, nonce, account, tx_sign, persist_nonce, verbose))
+        tx_recps = self.wait_for_transactions(test, web3, nonces, account, tx_hashes, persist_nonce, verbose, timeout)
+
+        failed = False
+        for tx, tx_recp in zip(txs, tx_recps):
+            if tx_recp is not None and tx_recp.status != 1:
+                self.replay_transaction(web3, tx, tx_recp)
+                failed = True
+        if failed: test.addOutcome(FAILED, abortOnError=True)
+        return tx_recps
+
     def get_next_nonce(self, test, web3, account, persist_nonce, verbose=True):
         """Get the next nonce, either from persistence or from the transaction count."""
         nonce = test.nonce_db.get_next_nonce(test, web3, account.address, test.env, persist_nonce, verbose)
         return nonce
 
+    def get_next_nonces(self, test, web3, account, count, persist_nonce, verbose=True):
+        """Get a run of consecutive nonces, either from persistence or from the transaction count."""
+        return test.nonce_db.get_next_nonces(test, web3, account.address, test.env, count, persist_nonce, verbose)
+
     def build_transaction(self, test, web3, target, nonce, account, gas_limit, verbose=True, **kwargs):
         """Build the transaction dictionary from the contract constructor or function target."""
         estimate = kwargs['estimate'] if 'estimate' in kwargs else True
@@ -144,6 +228,7 @@ class DefaultPostLondon:
             'maxPriorityFeePerGas': max_priority_fee_per_gas  # Priority fee to include the transaction in the block
         }
         if 'access_list' in kwargs: params['accessList'] = kwargs['access_list']
+        if 'value' in kwargs: params['value'] = kwargs['value']
         if estimate:
             while gas_attempts > 0:
                 try:
@@ -166,6 +251,7 @@ class DefaultPostLondon:
     def sign_transaction(self, test, tx, nonce, account, persist_nonce):
         """Sign a transaction."""
         signed_tx = account.sign_transaction(tx)
+        test.costs.signed(account.address, nonce, tx)
         if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'SIGNED')
         return signed_tx
 
@@ -183,18 +269,14 @@ class DefaultPostLondon:
         return tx_hash
 
     def wait_for_transaction(self, test, web3, nonce, account, tx_hash, persist_nonce, verbose=True, timeout=30):
-        """Wait for the transaction from the network to be acknowledged."""
+        """Wait for the transaction from the network to be acknowledged, recording its cost against the test."""
         tx_receipt = None
         try:
-            tx_receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
-
-            if tx_receipt.status == 1:
-                if verbose: self.log.info('Transaction receipt block hash %s', tx_receipt.blockHash.hex())
-                if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'CONFIRMED')
+            if isinstance(web3.provider, Web3.HTTPProvider):
+                tx_receipt = ReceiptTracker.get(web3).wait(tx_hash, timeout=timeout)
             else:
-                self.log.error('Transaction receipt failed')
-                self.log.error('Full receipt: %s', tx_receipt)
-                if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'FAILED')
+                tx_receipt = web3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+            self.confirm_transaction(test, nonce, account, tx_receipt, persist_nonce, verbose)
 
         except TimeExhausted as e:
             self.log.error('Transaction timed out %s', e)
@@ -203,6 +285,42 @@ class DefaultPostLondon:
 
         return tx_receipt
 
+    def wait_for_transactions(self, test, web3, nonces, account, tx_hashes, persist_nonce, verbose=True, timeout=30):
+        """Wait for a set of transactions from the network to be acknowledged.
+
+        Receipts are resolved through the receipt tracker for the connection, so that they are fetched per block rather
+        than polled for per transaction. Receipts are returned in the order of the supplied transaction hashes, with
+        None for any transaction that timed out.
+        """
+        if not isinstance(web3.provider, Web3.HTTPProvider):
+            return [self.wait_for_transaction(test, web3, nonce, account, tx_hash, persist_nonce, verbose, timeout)
+                    for nonce, tx_hash in zip(nonces, tx_hashes)]
+
+        tx_receipts = ReceiptTracker.get(web3).wait_all(tx_hashes, timeout=timeout)
+        pending = [tx_receipt for tx_receipt in tx_receipts if tx_receipt is None]
+
+        for nonce, tx_receipt in zip(nonces, tx_receipts):
+            if tx_receipt is None:
+                if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'TIMEDOUT')
+            else:
+                self.confirm_transaction(test, nonce, account, tx_receipt, persist_nonce, verbose)
+
+        if len(pending) > 0:
+            self.log.error('Timed out waiting for %d of %d transactions', len(pending), len(tx_hashes))
+            test.addOutcome(TIMEDOUT, abortOnError=True)
+        return tx_receipts
+
+    def confirm_transaction(self, test, nonce, account, tx_receipt, persist_nonce, verbose=True):
+        """Record the outcome of a transaction from its receipt against the nonce persistence and test costs."""
+        test.costs.record(account.address, nonce, tx_receipt)
+        if tx_receipt.status == 1:
+            if verbose: self.log.info('Transaction receipt block hash %s', tx_receipt.blockHash.hex())
+            if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'CONFIRMED')
+        else:
+            self.log.error('Transaction receipt failed')
+            self.log.error('Full receipt: %s', tx_receipt)
+            if persist_nonce: test.nonce_db.update(account.address, test.env, nonce, 'FAILED')
+
     def replay_transaction(self, web3, tx, tx_recp):
         """Replay a transaction to get a failure reason."""
         try:
@@ -239,6 +357,7 @@ class DefaultPreLondon(DefaultPostLondon):
             'gasPrice': gas_price             # the current gas price
         }
         if 'access_list' in kwargs: params['accessList'] = kwargs['access_list']
+        if 'value' in kwargs: params['value'] = kwargs['value']
         if estimate:
             while gas_attempts > 0:
                 try:
@@ -1,4 +1,5 @@
 from ten.test.networks.default import DefaultPreLondon
+from ten.test.networks.async_default import AsyncDefaultPreLondon
 from ten.test.utils.properties import Properties
 
 
@@ -16,3 +17,8 @@ class Ganache(DefaultPreLondon):
         self.PORT = props.port_http('ganache')
         self.WS_PORT = props.port_ws('ganache')
         self.CHAIN_ID = props.chain_id('ganache')
+
+
+class AsyncGanache(AsyncDefaultPreLondon, Ganache):
+    """An asyncio twin of the Ganache connection."""
+    pass
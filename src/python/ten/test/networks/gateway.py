@@ -0,0 +1,143 @@
+import json, threading, asyncio, aiohttp
+from eth_account import Account
+from eth_account.messages import encode_typed_data
+from ten.test.networks.provider import ProviderFactory
+
+
+class GatewayCache:
+    """A process wide cache of the tokens joined on, and accounts registered with, Ten gateways.
+
+    Every connection to a gateway joins to get its own token, and every account used on the connection is registered
+    against the token through a signed EIP-712 message. Registrations are cached per gateway on the (token, address),
+    and the signed messages are memoised on the (chain id, token, address), so that connecting an account already
+    registered on a token makes neither the signature nor the HTTP request. Tokens are never shared between
+    connections, but a pool of tokens can be pre-joined in the background for a gateway, so that a connection draws a
+    token from the pool without waiting on the join, the pool being topped up again as tokens are drawn. Coroutines
+    registering accounts share an aiohttp session per gateway and event loop, which should be closed through
+    close_sessions before the loop completes.
+    """
+    _lock = threading.Lock()        # guards the pools, registrations, signatures and sessions
+    _pools = {}                     # gateway url to list of pre-joined tokens
+    _sizes = {}                     # gateway url to the target size of the pool
+    _filling = set()                # gateway urls with a background fill in progress
+    _registered = set()             # (gateway url, token, address) registered
+    _signatures = {}                # (chain id, token, address) to hex signature
+    _sessions = {}                  # (gateway url, event loop) to aiohttp session
+
+    @classmethod
+    def prejoin(cls, url, size):
+        """Maintain a pool of pre-joined tokens of a given size for the gateway at a url, e.g. http://host:port. """
+        with cls._lock: cls._sizes[url] = size
+        cls.__fill(url)
+
+    @classmethod
+    def join(cls, url):
+        """Return a new token for the gateway, drawn from the pre-joined pool if available, else joined directly.
+
+        Returns None if the join fails.
+        """
+        with cls._lock:
+            pool = cls._pools.get(url, [])
+            token = pool.pop(0) if len(pool) > 0 else None
+        if token is None: token = cls.__join(url)
+        cls.__fill(url)
+        return token
+
+    @classmethod
+    def is_registered(cls, url, token, address):
+        """Return true if an address has been registered against a token on the gateway. """
+        with cls._lock: return (url, token, address) in cls._registered
+
+    @classmethod
+    def register(cls, url, chain_id, token, account):
+        """Register an account against a token on the gateway, returning true if registered.
+
+        The request is skipped if the account is already registered on the token.
+        """
+        if cls.is_registered(url, token, account.address): return True
+        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        data = {"signature": cls.sign(chain_id, token, account), "address": account.address}
+        auth_url = '%s/v1/authenticate/?token=%s' % (url, token)
+        response = ProviderFactory.session(auth_url).post(auth_url, data=json.dumps(data), headers=headers)
+        if response.ok:
+            with cls._lock: cls._registered.add((url, token, account.address))
+        return response.ok
+
+    @classmethod
+    async def register_async(cls, url, chain_id, token, account):
+        """Register an account against a token on the gateway from a coroutine, returning true if registered. """
+        if cls.is_registered(url, token, account.address): return True
+        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        data = {"signature": cls.sign(chain_id, token, account), "address": account.address}
+        auth_url = '%s/v1/authenticate/?token=%s' % (url, token)
+        async with cls.__session(url).post(auth_url, data=json.dumps(data), headers=headers) as response:
+            registered = response.ok
+        if registered:
+            with cls._lock: cls._registered.add((url, token, account.address))
+        return registered
+
+    @classmethod
+    async def close_sessions(cls):
+        """Close the aiohttp sessions opened from the running event loop. """
+        loop = asyncio.get_running_loop()
+        with cls._lock:
+            sessions = [cls._sessions.pop(key) for key in list(cls._sessions.keys()) if key[1] is loop]
+        for session in sessions: await session.close()
+
+    @classmethod
+    def sign(cls, chain_id, token, account):
+        """Return the hex signature of the authentication message for a token, signing it on first use. """
+        key = (chain_id, token, account.address)
+        with cls._lock: signature = cls._signatures.get(key)
+        if signature is not None: return signature
+
+        domain = {'name': 'Ten', 'version': '1.0', 'chainId': chain_id}
+        types = {
+            'Authentication': [
+                {'name': 'Encryption Token', 'type': 'address'},
+            ],
+        }
+        message = {'Encryption Token': "0x"+token}
+        signable_msg_from_dict = encode_typed_data(domain, types, message)
+        signature = Account.sign_message(signable_msg_from_dict, account.key).signature.hex()
+        with cls._lock: cls._signatures[key] = signature
+        return signature
+
+    @classmethod
+    def __session(cls, url):
+        """Return the aiohttp session for a gateway on the running event loop, created on first use. """
+        key = (url, asyncio.get_running_loop())
+        with cls._lock:
+            if key not in cls._sessions or cls._sessions[key].closed: cls._sessions[key] = aiohttp.ClientSession()
+            return cls._sessions[key]
+
+    @classmethod
+    def __fill(cls, url):
+        """Top up the pool for a gateway to its target size in a background thread, if not already doing so. """
+        with cls._lock:
+            if len(cls._pools.get(url, [])) >= cls._sizes.get(url, 0) or url in cls._filling: return
+            cls._filling.add(url)
+
+        def fill():
+            try:
+                while True:
+                    with cls._lock:
+                        if len(cls._pools.get(url, [])) >= cls._sizes.get(url, 0): break
+                    token = cls.__join(url)
+                    if token is None: break
+                    with cls._lock: cls._pools.setdefault(url, []).append(token)
+            finally:
+                with cls._lock: cls._filling.discard(url)
+
+        threading.Thread(target=fill, name='GatewayJoin', daemon=True).start()
+
+    @staticmethod
+    def __join(url):
+        """Join the gateway to get a new token, returning None on failure. """
+        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        join_url = '%s/v1/join/' % url
+        try:
+            response = ProviderFactory.session(join_url).get(join_url, headers=headers)
+            return response.text.strip() if response.ok else None
+        except Exception:
+            return None
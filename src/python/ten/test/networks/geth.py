@@ -1,6 +1,7 @@
 from web3 import Web3
 from web3.middleware import geth_poa_middleware
 from ten.test.networks.default import DefaultPreLondon
+from ten.test.networks.provider import ProviderFactory
 
 
 class Geth(DefaultPreLondon):
@@ -13,7 +14,7 @@ class Geth(DefaultPreLondon):
         url = self.connection_url(web_socket)
 
         if verbose: test.log.info('Connecting to %s', self.__class__.__name__)
-        if not web_socket: web3 = Web3(Web3.HTTPProvider(url))
+        if not web_socket: web3 = Web3(ProviderFactory.http_provider(url))
         else: web3 = Web3(Web3.WebsocketProvider(url, websocket_timeout=120))
         web3.middleware_onion.inject(geth_poa_middleware, layer=0)
         account = web3.eth.account.from_key(private_key)
@@ -0,0 +1,237 @@
+import threading, time, requests
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3._utils.method_formatters import receipt_formatter, block_formatter
+from ten.test.utils.properties import Properties
+from ten.test.utils.exceptions import BatchRequestError
+
+
+class ProviderFactory:
+    """Factory for web3 HTTP providers that share pooled keep-alive sessions.
+
+    A single requests.Session is held per host (scheme, host and port), and is shared across all providers and threads
+    connecting to that host. Each session mounts an adapter with a bounded connection pool, the size of which and
+    whether connections are kept alive are set through the [network.http] section of the properties. Counts of the
+    connections opened and the requests made are held at the class level, so that reuse can be reported by the runner.
+    """
+    POOL_SIZE = 16                  # pool size used when the properties are not available e.g. in client scripts
+    _lock = threading.Lock()        # guards the sessions and counters
+    _sessions = {}                  # scheme://host:port to session
+    opened = 0                      # number of TCP/TLS connections opened
+    requests = 0                    # number of HTTP requests made across all sessions
+
+    @classmethod
+    def http_provider(cls, url, stats=None, **kwargs):
+        """Return a web3 HTTP provider for the url, using the pooled session for the host.
+
+        If request stats are supplied, the outstanding requests and latency of all requests made through the provider
+        are recorded against them.
+        """
+        return PooledHTTPProvider(url, session=cls.session(url), stats=stats, **kwargs)
+
+    @classmethod
+    def session(cls, url):
+        """Return the pooled session for the host of a url, creating it on first use."""
+        parsed = urlparse(url)
+        key = '%s://%s' % (parsed.scheme, parsed.netloc)
+        with cls._lock:
+            if key not in cls._sessions:
+                pool_size, keep_alive = cls.__settings()
+                adapter = CountingHTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                if not keep_alive: session.headers['Connection'] = 'close'
+                cls._sessions[key] = session
+            return cls._sessions[key]
+
+    @classmethod
+    def stats(cls):
+        """Return a tuple of the connections opened, and the number of requests that reused an open connection."""
+        with cls._lock: return cls.opened, max(0, cls.requests - cls.opened)
+
+    @classmethod
+    def close(cls):
+        """Close all pooled sessions."""
+        with cls._lock:
+            for session in cls._sessions.values(): session.close()
+            cls._sessions.clear()
+
+    @classmethod
+    def __settings(cls):
+        """Return the pool size and keep alive settings, using defaults when run outside of the framework."""
+        try:
+            props = Properties()
+            return props.http_pool_size(), props.http_keep_alive()
+        except Exception:
+            return cls.POOL_SIZE, True
+
+    @classmethod
+    def _count(cls, opened=0, requests=0):
+        """Increment the connection and request counters."""
+        with cls._lock:
+            cls.opened += opened
+            cls.requests += requests
+
+
+class BatchRequest:
+    """A set of JSON-RPC read requests sent to a node in a single HTTP round trip.
+
+    Requests are added to the batch and then executed together, with the results returned in the order the requests
+    were added. Should an individual request within the batch fail, a BatchRequestError is returned in its place in
+    the results rather than raised, so that the remaining results are still available to the caller. Large batches are
+    split into chunks of at most max_size requests.
+    """
+
+    def __init__(self, url, max_size=100, timeout=30):
+        """Create a batch against the url of the node or gateway. """
+        self.url = url
+        self.max_size = max_size
+        self.timeout = timeout
+        self.requests = []
+
+    def add(self, method, params, formatter=None):
+        """Add a request to the batch, with an optional formatter to apply to a non-null result. """
+        self.requests.append((method, params, formatter))
+        return self
+
+    def get_balance(self, address, block='latest'):
+        return self.add('eth_getBalance', [address, block], lambda x: int(x, 16))
+
+    def get_transaction_count(self, address, block='latest'):
+        return self.add('eth_getTransactionCount', [address, block], lambda x: int(x, 16))
+
+    def get_transaction_receipt(self, tx_hash):
+        return self.add('eth_getTransactionReceipt', [Web3.to_hex(tx_hash)],
+                        lambda x: AttributeDict.recursive(receipt_formatter(x)))
+
+    def get_block(self, number, full_transactions=False):
+        block = Web3.to_hex(number) if isinstance(number, int) else number
+        return self.add('eth_getBlockByNumber', [block, full_transactions],
+                        lambda x: AttributeDict.recursive(block_formatter(x)))
+
+    def execute(self):
+        """Execute the batch returning a list of results, or BatchRequestError for any failed request. """
+        results = []
+        session = ProviderFactory.session(self.url)
+        for start in range(0, len(self.requests), self.max_size):
+            chunk = self.requests[start:start+self.max_size]
+            payload = [{'jsonrpc': '2.0', 'method': method, 'params': params, 'id': i}
+                       for i, (method, params, _) in enumerate(chunk)]
+            try:
+                response = session.post(self.url, json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                responses = response.json()
+            except Exception as e:
+                results.extend([BatchRequestError(method, str(e)) for method, _, _ in chunk])
+                continue
+
+            if not isinstance(responses, list):
+                message = responses.get('error', {}).get('message', str(responses))
+                results.extend([BatchRequestError(method, message) for method, _, _ in chunk])
+                continue
+
+            by_id = {item.get('id'): item for item in responses}
+            for i, (method, _, formatter) in enumerate(chunk):
+                results.append(self.__result(method, by_id.get(i), formatter))
+        self.requests = []
+        return results
+
+    @staticmethod
+    def __result(method, item, formatter):
+        """Extract the result, or error, of an individual response in the batch. """
+        if item is None: return BatchRequestError(method, 'No response returned')
+        if 'error' in item: return BatchRequestError(method, item['error'].get('message'), item['error'].get('code'))
+        result = item.get('result')
+        if result is None or formatter is None: return result
+        try:
+            return formatter(result)
+        except Exception as e:
+            return BatchRequestError(method, 'Unable to format result, %s' % e)
+
+
+class PooledHTTPProvider(Web3.HTTPProvider):
+    """A web3 HTTP provider that posts through a supplied session.
+
+    The web3 request utilities cache sessions per thread, which would defeat sharing a pool across the runner threads,
+    hence requests are made directly on the session given at construction.
+    """
+
+    def __init__(self, endpoint_uri, session, request_kwargs=None, stats=None):
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs)
+        self._pooled_session = session
+        self._stats = stats
+
+    def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        kwargs = dict(self.get_request_kwargs())
+        kwargs.setdefault('timeout', 10)
+        start = self._stats.start() if self._stats is not None else None
+        try:
+            response = self._pooled_session.post(self.endpoint_uri, data=request_data, **kwargs)
+        finally:
+            if start is not None: self._stats.end(start)
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+
+class RequestStats:
+    """Thread safe counts of the outstanding requests and request latencies against an endpoint. """
+
+    def __init__(self):
+        """Create an instance with no requests recorded. """
+        self.outstanding = 0            # requests currently in flight
+        self.requests = 0               # requests completed
+        self.total = 0.0                # total latency of completed requests in seconds
+        self.max = 0.0                  # max latency of completed requests in seconds
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Record the start of a request, returning the start time to be passed to end. """
+        with self._lock: self.outstanding += 1
+        return time.perf_counter()
+
+    def end(self, start):
+        """Record the completion of a request started at a given time. """
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.outstanding -= 1
+            self.requests += 1
+            self.total += latency
+            self.max = max(self.max, latency)
+
+    def mean(self):
+        """Return the mean latency of completed requests in seconds. """
+        with self._lock: return self.total / self.requests if self.requests > 0 else 0.0
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    """HTTP connection pool that counts new connections. """
+
+    def _new_conn(self):
+        ProviderFactory._count(opened=1)
+        return super()._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool that counts new connections. """
+
+    def _new_conn(self):
+        ProviderFactory._count(opened=1)
+        return super()._new_conn()
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTP adapter using the counting connection pools, and counting requests made. """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': CountingHTTPConnectionPool,
+                                                   'https': CountingHTTPSConnectionPool}
+
+    def send(self, request, **kwargs):
+        ProviderFactory._count(requests=1)
+        return super().send(request, **kwargs)
@@ -0,0 +1,204 @@
+import threading, time, logging
+from collections.abc import Mapping
+from concurrent.futures import Future, TimeoutError
+from web3 import Web3
+from web3.exceptions import TimeExhausted
+from ten.test.networks.provider import BatchRequest
+
+log = logging.getLogger('pysys.receipts')
+
+
+class ReceiptTracker:
+    """Resolves transaction receipts for a connection by watching for new blocks.
+
+    Rather than polling for the receipt of each transaction hash separately, pending hashes are registered with the
+    tracker, and a single background thread polls for new blocks. Each new block is fetched once (with transaction
+    hashes only), and the receipts for any pending hashes in the block are then fetched in a single batch request. The
+    number of requests made is therefore related to the number of blocks rather than the number of transactions in
+    flight. Callers are returned a future for each hash, to which callbacks can be added or on which they can wait.
+
+    To cover a transaction being included in a block already scanned before it was registered, any hashes pending for
+    longer than the recheck interval are also queried directly in a single batch. A tracker is shared per endpoint, and
+    is only supported for HTTP connections. As the endpoint of a Ten connection includes its token, trackers should be
+    closed when the connection is no longer used; closing fails any futures still pending. Should the scan fail
+    repeatedly, all pending futures are failed with the last error rather than being left to time out. Waiters on the
+    same hash share its future, so the waiters are counted, and a hash is only no longer tracked once every waiter
+    that gave up on it has untracked it.
+    """
+    MAX_ERRORS = 10                 # consecutive scan failures after which pending futures are failed
+    MAX_TIMESTAMPS = 10000          # number of most recent block timestamps retained
+    _lock = threading.Lock()        # guards the shared trackers
+    _trackers = {}                  # endpoint url to tracker
+
+    @classmethod
+    def get(cls, web3, poll_latency=0.5, recheck=5.0):
+        """Return the shared tracker for the endpoint of an HTTP web3 connection."""
+        url = web3.provider.endpoint_uri
+        with cls._lock:
+            if url not in cls._trackers: cls._trackers[url] = ReceiptTracker(url, poll_latency, recheck)
+            return cls._trackers[url]
+
+    @classmethod
+    def close_url(cls, url):
+        """Close the shared tracker for an endpoint url, if one exists. """
+        with cls._lock: tracker = cls._trackers.pop(url, None)
+        if tracker is not None: tracker.close()
+
+    @classmethod
+    def close_all(cls):
+        """Close all shared trackers. """
+        with cls._lock:
+            trackers = list(cls._trackers.values())
+            cls._trackers.clear()
+        for tracker in trackers: tracker.close()
+
+    def __init__(self, url, poll_latency=0.5, recheck=5.0):
+        """Create a tracker against the url of the node or gateway."""
+        self.url = url
+        self.poll_latency = poll_latency
+        self.recheck = recheck
+        self.requests = 0               # number of requests made by the tracker
+        self.timestamps = {}            # block number to timestamp for all scanned blocks
+        self._pending = {}              # hex tx hash to [future, time registered, number of waiters]
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._last_block = None
+        self._last_recheck = time.time()
+        self._errors = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self.__run, name='ReceiptTracker', daemon=True)
+        self._thread.start()
+
+    def track(self, tx_hash, callback=None):
+        """Register a transaction hash to be tracked, returning a future that will hold the receipt."""
+        key = self.__key(tx_hash)
+        with self._condition:
+            if self._closed: raise RuntimeError('Receipt tracker for %s is closed' % self.url)
+            if key in self._pending:
+                future = self._pending[key][0]
+                self._pending[key][2] += 1
+            else:
+                future = Future()
+                self._pending[key] = [future, time.time(), 1]
+                self._condition.notify()
+        if callback is not None: future.add_done_callback(callback)
+        return future
+
+    def wait(self, tx_hash, timeout=30):
+        """Wait for the receipt of a transaction, raising TimeExhausted should it not be received in the timeout."""
+        future = self.track(tx_hash)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            self.untrack(tx_hash, future)
+            raise TimeExhausted('Transaction %s is not in the chain after %d seconds' % (self.__key(tx_hash), timeout))
+        except Exception as e:
+            raise TimeExhausted('Transaction %s receipt was not received, %s' % (self.__key(tx_hash), e))
+
+    def wait_all(self, tx_hashes, timeout=30):
+        """Wait for the receipts of a list of transactions, returning None for any not received in the timeout."""
+        futures = [self.track(tx_hash) for tx_hash in tx_hashes]
+        deadline = time.time() + timeout
+        receipts = []
+        for tx_hash, future in zip(tx_hashes, futures):
+            try:
+                receipts.append(future.result(timeout=max(0, deadline - time.time())))
+            except TimeoutError:
+                self.untrack(tx_hash, future)
+                receipts.append(None)
+            except Exception:
+                receipts.append(None)
+        return receipts
+
+    def untrack(self, tx_hash, future=None):
+        """Stop waiting on a transaction hash, which is no longer tracked once it has no other waiters.
+
+        Should the future returned from track be supplied, nothing is done unless the hash is still tracked with it.
+        """
+        key = self.__key(tx_hash)
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None or (future is not None and entry[0] is not future): return
+            entry[2] -= 1
+            if entry[2] <= 0: del self._pending[key]
+
+    def close(self):
+        """Stop the background thread, failing the futures of any hashes still pending."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.__fail(RuntimeError('Receipt tracker for %s closed' % self.url))
+
+    def __run(self):
+        """Background loop to scan new blocks while there are hashes pending."""
+        while True:
+            with self._condition:
+                while len(self._pending) == 0 and not self._closed:
+                    self._last_block = None
+                    self._condition.wait()
+                if self._closed: return
+            try:
+                self.__scan()
+                self._errors = 0
+            except Exception as e:
+                self._errors += 1
+                log.warning('Receipt tracker scan failed (%d consecutive), %s', self._errors, e)
+                if self._errors >= self.MAX_ERRORS:
+                    log.warning('Receipt tracker failing %d pending transactions', len(self._pending))
+                    self.__fail(e)
+                    self._errors = 0
+            time.sleep(self.poll_latency)
+
+    def __fail(self, exception):
+        """Fail the futures of all pending hashes with an exception."""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future, _, _ in pending:
+            if not future.done(): future.set_exception(exception)
+
+    def __scan(self):
+        """Scan any new blocks since the last scan, resolving pending hashes included within them."""
+        head = self.__execute(BatchRequest(self.url).add('eth_blockNumber', [], lambda x: int(x, 16)))[0]
+        if isinstance(head, Exception): raise head
+        if self._last_block is None: self._last_block = head - 1
+
+        found = []
+        if head > self._last_block:
+            batch = BatchRequest(self.url)
+            for number in range(self._last_block + 1, head + 1): batch.get_block(number)
+            with self._lock: pending = set(self._pending.keys())
+            for block in self.__execute(batch):
+                if not isinstance(block, Mapping): continue
+                self.timestamps[block.number] = block.timestamp
+                found.extend([self.__key(tx) for tx in block.transactions if self.__key(tx) in pending])
+            self._last_block = head
+            for number in [n for n in self.timestamps.keys() if n <= head - self.MAX_TIMESTAMPS]:
+                del self.timestamps[number]
+
+        now = time.time()
+        if now - self._last_recheck > self.recheck:
+            with self._lock:
+                found.extend([key for key, entry in self._pending.items() if now - entry[1] > self.recheck])
+            self._last_recheck = now
+        if len(found) > 0: self.__resolve(set(found))
+
+    def __resolve(self, tx_hashes):
+        """Fetch the receipts for a set of hashes in a single batch, completing the futures of those received."""
+        tx_hashes = list(tx_hashes)
+        batch = BatchRequest(self.url)
+        for tx_hash in tx_hashes: batch.get_transaction_receipt(tx_hash)
+        for tx_hash, receipt in zip(tx_hashes, self.__execute(batch)):
+            if not isinstance(receipt, Mapping): continue
+            with self._lock: entry = self._pending.pop(tx_hash, None)
+            if entry is not None: entry[0].set_result(receipt)
+
+    def __execute(self, batch):
+        """Execute a batch request, counting the number of requests made."""
+        self.requests += 1
+        return batch.execute()
+
+    @staticmethod
+    def __key(tx_hash):
+        """Return the normalised hex string of a transaction hash."""
+        return Web3.to_hex(tx_hash) if isinstance(tx_hash, bytes) else tx_hash.lower()
@@ -1,4 +1,5 @@
-import requests, json
+import json, threading
+from concurrent.futures import ThreadPoolExecutor
 from web3 import Web3
 from eth_account import Account
 from eth_account.messages import encode_typed_data
@@ -8,7 +9,10 @@ from ten.test.networks.default import DefaultPreLondon
 from ten.test.networks.geth import Geth
 from ten.test.networks.sepolia import Sepolia
 from ten.test.utils.properties import Properties
-from ten.test.helpers.wallet_extension import WalletExtension
+from ten.test.networks.provider import ProviderFactory, RequestStats
+from ten.test.networks.gateway import GatewayCache
+from ten.test.networks.receipts import ReceiptTracker
+from ten.test.helpers.wallet_extension import WalletExtension, WalletExtensionPool
 
 
 class TenL1Sepolia(Sepolia):
@@ -32,7 +36,7 @@ class TenL1Sepolia(Sepolia):
     def connect(self, test, private_key, web_socket=False, check_funds=True, verbose=True):
         url = self.connection_url(web_socket)
 
-        if not web_socket: web3 = Web3(Web3.HTTPProvider(url))
+        if not web_socket: web3 = Web3(ProviderFactory.http_provider(url))
         else: web3 = Web3(Web3.WebsocketProvider(url, websocket_timeout=120))
         account = web3.eth.account.from_key(private_key)
         balance = web3.from_wei(web3.eth.get_balance(account.address), 'ether')
@@ -65,7 +69,7 @@ class TenL1Geth(Geth):
     def connect(self, test, private_key, web_socket=False, check_funds=True, verbose=True):
         url = self.connection_url(web_socket)
 
-        if not web_socket: web3 = Web3(Web3.HTTPProvider(url))
+        if not web_socket: web3 = Web3(ProviderFactory.http_provider(url))
         else: web3 = Web3(Web3.WebsocketProvider(url, websocket_timeout=120))
         web3.middleware_onion.inject(geth_poa_middleware, layer=0)
         account = web3.eth.account.from_key(private_key)
@@ -116,28 +120,37 @@ class Ten(DefaultPreLondon):
                 self.WS_PORT = props.port_ws(test.env)
                 self.log.info('Using primary gateway on host=%s, port=%d', self.HOST, self.PORT)
             else:
-                wallet = WalletExtension.start(test, name=name)
-                self.PORT = 'http://127.0.0.1'
-                self.WS_PORT = 'ws://127.0.0.1'
+                entry = WalletExtensionPool.lease()
+                if entry is not None: test.addCleanupFunction(lambda: WalletExtensionPool.release(entry))
+                wallet = entry[0] if entry is not None else WalletExtension.start(test, name=name)
+                self.HOST = 'http://127.0.0.1'
+                self.WS_HOST = 'ws://127.0.0.1'
                 self.PORT = wallet.port
                 self.WS_PORT = wallet.ws_port
-                self.log.info('Using local gateway %s on host=%s, port=%d', name, self.HOST, self.PORT)
+                self.log.info('Using %s gateway %s on host=%s, port=%d', 'pooled' if entry is not None else 'local',
+                              name, self.HOST, self.PORT)
 
             test.connections[name] = (self.HOST, self.WS_HOST, self.PORT, self.WS_PORT)
 
-        self.ID = self.__join()
+        self.stats = RequestStats()
+        self.ID = GatewayCache.join(self.gateway_url())
         if self.ID is None:
             test.addOutcome(BLOCKED, 'Error joining network for connection', abortOnError=True)
+        test.addCleanupFunction(lambda: ReceiptTracker.close_url(self.connection_url()))
 
     def connection_url(self, web_socket=False):
         port = self.PORT if not web_socket else self.WS_PORT
         host = self.HOST if not web_socket else self.WS_HOST
         return '%s:%d/v1/?token=%s' % (host, port, self.ID)
 
+    def gateway_url(self):
+        """Return the HTTP url of the gateway, against which tokens and registrations are cached. """
+        return '%s:%d' % (self.HOST, self.PORT)
+
     def connect(self, test, private_key, web_socket=False, check_funds=True, verbose=True):
         url = self.connection_url(web_socket)
 
-        if not web_socket: web3 = Web3(Web3.HTTPProvider(url))
+        if not web_socket: web3 = Web3(ProviderFactory.http_provider(url, stats=self.stats))
         else: web3 = Web3(Web3.WebsocketProvider(url, websocket_timeout=120))
         account = web3.eth.account.from_key(private_key)
         self.__register(test, account)
@@ -152,34 +165,22 @@ class Ten(DefaultPreLondon):
                 self.log.info('Account %s balance is now %.6f ETH', account.address, balance)
         return web3, account
 
-    def __join(self):
-        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
-        response = requests.get('%s:%d/v1/join/' % (self.HOST, self.PORT),  headers=headers)
-        if response.ok: return response.text.strip()
-        return None
+    def register_accounts(self, test, accounts):
+        """Register a list of accounts against the user id of the connection in parallel, skipping those already
+        registered. """
+        accounts = [account for account in accounts
+                    if not GatewayCache.is_registered(self.gateway_url(), self.ID, account.address)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda account: self.__register(test, account), accounts))
 
     def __register(self, test, account):
-        domain = {'name': 'Ten', 'version': '1.0', 'chainId': Properties().chain_id(test.env)}
-        types = {
-            'Authentication': [
-                {'name': 'Encryption Token', 'type': 'address'},
-            ],
-        }
-        message = {'Encryption Token': "0x"+self.ID}
-
-        signable_msg_from_dict = encode_typed_data(domain, types, message)
-        signed_msg_from_dict = Account.sign_message(signable_msg_from_dict, account.key)
-
-        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
-        data = {"signature": signed_msg_from_dict.signature.hex(), "address": account.address}
-        requests.post('%s:%d/v1/authenticate/?token=%s' % (self.HOST, self.PORT, self.ID),
-                      data=json.dumps(data), headers=headers)
+        GatewayCache.register(self.gateway_url(), Properties().chain_id(test.env), self.ID, account)
 
     def __register_new(self, test, account):
         url = '%s:%d/v1/getmessage/' % (self.HOST, self.PORT)
         headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
         data = {"encryptionToken": self.ID, "formats": ["EIP712"]}
-        response = requests.get(url, headers=headers, json=data).text
+        response = ProviderFactory.session(url).get(url, headers=headers, json=data).text
         message = json.loads(response)["message"]
 
         signable_msg_from_dict = encode_typed_data(message["domain"], message["types"], message["message"])
@@ -187,6 +188,70 @@ class Ten(DefaultPreLondon):
 
         headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
         data = {"signature": signed_msg_from_dict.signature.hex(), "address": account.address}
-        requests.post('%s:%d/v1/authenticate/?token=%s' % (self.HOST, self.PORT, self.ID),
-                      data=json.dumps(data), headers=headers)
+        url = '%s:%d/v1/authenticate/?token=%s' % (self.HOST, self.PORT, self.ID)
+        ProviderFactory.session(url).post(url, data=json.dumps(data), headers=headers)
+
+
 
+class TenGateways(DefaultPreLondon):
+    """A logical L2 connection for Ten that spreads accounts across multiple gateways.
+
+    The first gateway is always the primary gateway, whatever the name supplied, with the others local gateways
+    named <name>_1 to <name>_n-1, leased from the runner pool or started for the test. Each is wrapped in its own Ten
+    connection and hence has its own token. Accounts are assigned to a gateway on first connection, either in round
+    robin order, or to the gateway with the least outstanding requests, and are sticky thereafter so that an account
+    is only ever registered on the token of its gateway. The Ten connection of the gateway for an account is returned
+    by gateway, e.g. to pass its connection url to a client process. The request count and latency through each
+    gateway from the test process are recorded so that throughput can be compared with the number of gateways.
+    Attributes for the host, port and token are those of the primary gateway.
+    """
+    ROUND_ROBIN = 'round_robin'
+    LEAST_OUTSTANDING = 'least_outstanding'
+
+    def __init__(self, test, name='gateways', gateways=2, strategy=ROUND_ROBIN, **kwargs):
+        super().__init__(test, name, **kwargs)
+        self.strategy = strategy
+        self.gateways = [Ten(test, 'primary' if i == 0 else '%s_%d' % (name, i)) for i in range(gateways)]
+        self.assigned = {}              # account address to gateway index
+        self._next = 0
+        self._lock = threading.Lock()
+        primary = self.gateways[0]
+        self.CHAIN_ID, self.ID = primary.CHAIN_ID, primary.ID
+        self.HOST, self.WS_HOST, self.PORT, self.WS_PORT = primary.HOST, primary.WS_HOST, primary.PORT, primary.WS_PORT
+
+    def connection_url(self, web_socket=False):
+        return self.gateways[0].connection_url(web_socket)
+
+    def gateway(self, address):
+        """Return the Ten connection for the gateway an account address is assigned to, assigning it if new. """
+        with self._lock:
+            if address not in self.assigned:
+                if self.strategy == self.LEAST_OUTSTANDING:
+                    counts = [list(self.assigned.values()).count(i) for i in range(len(self.gateways))]
+                    self.assigned[address] = min(range(len(self.gateways)),
+                                                 key=lambda i: (self.gateways[i].stats.outstanding, counts[i]))
+                else:
+                    self.assigned[address] = self._next
+                    self._next = (self._next + 1) % len(self.gateways)
+            return self.gateways[self.assigned[address]]
+
+    def connect(self, test, private_key, web_socket=False, check_funds=True, verbose=True):
+        address = Web3().eth.account.from_key(private_key).address
+        return self.gateway(address).connect(test, private_key, web_socket, check_funds, verbose)
+
+    def register_accounts(self, test, accounts):
+        """Register a list of accounts against the token of the gateway each is assigned to. """
+        for gateway in self.gateways:
+            gateway.register_accounts(test, [account for account in accounts if self.gateway(account.address) is gateway])
+
+    def gateway_stats(self):
+        """Return a list of (gateway url, accounts, requests, outstanding, mean latency, max latency) per gateway. """
+        with self._lock: assigned = list(self.assigned.values())
+        return [(gateway.gateway_url(), assigned.count(i), gateway.stats.requests, gateway.stats.outstanding,
+                 gateway.stats.mean(), gateway.stats.max) for i, gateway in enumerate(self.gateways)]
+
+    def log_stats(self):
+        """Log the request count and latency through each gateway. """
+        for url, accounts, requests, _, mean, max_latency in self.gateway_stats():
+            self.log.info('Gateway %s: %d accounts, %d requests, mean latency %.3f secs, max latency %.3f secs',
+                          url, accounts, requests, mean, max_latency)
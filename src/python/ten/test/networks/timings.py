@@ -0,0 +1,137 @@
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from web3 import Web3
+from ten.test.networks.provider import BatchRequest
+
+
+class Inclusion:
+    """The block number, block timestamp and index within the block at which a transaction was included. """
+    __slots__ = ('block_number', 'timestamp', 'index')
+
+    def __init__(self, block_number, timestamp, index):
+        self.block_number = block_number
+        self.timestamp = timestamp
+        self.index = index
+
+
+class TimingCollector:
+    """Collects when a set of transactions were included in the chain by walking the blocks covering them.
+
+    Rather than requesting the transaction (or receipt) and then the block for each transaction hash, the blocks from
+    a start block up to the head are fetched once each, in batches executed concurrently, and every transaction in
+    each block is indexed by its hash. The cost is therefore around one request per block rather than two per
+    transaction. Blocks are fetched with transaction hashes only, which is sufficient to give the index of each
+    transaction in its block. Should any hashes not yet be found, new blocks are followed until they are, or until no
+    new hashes have been found within the timeout. Per block throughput, per transaction inclusion latency, and the
+    fill of blocks are derived from the blocks walked.
+    """
+    BATCH_SIZE = 50                 # blocks requested per batch
+    WORKERS = 4                     # batches executed concurrently
+
+    def __init__(self, url, poll_latency=0.5):
+        """Create a collector against the url of the node or gateway."""
+        self.url = url
+        self.poll_latency = poll_latency
+        self.requests = 0               # number of requests made by the collector
+        self.blocks = {}                # block number to block, with transaction hashes only
+        self.transactions = {}          # hex tx hash to inclusion
+
+    def head(self):
+        """Return the current head block number. """
+        self.requests += 1
+        result = BatchRequest(self.url).add('eth_blockNumber', [], lambda x: int(x, 16)).execute()[0]
+        return result if isinstance(result, int) else None
+
+    def collect(self, tx_hashes, start, timeout=30):
+        """Walk the blocks from a start block until all transaction hashes are found or progress stops.
+
+        Returns the list of hashes not found. The timeout is the time allowed without any new hashes being found, so
+        that a large backlog of transactions draining from the mempool is waited on for as long as it makes progress.
+        The start should be the head block number before the first transaction was sent. Blocks already walked, e.g. by
+        an earlier call, are not fetched again, and any that failed to be fetched are retried on the next poll.
+        """
+        pending = set([self.__key(tx_hash) for tx_hash in tx_hashes]) - set(self.transactions.keys())
+        deadline = time.time() + timeout
+        while len(pending) > 0:
+            head = self.head()
+            if head is not None and head >= start:
+                self.__walk([number for number in range(start, head + 1) if number not in self.blocks])
+                found = pending & set(self.transactions.keys())
+                if len(found) > 0:
+                    pending = pending - found
+                    deadline = time.time() + timeout
+            if len(pending) == 0 or time.time() > deadline: break
+            time.sleep(self.poll_latency)
+        return list(pending)
+
+    def inclusion(self, tx_hash):
+        """Return the inclusion of a transaction, or None if not found. """
+        return self.transactions.get(self.__key(tx_hash))
+
+    def block_rates(self):
+        """Return a list of (block number, timestamp, transactions, transactions per second) for the blocks walked.
+
+        The rate of a block is its transactions over the time since the previous block, and is None for the first.
+        """
+        rates = []
+        previous = None
+        for number in sorted(self.blocks.keys()):
+            block = self.blocks[number]
+            count = len(block.transactions)
+            elapsed = block.timestamp - previous.timestamp if previous is not None else 0
+            rates.append((number, block.timestamp, count, float(count) / elapsed if elapsed > 0 else None))
+            previous = block
+        return rates
+
+    def latencies(self, sent):
+        """Return a dictionary of hash to inclusion latency in seconds, from a dictionary of hash to time sent.
+
+        Block timestamps are to the second, so latencies are at that resolution.
+        """
+        latencies = {}
+        for tx_hash, sent_time in sent.items():
+            inclusion = self.inclusion(tx_hash)
+            if inclusion is not None: latencies[self.__key(tx_hash)] = inclusion.timestamp - sent_time
+        return latencies
+
+    def fill(self, tx_hashes=None):
+        """Return a dictionary of the mean and max transactions per block, and the mean fraction of the gas limit used.
+
+        Only blocks including at least one of the given transaction hashes are counted, or all non-empty blocks walked
+        if none are given.
+        """
+        if tx_hashes is not None:
+            numbers = set([i.block_number for i in [self.inclusion(tx_hash) for tx_hash in tx_hashes] if i is not None])
+        else:
+            numbers = set([number for number, block in self.blocks.items() if len(block.transactions) > 0])
+        blocks = [self.blocks[number] for number in numbers]
+        if len(blocks) == 0: return {'blocks': 0, 'mean': 0.0, 'max': 0, 'gas': 0.0}
+        counts = [len(block.transactions) for block in blocks]
+        gas = [float(block.gasUsed) / block.gasLimit for block in blocks if block.get('gasLimit')]
+        return {'blocks': len(blocks), 'mean': float(sum(counts)) / len(counts), 'max': max(counts),
+                'gas': sum(gas) / len(gas) if len(gas) > 0 else 0.0}
+
+    def __walk(self, numbers):
+        """Fetch a list of blocks in concurrent batches, indexing their transactions. """
+        if len(numbers) == 0: return
+        chunks = [numbers[i:i+self.BATCH_SIZE] for i in range(0, len(numbers), self.BATCH_SIZE)]
+        self.requests += len(chunks)
+        with ThreadPoolExecutor(max_workers=min(self.WORKERS, len(chunks))) as executor:
+            for blocks in executor.map(self.__fetch, chunks):
+                for block in blocks:
+                    if not isinstance(block, Mapping): continue
+                    self.blocks[block.number] = block
+                    for index, tx in enumerate(block.transactions):
+                        self.transactions[self.__key(tx)] = Inclusion(block.number, block.timestamp, index)
+
+    def __fetch(self, numbers):
+        """Fetch a list of blocks in a single batch. """
+        batch = BatchRequest(self.url, max_size=self.BATCH_SIZE)
+        for number in numbers: batch.get_block(number)
+        return batch.execute()
+
+    @staticmethod
+    def __key(tx_hash):
+        """Return the normalised hex string of a transaction hash."""
+        return Web3.to_hex(tx_hash) if isinstance(tx_hash, bytes) else tx_hash.lower()
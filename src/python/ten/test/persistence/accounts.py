@@ -0,0 +1,42 @@
+from ten.test.persistence.database import Database
+
+
+class AccountsPersistence:
+    """Abstracts the persistence of generated account keys into a local database.
+
+    Keys generated for the account pool are persisted per environment, so that the same accounts (and any funds
+    distributed to them) are reused across runs.
+    """
+
+    SQL_CREATE = "CREATE TABLE IF NOT EXISTS accounts " \
+                 "(environment TEXT, slot INTEGER, idx INTEGER, pk TEXT, " \
+                 "PRIMARY KEY (environment, slot, idx))"
+    SQL_INSERT = "INSERT OR REPLACE INTO accounts VALUES (?, ?, ?, ?)"
+    SQL_DELETE = "DELETE from accounts WHERE environment=?"
+    SQL_SELECT = "SELECT slot, idx, pk FROM accounts WHERE environment=? ORDER BY slot, idx"
+
+    def __init__(self, db_dir):
+        """Instantiate an instance."""
+        self.db = Database.get(db_dir)
+
+    def create(self):
+        """Create the tables in the underlying persistence."""
+        self.db.execute(self.SQL_CREATE)
+
+    def close(self):
+        """Release the persistence, the underlying connections being pooled and closed by the runner."""
+        pass
+
+    def delete_environment(self, environment):
+        """Delete all stored account keys for a particular environment."""
+        self.db.execute(self.SQL_DELETE, (environment, ))
+
+    def insert_keys(self, environment, slot, keys):
+        """Insert the keys for an account set into the persistence. """
+        self.db.executemany(self.SQL_INSERT, [(environment, slot, idx, pk) for idx, pk in enumerate(keys)])
+
+    def get_keys(self, environment):
+        """Return a dictionary of slot number to the list of keys for all account sets in an environment. """
+        sets = {}
+        for slot, _, pk in self.db.query(self.SQL_SELECT, (environment, )): sets.setdefault(slot, []).append(pk)
+        return sets
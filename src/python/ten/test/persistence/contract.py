@@ -1,4 +1,4 @@
-import sqlite3, os
+from ten.test.persistence.database import Database
 
 
 class ContractPersistence:
@@ -21,45 +21,37 @@ class ContractPersistence:
 
     def __init__(self, db_dir):
         """Instantiate an instance."""
-        self.db = os.path.join(db_dir, 'contracts.db')
-        self.connection = sqlite3.connect(self.db)
-        self.cursor = self.connection.cursor()
+        self.db = Database.get(db_dir)
 
     def create(self):
-        """Create the cursor to the underlying persistence."""
-        self.cursor.execute(self.SQL_CREATE)
-        self.cursor.execute(self.SQL_CRT_PARAMS)
+        """Create the tables in the underlying persistence."""
+        self.db.execute(self.SQL_CREATE)
+        self.db.execute(self.SQL_CRT_PARAMS)
 
     def close(self):
-        """Close the connection to the underlying persistence."""
-        self.connection.close()
+        """Release the persistence, the underlying connections being pooled and closed by the runner."""
+        pass
 
     def delete_environment(self, environment):
         """Delete all stored contract details for a particular environment."""
-        self.cursor.execute(self.SQL_DELETE, (environment, ))
-        self.cursor.execute(self.SQL_DEL_PARAMS, (environment, ))
-        self.connection.commit()
+        self.db.script([(self.SQL_DELETE, (environment, )), (self.SQL_DEL_PARAMS, (environment, ))])
 
     def insert_contract(self, name, environment, address, abi):
         """Insert a new contract into the persistence. """
-        self.cursor.execute(self.SQL_INSERT, (name, environment, address, abi))
-        self.connection.commit()
+        self.db.execute(self.SQL_INSERT, (name, environment, address, abi))
 
     def get_contract(self, name, environment):
         """Return the address and abi for a particular deployed contract. """
-        self.cursor.execute(self.SQL_SELECT, (name, environment))
-        cursor = self.cursor.fetchall()
-        if len(cursor) > 0: return cursor[0][0], cursor[0][1]
+        rows = self.db.query(self.SQL_SELECT, (name, environment))
+        if len(rows) > 0: return rows[0][0], rows[0][1]
         return None, None
 
     def insert_param(self, address, environment, key, value):
         """Insert a parameter for a named contract. """
-        self.cursor.execute(self.SQL_INS_PARAMS, (address, environment, key, value))
-        self.connection.commit()
+        self.db.execute(self.SQL_INS_PARAMS, (address, environment, key, value))
 
     def get_param(self, address, environment, key):
         """Return the address and abi for a particular deployed contract. """
-        self.cursor.execute(self.SQL_SEL_PARAMS, (address, environment, key))
-        cursor = self.cursor.fetchall()
-        if len(cursor) > 0: return cursor[0][0]
+        rows = self.db.query(self.SQL_SEL_PARAMS, (address, environment, key))
+        if len(rows) > 0: return rows[0][0]
         return None
\ No newline at end of file
@@ -1,4 +1,4 @@
-import sqlite3, os
+from ten.test.persistence.database import Database
 
 
 class CountsPersistence:
@@ -14,34 +14,28 @@ class CountsPersistence:
 
     def __init__(self, db_dir):
         """Instantiate an instance."""
-        self.db = os.path.join(db_dir, 'counts.db')
-        self.connection = sqlite3.connect(self.db)
-        self.cursor = self.connection.cursor()
+        self.db = Database.get(db_dir)
 
     def create(self):
-        """Create the cursor to the underlying persistence."""
-        self.cursor.execute(self.SQL_CREATE)
+        """Create the tables in the underlying persistence."""
+        self.db.execute(self.SQL_CREATE)
 
     def close(self):
-        """Close the connection to the underlying persistence."""
-        self.connection.close()
+        """Release the persistence, the underlying connections being pooled and closed by the runner."""
+        pass
 
     def delete_environment(self, environment):
         """Delete all stored contract details for a particular environment."""
-        self.cursor.execute(self.SQL_DELETE, (environment, ))
-        self.connection.commit()
+        self.db.execute(self.SQL_DELETE, (environment, ))
 
     def insert_count(self, name, address, environment, time, count):
         """Insert a new counts entry for a particular logical account."""
-        self.cursor.execute(self.SQL_INSERT, (name, address, environment, time, str(count)))
-        self.connection.commit()
+        self.db.execute(self.SQL_INSERT, (name, address, environment, time, str(count)))
 
     def get_last_three_counts(self, name, environment):
         """Return the transaction count with time for a particular logical account."""
-        self.cursor.execute(self.SQL_SELECT_THREE, (name, environment))
-        return self.cursor.fetchall()
+        return self.db.query(self.SQL_SELECT_THREE, (name, environment))
 
     def get_last_hour(self, name, environment, time):
         """Return the transaction count with time for a particular logical account."""
-        self.cursor.execute(self.SQL_SELECT_HOUR, (name, environment, time))
-        return self.cursor.fetchall()
\ No newline at end of file
+        return self.db.query(self.SQL_SELECT_HOUR, (name, environment, time))
\ No newline at end of file
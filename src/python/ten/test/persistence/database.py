@@ -0,0 +1,162 @@
+import sqlite3, os, time, queue, threading
+from contextlib import contextmanager
+
+
+class Database:
+    """A single sqlite database in WAL mode, shared through a pool of connections across the runner threads.
+
+    All persistence tables are held in the one database file, opened in write-ahead-log mode so that readers do not
+    block on a writer, and with a busy timeout so that contending writers wait rather than fail. A database is shared
+    per path in the process, with connections handed out from a bounded pool. Should a statement still fail as the
+    database is locked, it is retried with a back off. The schema version is held in the user_version pragma, and on
+    first use any entries in the separate per table database files used by earlier versions are migrated across, after
+    which any schema changes for later versions are applied in order.
+    """
+    DB_NAME = 'tentest.db'
+    SCHEMA_VERSION = 2
+    POOL_SIZE = 4                   # maximum number of connections open to the database
+    BUSY_TIMEOUT = 30               # seconds to wait on a locked database before failing
+    RETRIES = 5                     # number of retries when a statement fails as the database is locked
+    LEGACY = {'nonce.db': ['nonce_db'], 'contracts.db': ['contracts', 'params'], 'funds.db': ['funds'],
+              'counts.db': ['counts'], 'results.db': ['results']}
+    MIGRATIONS = {
+        2: ['DROP TABLE IF EXISTS nonce_db_v2',
+            'CREATE TABLE nonce_db_v2 (account TEXT, environment TEXT, nonce INTEGER, status STRING, '
+            'PRIMARY KEY (environment, account, nonce))',
+            'INSERT OR REPLACE INTO nonce_db_v2 SELECT account, environment, nonce, status FROM nonce_db '
+            'ORDER BY rowid',
+            'DROP TABLE nonce_db',
+            'ALTER TABLE nonce_db_v2 RENAME TO nonce_db']
+    }
+
+    _lock = threading.Lock()        # guards the shared databases
+    _databases = {}                 # database path to database
+
+    @classmethod
+    def get(cls, db_dir):
+        """Return the shared database in a directory, creating it on first use. """
+        path = os.path.join(db_dir, cls.DB_NAME)
+        with cls._lock:
+            if path not in cls._databases: cls._databases[path] = Database(path)
+            return cls._databases[path]
+
+    @classmethod
+    def close_all(cls):
+        """Close all connections to all shared databases. """
+        with cls._lock:
+            for database in cls._databases.values(): database.close()
+            cls._databases.clear()
+
+    def __init__(self, path, pool_size=POOL_SIZE):
+        """Instantiate an instance against the path to the database file. """
+        self.path = path
+        self.pool_size = pool_size
+        self.pool = queue.Queue()
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Context manager to lease a connection from the pool, committing on exit or rolling back on error. """
+        connection = self.__acquire()
+        try:
+            yield connection
+            connection.commit()
+        except:
+            connection.rollback()
+            raise
+        finally:
+            self.pool.put(connection)
+
+    def execute(self, sql, params=()):
+        """Execute and commit a modifying statement, returning the number of rows modified. """
+        return self.__retry(lambda cursor: cursor.execute(sql, params).rowcount)
+
+    def executemany(self, sql, params):
+        """Execute and commit a modifying statement over a sequence of parameters. """
+        self.__retry(lambda cursor: cursor.executemany(sql, params))
+
+    def script(self, statements):
+        """Execute and commit a list of statements as a single transaction. """
+        def run(cursor):
+            for sql, params in statements: cursor.execute(sql, params)
+        self.__retry(run)
+
+    def query(self, sql, params=()):
+        """Execute a query returning all rows. """
+        return self.__retry(lambda cursor: cursor.execute(sql, params).fetchall())
+
+    def version(self):
+        """Return the schema version of the database. """
+        return self.query('PRAGMA user_version')[0][0]
+
+    def migrate(self):
+        """Migrate the schema to the current version, returning a list of the migrations made.
+
+        Tables should be created by each persistence before migration. Legacy files are left in place, as the schema
+        version ensures they are only migrated once.
+        """
+        migrated = []
+        version = self.version()
+        if version < 1: migrated.extend(self.__migrate_legacy())
+        for number in range(max(version, 1) + 1, self.SCHEMA_VERSION + 1):
+            self.script([(sql, ()) for sql in self.MIGRATIONS[number]] + [('PRAGMA user_version = %d' % number, ())])
+            migrated.append('schema v%d' % number)
+        return migrated
+
+    def __migrate_legacy(self):
+        """Copy entries from the legacy per table database files into the database. """
+        migrated = []
+        db_dir = os.path.dirname(self.path)
+        for name, tables in self.LEGACY.items():
+            legacy = os.path.join(db_dir, name)
+            if not os.path.exists(legacy): continue
+            with self.connection() as connection:
+                connection.execute('ATTACH DATABASE ? AS legacy', (legacy, ))
+                try:
+                    existing = [row[0] for row in connection.execute(
+                        "SELECT name FROM legacy.sqlite_master WHERE type='table'").fetchall()]
+                    for table in [table for table in tables if table in existing]:
+                        connection.execute('INSERT OR REPLACE INTO main.%s SELECT * FROM legacy.%s ORDER BY rowid' %
+                                           (table, table))
+                        migrated.append(table)
+                    connection.commit()
+                finally:
+                    connection.execute('DETACH DATABASE legacy')
+
+        self.execute('PRAGMA user_version = 1')
+        return migrated
+
+    def close(self):
+        """Close all pooled connections. """
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+        with self.lock: self.opened = 0
+
+    def __acquire(self):
+        """Take a connection from the pool, opening a new one if the pool is not yet at its maximum size. """
+        try:
+            return self.pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                if self.opened < self.pool_size:
+                    self.opened += 1
+                    return self.__open()
+            return self.pool.get()
+
+    def __open(self):
+        """Open a new connection in WAL mode with the busy timeout set. """
+        connection = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA busy_timeout=%d' % (self.BUSY_TIMEOUT * 1000))
+        return connection
+
+    def __retry(self, fn):
+        """Run a function against a cursor in a transaction, retrying should the database be locked. """
+        for attempt in range(self.RETRIES + 1):
+            try:
+                with self.connection() as connection: return fn(connection.cursor())
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) or attempt == self.RETRIES: raise
+                time.sleep(0.1 * 2**attempt)
@@ -0,0 +1,64 @@
+import threading
+from ten.test.persistence.database import Database
+
+
+class EphemeralPersistence:
+    """Abstracts the persistence of ephemeral account keys and their last known balances into a local database.
+
+    Every ephemeral key created by a test is recorded, so that keys still holding funds can be leased to later tests
+    rather than new keys being funded, and so that any remaining funds can be swept back to the funded account. A key is
+    either LEASED to a running test or FREE; leasing is guarded by a lock so that concurrent tests never share a key.
+    """
+
+    SQL_CREATE = "CREATE TABLE IF NOT EXISTS ephemeral " \
+                 "(environment TEXT, address TEXT, pk TEXT, balance TEXT, status TEXT, " \
+                 "PRIMARY KEY (environment, address))"
+    SQL_INSERT = "INSERT OR REPLACE INTO ephemeral VALUES (?, ?, ?, ?, ?)"
+    SQL_UPDATE = "UPDATE ephemeral SET balance=?, status=? WHERE environment=? AND address=?"
+    SQL_DELETE = "DELETE from ephemeral WHERE environment=?"
+    SQL_SELECT = "SELECT address, pk, balance FROM ephemeral WHERE environment=? AND status=?"
+    SQL_RESET = "UPDATE ephemeral SET status='FREE' WHERE environment=?"
+
+    _lock = threading.Lock()        # guards leasing of keys
+
+    def __init__(self, db_dir):
+        """Instantiate an instance."""
+        self.db = Database.get(db_dir)
+
+    def create(self):
+        """Create the tables in the underlying persistence."""
+        self.db.execute(self.SQL_CREATE)
+
+    def close(self):
+        """Release the persistence, the underlying connections being pooled and closed by the runner."""
+        pass
+
+    def delete_environment(self, environment):
+        """Delete all stored ephemeral keys for a particular environment."""
+        self.db.execute(self.SQL_DELETE, (environment, ))
+
+    def reset_environment(self, environment):
+        """Free all keys for an environment, e.g. those left leased by an earlier run that did not complete."""
+        self.db.execute(self.SQL_RESET, (environment, ))
+
+    def insert_keys(self, environment, keys, status='LEASED'):
+        """Insert a list of (address, pk) for new keys, with a zero balance."""
+        self.db.executemany(self.SQL_INSERT, [(environment, address, pk, '0', status) for address, pk in keys])
+
+    def lease_keys(self, environment, count):
+        """Lease up to count free keys, returning a list of (address, pk, balance) with the highest balances first."""
+        with self._lock:
+            keys = sorted(self.get_free_keys(environment), key=lambda x: x[2], reverse=True)[:count]
+            self.db.executemany(self.SQL_UPDATE, [(str(balance), 'LEASED', environment, address)
+                                                  for address, _, balance in keys])
+            return keys
+
+    def release_keys(self, environment, balances):
+        """Release a list of (address, balance) for leased keys, recording their balances."""
+        self.db.executemany(self.SQL_UPDATE, [(str(balance), 'FREE', environment, address)
+                                              for address, balance in balances])
+
+    def get_free_keys(self, environment):
+        """Return a list of (address, pk, balance) for all free keys for an environment."""
+        rows = self.db.query(self.SQL_SELECT, (environment, 'FREE'))
+        return [(address, pk, int(balance)) for address, pk, balance in rows]
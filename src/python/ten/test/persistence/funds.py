@@ -1,4 +1,4 @@
-import sqlite3, os
+from ten.test.persistence.database import Database
 
 
 class FundsPersistence:
@@ -13,30 +13,25 @@ class FundsPersistence:
 
     def __init__(self, db_dir):
         """Instantiate an instance."""
-        self.db = os.path.join(db_dir, 'funds.db')
-        self.connection = sqlite3.connect(self.db)
-        self.cursor = self.connection.cursor()
+        self.db = Database.get(db_dir)
 
     def create(self):
-        """Create the cursor to the underlying persistence."""
-        self.cursor.execute(self.SQL_CREATE)
+        """Create the tables in the underlying persistence."""
+        self.db.execute(self.SQL_CREATE)
 
     def close(self):
-        """Close the connection to the underlying persistence."""
-        self.connection.close()
+        """Release the persistence, the underlying connections being pooled and closed by the runner."""
+        pass
 
     def delete_environment(self, environment):
         """Delete all stored contract details for a particular environment."""
-        self.cursor.execute(self.SQL_DELETE, (environment, ))
-        self.connection.commit()
+        self.db.execute(self.SQL_DELETE, (environment, ))
 
     def insert_funds(self, name, address, environment, time, balance):
         """Insert a new funds entry for a particular logical account."""
-        self.cursor.execute(self.SQL_INSERT, (name, address, environment, time, str(balance)))
-        self.connection.commit()
+        self.db.execute(self.SQL_INSERT, (name, address, environment, time, str(balance)))
 
     def get_funds(self, name, environment):
         """Return the funds with time for a particular logical account."""
-        self.cursor.execute(self.SQL_SELECT, (name, environment))
-        return self.cursor.fetchall()
+        return self.db.query(self.SQL_SELECT, (name, environment))
 
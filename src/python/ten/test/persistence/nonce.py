@@ -1,11 +1,100 @@
-import sqlite3, os
+import threading, logging
+from ten.test.persistence.database import Database
+
+log = logging.getLogger('pysys.nonce')
+
+
+class NonceAllocator:
+    """Thread safe in-memory allocation of nonces for an account in an environment.
+
+    The allocator is seeded once, from the persistence or from the network transaction count if there is no persisted
+    value, after which nonces are handed out atomically without further round trips to the node or database.
+    """
+
+    def __init__(self, next_nonce):
+        """Instantiate an instance seeded with the next nonce to use. """
+        self.next_nonce = next_nonce
+        self.lock = threading.Lock()
+
+    def allocate(self, count=1):
+        """Allocate a run of consecutive nonces, returning the first. """
+        with self.lock:
+            nonce = self.next_nonce
+            self.next_nonce += count
+            return nonce
+
+
+class NonceWriter:
+    """Writes nonce inserts and status updates behind the caller, batching them into single commits.
+
+    Statements are queued and executed in order on a background thread, as a single transaction on a pooled connection,
+    every flush interval or when a flush is requested. Readers of the persistence should flush prior to reading to see all writes.
+    """
+
+    def __init__(self, database, flush_interval=0.25):
+        """Instantiate an instance against a shared database and start the background writer thread. """
+        self.database = database
+        self.flush_interval = flush_interval
+        self.queue = []
+        self.submitted = 0
+        self.written = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.__run, name='NonceWriter', daemon=True)
+        self.thread.start()
+
+    def submit(self, sql, params):
+        """Queue a statement to be written behind. """
+        with self.condition:
+            self.queue.append((sql, params))
+            self.submitted += 1
+
+    def flush(self, timeout=30):
+        """Block until all statements queued prior to the call have been written, returning false on a timeout.
+
+        Statements in a batch that failed to commit are counted as written, and the wait ends early should the writer
+        thread no longer be alive.
+        """
+        with self.condition:
+            target = self.submitted
+            self.condition.notify_all()
+            self.condition.wait_for(lambda: self.written >= target or not self.thread.is_alive(), timeout)
+            if self.written < target: log.warning('Nonce writer flush incomplete, %d statements unwritten',
+                                                  target - self.written)
+            return self.written >= target
+
+    def __run(self):
+        while True:
+            with self.condition:
+                if len(self.queue) == 0: self.condition.wait(self.flush_interval)
+                queue, self.queue = self.queue, []
+            try:
+                if len(queue) > 0: self.database.script(queue)
+            except Exception as e:
+                # lost writes are recovered against the network on the next run
+                log.warning('Nonce writer dropped a batch of %d statements, %s', len(queue), e)
+            finally:
+                with self.condition:
+                    self.written += len(queue)
+                    self.condition.notify_all()
 
 
 class NoncePersistence:
-    """Abstracts the persistence of nonces into a local database. """
+    """Abstracts the persistence of nonces into a local database.
+
+    Nonces used with persistence are handed out by an in-memory allocator per account and environment, which is shared
+    across all instances in the process. Inserts and status updates for allocated nonces are written behind in batches
+    by a single writer per database. Should the process exit before all writes are committed, the runner recovers the
+    persistence against the network transaction counts at the start of the next run.
 
-    SQL_CREATE = "CREATE TABLE IF NOT EXISTS nonce_db (account TEXT, environment TEXT, nonce INTEGER, status STRING)"
-    SQL_INSERT = "INSERT INTO nonce_db VALUES (?, ?, ?, ?)"
+    Entries are keyed on the environment, account and nonce, so that lookups of the latest nonce and status updates are
+    index seeks. As a confirmed nonce means all earlier nonces for the account have been used on the network, history
+    below the latest confirmed or reset nonce is periodically compacted away, leaving that entry as a high-water mark.
+    """
+
+    SQL_CREATE = "CREATE TABLE IF NOT EXISTS nonce_db " \
+                 "(account TEXT, environment TEXT, nonce INTEGER, status STRING, " \
+                 "PRIMARY KEY (environment, account, nonce))"
+    SQL_INSERT = "INSERT OR REPLACE INTO nonce_db VALUES (?, ?, ?, ?)"
     SQL_UPDATE = "UPDATE nonce_db SET status=? WHERE account=? AND environment=? AND nonce=?"
     SQL_DELETE = "DELETE from nonce_db WHERE account=? AND environment=?"
     SQL_DELFRO = "DELETE from nonce_db WHERE account=? AND environment=? AND nonce>=?"
@@ -13,81 +102,157 @@ class NoncePersistence:
     SQL_DELENV = "DELETE from nonce_db WHERE environment=?"
     SQL_ACCNTS = "SELECT DISTINCT account from nonce_db where environment=?"
     SQL_DELENT = "DELETE from nonce_db WHERE account=? AND environment=? AND nonce=?"
+    SQL_COMPCT = "DELETE from nonce_db WHERE rowid IN (SELECT entry.rowid FROM nonce_db entry JOIN " \
+                 "(SELECT account, MAX(nonce) AS nonce FROM nonce_db WHERE environment=? " \
+                 "AND status IN ('CONFIRMED', 'RESET') GROUP BY account) mark " \
+                 "ON entry.account=mark.account WHERE entry.environment=? AND entry.nonce < mark.nonce)"
+
+    _lock = threading.Lock()        # guards the allocators and writers
+    _allocators = {}                # (account, environment) to allocator
+    _writers = {}                   # database path to writer
 
     def __init__(self, db_dir):
         """Instantiate an instance. """
-        self.db = os.path.join(db_dir, 'nonce.db')
-        self.connection = sqlite3.connect(self.db)
-        self.cursor = self.connection.cursor()
+        self.db = Database.get(db_dir)
+
+    @classmethod
+    def flush_all(cls):
+        """Flush all pending writes for all databases. """
+        with cls._lock: writers = list(cls._writers.values())
+        for writer in writers: writer.flush()
 
     def create(self):
-        """Create the cursor to the underlying persistence. """
-        self.cursor.execute(self.SQL_CREATE)
+        """Create the tables in the underlying persistence. """
+        self.db.execute(self.SQL_CREATE)
 
     def close(self):
-        """Close the connection to the underlying persistence. """
-        self.connection.close()
+        """Release the persistence, flushing any pending writes. """
+        self.flush()
+
+    def flush(self):
+        """Block until all nonce writes made behind the caller have been committed. """
+        self.__writer().flush()
 
     def get_next_nonce(self, test, web3, account, environment, persist_nonce=True, log=True):
         """Get the next nonce to use in a transaction.
 
         If persist_nonce is false then the return value will be the transaction count as received from the network.
-        Otherwise, this method will look up the last persisted value and return the next value to use. Note that nonces
-        start from zero, so if the tx count is 5 the nonces so far would have be 0,1,2,3,4. Hence the next nonce should
-        always match the tx count. 
+        Otherwise, the nonce is handed out from the in-memory allocator for the account, which on first use is seeded
+        from the last persisted value (or the transaction count should there be none). Note that nonces start from
+        zero, so if the tx count is 5 the nonces so far would have be 0,1,2,3,4. Hence the next nonce should always
+        match the tx count.
         """
-        transaction_count = web3.eth.get_transaction_count(account)
-        persisted_nonce = self.get_latest_nonce(account, environment)
+        return self.get_next_nonces(test, web3, account, environment, 1, persist_nonce, log)[0]
 
-        nonce = transaction_count
+    def get_next_nonces(self, test, web3, account, environment, count, persist_nonce=True, log=True,
+                        transaction_count=None):
+        """Get a run of the next nonces to use for a number of transactions.
+
+        As for get_next_nonce, but allocating count consecutive nonces. A transaction count already read from the
+        network can be supplied, in which case it is used in place of reading it through the web3 connection.
+        """
         if persist_nonce:
-            nonce = 0 if persisted_nonce is None else persisted_nonce+1      # we have to believe the local store
-            test.nonce_db.insert(account, test.env, nonce)
-            if log: test.log.info("Account %s count %d using nonce from persistence as %d", account, transaction_count, nonce)
+            start = self.__allocator(web3, account, environment, transaction_count).allocate(count)
+            writer = self.__writer()
+            for nonce in range(start, start+count): writer.submit(self.SQL_INSERT, (account, environment, nonce, 'PENDING'))
+            if log: test.log.info("Account %s using nonces from allocator as %d to %d", account, start, start+count-1)
         else:
-            if log: test.log.info("Account %s using nonce from transaction count as %d", account, nonce)
-        return nonce
+            start = transaction_count if transaction_count is not None else web3.eth.get_transaction_count(account)
+            if log: test.log.info("Account %s using nonces from transaction count as %d to %d", account,
+                                  start, start+count-1)
+        return list(range(start, start+count))
+
+    def recover(self, account, environment, transaction_count):
+        """Recover the persisted nonces for an account against its transaction count on the network.
+
+        Allocations lost on a crash before being written, or made and never sent, leave the persistence out of step
+        with the network. If so, any entries at or above the transaction count are removed and the last nonce used is
+        reset. Returns the latest persisted nonce prior to recovery.
+        """
+        persisted = self.get_latest_nonce(account, environment)
+        if (persisted is not None) and (persisted != transaction_count-1):
+            if persisted > transaction_count-1: self.delete_from(account, environment, transaction_count)
+            self.insert(account, environment, transaction_count-1, 'RESET')
+        return persisted
 
     def insert(self, account, environment, nonce, status='PENDING'):
-        """Insert a new nonce into the persistence. """
-        self.cursor.execute(self.SQL_INSERT, (account, environment, nonce, status))
-        self.connection.commit()
+        """Insert a new nonce into the persistence, re-seeding the allocator for the account on next use. """
+        self.__execute(self.SQL_INSERT, (account, environment, nonce, status), account, environment)
 
     def update(self, account, environment, nonce, status):
-        """Update the status of a transaction for a given nonce into the persistence. """
-        self.cursor.execute(self.SQL_UPDATE, (status, account, environment, nonce))
-        self.connection.commit()
+        """Update the status of a transaction for a given nonce into the persistence (written behind). """
+        self.__writer().submit(self.SQL_UPDATE, (status, account, environment, nonce))
 
     def delete(self, account, environment):
         """Delete all nonce entries in the persistence for a given account and environment. """
-        self.cursor.execute(self.SQL_DELETE, (account, environment))
-        self.connection.commit()
+        self.__execute(self.SQL_DELETE, (account, environment), account, environment)
 
     def delete_from(self, account, environment, nonce):
         """Delete all nonce entries in the persistence for a given account and environment. """
-        self.cursor.execute(self.SQL_DELFRO, (account, environment, nonce))
-        self.connection.commit()
+        self.__execute(self.SQL_DELFRO, (account, environment, nonce), account, environment)
 
     def delete_environment(self, environment):
         """Delete all nonce entries for all accounts for a given environment. """
-        self.cursor.execute(self.SQL_DELENV, (environment, ))
-        self.connection.commit()
+        self.__execute(self.SQL_DELENV, (environment, ), None, environment)
 
     def delete_entries(self, account, environment, nonce):
         """Delete all nonce entries in the persistence for a given account and environment and nonce. """
-        self.cursor.execute(self.SQL_DELENT, (account, environment, nonce))
-        self.connection.commit()
+        self.__execute(self.SQL_DELENT, (account, environment, nonce), account, environment)
+
+    def compact(self, environment):
+        """Compact the history for all accounts in an environment, returning the number of entries removed.
+
+        For each account, all entries below the latest CONFIRMED or RESET nonce are removed, leaving that entry as the
+        high-water mark. Entries above the mark are retained, so the latest nonce for the account is unchanged. The marks
+        are computed once for all accounts, and entries below them found through the primary key.
+        """
+        self.flush()
+        return self.db.execute(self.SQL_COMPCT, (environment, environment))
 
     def get_accounts(self, environment):
         """Return a list of all accounts with persisted values for a given environment. """
-        self.cursor.execute(self.SQL_ACCNTS, (environment, ))
-        return self.cursor.fetchall()
+        self.flush()
+        return self.db.query(self.SQL_ACCNTS, (environment, ))
 
     def get_latest_nonce(self, account, environment):
         """Get the latest nonce for a given account and environment. """
-        self.cursor.execute(self.SQL_LATEST, (account, environment))
+        self.flush()
+        rows = self.db.query(self.SQL_LATEST, (account, environment))
         try:
-            result = self.cursor.fetchone()[0]
-            return int(result)
+            return int(rows[0][0])
         except:
             return None
+
+    def __execute(self, sql, params, account, environment):
+        """Synchronously execute a modifying statement, invalidating any affected allocators. """
+        self.flush()
+        self.db.execute(sql, params)
+        self.__reset_allocators(account, environment)
+
+    def is_allocating(self, account, environment):
+        """Return true if nonces for an account and environment are handed out from a seeded allocator. """
+        with self._lock: return (account, environment) in self._allocators
+
+    def __allocator(self, web3, account, environment, transaction_count=None):
+        """Return the allocator for an account and environment, seeding it on first use. """
+        key = (account, environment)
+        with self._lock: allocator = self._allocators.get(key)
+        if allocator is not None: return allocator
+
+        persisted_nonce = self.get_latest_nonce(account, environment)
+        if persisted_nonce is not None: next_nonce = persisted_nonce+1       # we have to believe the local store
+        elif transaction_count is not None: next_nonce = transaction_count
+        else: next_nonce = web3.eth.get_transaction_count(account)
+        with self._lock: return self._allocators.setdefault(key, NonceAllocator(next_nonce))
+
+    def __writer(self):
+        """Return the writer for this database. """
+        with self._lock:
+            if self.db.path not in self._writers: self._writers[self.db.path] = NonceWriter(self.db)
+            return self._writers[self.db.path]
+
+    def __reset_allocators(self, account, environment):
+        """Remove the allocators for an account (or all accounts if None) in an environment. """
+        with self._lock:
+            for key in list(self._allocators.keys()):
+                if key[1] == environment and (account is None or key[0] == account): del self._allocators[key]
@@ -1,4 +1,4 @@
-import sqlite3, os
+from ten.test.persistence.database import Database
 
 
 class ResultsPersistence:
@@ -11,32 +11,48 @@ class ResultsPersistence:
     SQL_DELETE = "DELETE from results WHERE environment=?"
     SQL_SELECT = "SELECT time, result FROM results WHERE test=? AND environment=? ORDER BY time ASC"
 
+    SQL_CREATE_LATENCY = "CREATE TABLE IF NOT EXISTS latency " \
+                         "(test TEXT, environment TEXT, time INTEGER, count INTEGER, mean REAL, " \
+                         "p50 REAL, p90 REAL, p99 REAL, p999 REAL, max REAL, " \
+                         "PRIMARY KEY (test, environment, time))"
+    SQL_INSERT_LATENCY = "INSERT INTO latency VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    SQL_DELETE_LATENCY = "DELETE from latency WHERE environment=?"
+    SQL_SELECT_LATENCY = "SELECT time, count, mean, p50, p90, p99, p999, max FROM latency " \
+                         "WHERE test=? AND environment=? ORDER BY time ASC"
+
     def __init__(self, db_dir):
         """Instantiate an instance."""
-        self.db = os.path.join(db_dir, 'results.db')
-        self.connection = sqlite3.connect(self.db)
-        self.cursor = self.connection.cursor()
+        self.db = Database.get(db_dir)
 
     def create(self):
-        """Create the cursor to the underlying persistence."""
-        self.cursor.execute(self.SQL_CREATE)
+        """Create the tables in the underlying persistence."""
+        self.db.execute(self.SQL_CREATE)
+        self.db.execute(self.SQL_CREATE_LATENCY)
 
     def close(self):
-        """Close the connection to the underlying persistence."""
-        self.connection.close()
+        """Release the persistence, the underlying connections being pooled and closed by the runner."""
+        pass
 
     def delete_environment(self, environment):
         """Delete all stored performance results for a particular environment."""
-        self.cursor.execute(self.SQL_DELETE, (environment, ))
-        self.connection.commit()
+        self.db.execute(self.SQL_DELETE, (environment, ))
+        self.db.execute(self.SQL_DELETE_LATENCY, (environment, ))
 
     def insert_result(self, test, environment, time, result):
         """Insert a new performance result into the persistence. """
-        self.cursor.execute(self.SQL_INSERT, (test, environment, time, result))
-        self.connection.commit()
+        self.db.execute(self.SQL_INSERT, (test, environment, time, result))
 
     def get_results(self, test, environment):
         """Return the performance results for a particular test and environment. """
-        self.cursor.execute(self.SQL_SELECT, (test, environment))
-        return self.cursor.fetchall()
-
+        return self.db.query(self.SQL_SELECT, (test, environment))
+
+    def insert_latency(self, test, environment, time, histogram):
+        """Insert the mean, percentiles and max in seconds of a latency histogram into the persistence. """
+        percentiles = histogram.percentiles()
+        self.db.execute(self.SQL_INSERT_LATENCY, (test, environment, time, histogram.count, histogram.mean(),
+                                                  percentiles['p50'], percentiles['p90'], percentiles['p99'],
+                                                  percentiles['p99.9'], percentiles['max']))
+
+    def get_latencies(self, test, environment):
+        """Return the latency results for a particular test and environment. """
+        return self.db.query(self.SQL_SELECT_LATENCY, (test, environment))
@@ -0,0 +1,93 @@
+import threading
+from eth_account import Account
+from ten.test.persistence.accounts import AccountsPersistence
+
+
+class AccountPool:
+    """Leases sets of account keys to tests, so that each concurrently running test has its own accounts.
+
+    A set holds the keys for accounts 1 to 4 as used by a test. The first sets are those configured in the properties,
+    with further sets generated on demand when all existing sets are leased, and persisted so that they are reused on
+    subsequent runs. A test leases a set on construction and releases it on cleanup; whilst leased the set is bound to
+    the test thread, and is what Properties().account1pk() to account4pk() return when called from that thread. From
+    any other thread, e.g. a helper thread started by the test, the test must be passed to resolve its set, as
+    falling back to the keys of another set would clash on nonces with the test holding it. Newly generated accounts
+    hold no funds, and are funded on connection by the usual check on the account balance.
+    """
+    SET_SIZE = 4                    # number of account keys in each set
+    _lock = threading.Lock()        # guards the sets and leases
+    _sets = {}                      # slot number to list of keys
+    _static = 0                     # number of sets configured in the properties
+    _leases = {}                    # thread ident to leased slot number
+    _persistence = None
+    _environment = None
+
+    @classmethod
+    def configure(cls, db_dir, environment, static_sets):
+        """Configure the pool with the sets from the properties, and any sets previously generated for the environment.
+        """
+        persistence = AccountsPersistence(db_dir)
+        persistence.create()
+        with cls._lock:
+            cls._persistence = persistence
+            cls._environment = environment
+            cls._static = len(static_sets)
+            cls._sets = {slot: keys for slot, keys in enumerate(static_sets, start=1)}
+            for slot, keys in persistence.get_keys(environment).items():
+                if slot > cls._static: cls._sets[slot] = keys
+            cls._leases = {}
+
+    @classmethod
+    def lease(cls):
+        """Lease the lowest free set to the calling thread, generating a new set if needed, returning the slot number.
+
+        Returns None if the pool has not been configured, e.g. when running outside of the runner.
+        """
+        with cls._lock:
+            if cls._persistence is None: return None
+            leased = set(cls._leases.values())
+            slot = next((slot for slot in sorted(cls._sets.keys()) if slot not in leased), None)
+            if slot is None:
+                slot = max(cls._sets.keys(), default=0) + 1
+                cls._sets[slot] = [Account.create().key.hex() for _ in range(cls.SET_SIZE)]
+                cls._persistence.insert_keys(cls._environment, slot, cls._sets[slot])
+            cls._leases[threading.get_ident()] = slot
+            return slot
+
+    @classmethod
+    def release(cls, slot):
+        """Release a leased set back to the pool. """
+        with cls._lock:
+            for ident in [ident for ident, leased in cls._leases.items() if leased == slot]: del cls._leases[ident]
+
+    @classmethod
+    def key(cls, index, slot=None):
+        """Return the key for account index (1 to 4) of a leased slot, or of the set leased to the calling thread.
+
+        Returns None if the pool has not been configured, and raises an exception if no slot is given and no set is
+        leased to the calling thread.
+        """
+        with cls._lock:
+            if cls._persistence is None: return None
+            if slot is None: slot = cls._leases.get(threading.get_ident())
+            if slot is None:
+                raise Exception('No account set is leased to thread %s, the test must be supplied to resolve its set' %
+                                threading.current_thread().name)
+            return cls._sets[slot][index-1]
+
+    @classmethod
+    def keys(cls, slot):
+        """Return the keys for the set in a slot. """
+        with cls._lock: return list(cls._sets[slot])
+
+    @classmethod
+    def generated(cls):
+        """Return a list of (name, key) for all accounts in the generated sets. """
+        with cls._lock:
+            return [('account%d_%dpk' % (idx, slot), pk) for slot, keys in sorted(cls._sets.items())
+                    if slot > cls._static for idx, pk in enumerate(keys, start=1)]
+
+    @classmethod
+    def is_generated(cls, slot):
+        """Return true if the set in a slot was generated by the pool, rather than configured in the properties. """
+        with cls._lock: return slot is not None and slot > cls._static
@@ -0,0 +1,139 @@
+import math
+import numpy as np
+
+# two sided 95% critical values of the t distribution by degrees of freedom, tending to the normal beyond
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228,
+        11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131, 16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093,
+        20: 2.086, 25: 2.060, 30: 2.042}
+
+
+class Throughput:
+    """The throughput over time of a set of load clients, binned from the times each client completed a request.
+
+    Times are binned per client into fixed width intervals from a common start, as arrays so that binning is linear
+    in the number of samples. The steady state is taken from within the window where all clients were active, by
+    fitting a piecewise constant model to the binned total through binary segmentation on cumulative sums, accepting
+    a changepoint only where it reduces the squared error by more than a penalty scaled to the noise in the bins. The
+    longest segment is the steady state, and any bins outside it are the ramp up and down. The steady state rate is
+    reported with a confidence interval from the means of consecutive batches of bins, so as to allow for the bins
+    being correlated over time. Binned data can be written to file for plotting with gnuplot.
+    """
+    MAX_CHANGEPOINTS = 6            # so that the ramps up and down are fitted as steps
+    BATCHES = 10                    # number of batches for the confidence interval on the steady rate
+
+    def __init__(self, times, width=1, start=None):
+        """Create from a list of arrays of times per client, the bin width, and start of the first bin.
+
+        The start defaults to the earliest time across the clients.
+        """
+        self.width = width
+        times = [np.asarray(t, dtype=float) for t in times]
+        populated = [t for t in times if t.size > 0]
+        self.start = start if start is not None else (min([t.min() for t in populated]) if populated else 0)
+        end = max([t.max() for t in populated]) if populated else self.start
+        size = int((end - self.start) // width) + 1
+        self.client_bins = np.zeros((len(times), size), dtype=np.int64)
+        for i, t in enumerate(times):
+            index = ((t - self.start) // width).astype(np.int64)
+            index = index[(index >= 0) & (index < size)]
+            self.client_bins[i] = np.bincount(index, minlength=size)
+        self.bins = self.client_bins.sum(axis=0)
+        self.times = np.arange(size) * width
+        self.first, self.last = self.__steady_state()
+
+    @classmethod
+    def load(cls, files, column=0, width=1, start=None):
+        """Create from the client sample files, taking the times from a column of whitespace separated values. """
+        return Throughput([np.loadtxt(file, usecols=column, ndmin=1) for file in files], width, start)
+
+    def total(self):
+        """Return the total number of samples binned. """
+        return int(self.bins.sum())
+
+    def duration(self):
+        """Return the duration from the first to the last non-empty bin. """
+        populated = np.nonzero(self.bins)[0]
+        return int(populated[-1] - populated[0]) * self.width if populated.size > 0 else 0
+
+    def steady(self):
+        """Return a boolean mask of the bins in the steady state. """
+        mask = np.zeros(self.bins.size, dtype=bool)
+        mask[self.first:self.last] = True
+        return mask
+
+    def rate(self):
+        """Return the mean throughput per second in the steady state. """
+        steady = self.bins[self.first:self.last]
+        return float(steady.mean()) / self.width if steady.size > 0 else 0.0
+
+    def interval(self):
+        """Return the mean throughput per second in the steady state and the half width of its 95% confidence. """
+        steady = self.bins[self.first:self.last] / self.width
+        batches = min(self.BATCHES, steady.size)
+        if batches < 2: return self.rate(), 0.0
+        means = np.array([batch.mean() for batch in np.array_split(steady, batches)])
+        dof = batches - 1
+        t = T_95.get(dof, T_95[max([k for k in T_95.keys() if k <= dof])] if dof <= 30 else 1.960)
+        return float(steady.mean()), float(t * means.std(ddof=1) / math.sqrt(batches))
+
+    def write_total(self, path):
+        """Write the total count per bin as time and count. """
+        np.savetxt(path, np.column_stack((self.times, self.bins)), fmt='%d %d')
+
+    def write_client(self, path, client):
+        """Write the count per bin for a client as time and count. """
+        np.savetxt(path, np.column_stack((self.times, self.client_bins[client])), fmt='%d %d')
+
+    def write_clients(self, path):
+        """Write the count per bin for all clients as time and a column per client. """
+        np.savetxt(path, np.column_stack((self.times, self.client_bins.T)), fmt='%d')
+
+    def write_steady(self, path):
+        """Write the total count per bin in the steady state as time, count and the steady state rate. """
+        mask = self.steady()
+        rate = np.full(int(mask.sum()), self.rate())
+        np.savetxt(path, np.column_stack((self.times[mask], self.bins[mask], rate)), fmt='%d %d %.2f')
+
+    def write_ramp(self, path):
+        """Write the total count per bin outside the steady state as time and count. """
+        mask = ~self.steady()
+        np.savetxt(path, np.column_stack((self.times[mask], self.bins[mask])), fmt='%d %d')
+
+    def __steady_state(self):
+        """Return the first and last (exclusive) bin indices of the steady state. """
+        active = self.client_bins > 0
+        if self.bins.size == 0 or not active.any(axis=1).all(): return 0, 0
+        start = int(max([np.argmax(row) for row in active]))
+        end = int(min([row.size - np.argmax(row[::-1]) for row in active]))
+        if end - start < 3: return start, max(start, end)
+
+        series = self.bins[start:end].astype(float)
+        noise = np.median(np.abs(np.diff(series))) / (0.6745 * math.sqrt(2))
+        penalty = 3 * max(noise, 1.0)**2 * math.log(series.size)
+        changepoints = [0, series.size]
+        for _ in range(self.MAX_CHANGEPOINTS):
+            best = None
+            for lo, hi in zip(changepoints[:-1], changepoints[1:]):
+                split, gain = self.__split(series[lo:hi])
+                if split is not None and gain > penalty and (best is None or gain > best[1]): best = (lo + split, gain)
+            if best is None: break
+            changepoints = sorted(changepoints + [best[0]])
+
+        lengths = np.diff(changepoints)
+        longest = int(np.argmax(lengths))
+        return start + changepoints[longest], start + changepoints[longest + 1]
+
+    @staticmethod
+    def __split(series):
+        """Return the best single changepoint in a series and the reduction in the squared error it gives. """
+        n = series.size
+        if n < 2: return None, 0.0
+        sums = np.cumsum(series)
+        squares = np.cumsum(series * series)
+        total_cost = squares[-1] - sums[-1]**2 / n
+        k = np.arange(1, n)
+        left = squares[:-1] - sums[:-1]**2 / k
+        right = (squares[-1] - squares[:-1]) - (sums[-1] - sums[:-1])**2 / (n - k)
+        cost = left + right
+        split = int(np.argmin(cost))
+        return split + 1, float(total_cost - cost[split])
@@ -0,0 +1,173 @@
+import os, re, json, time, hashlib, threading, subprocess, tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from solcx import compile_source
+
+
+class CompilationCache:
+    """A content addressed on disk cache of solc compilation outputs.
+
+    Each entry is keyed on the hash of the solidity source, the contents of all its (recursively) imported sources, the
+    version of the solc binary and the requested output values. Entries are stored as json files under
+    ~/.tentest/solc_cache, and are written atomically (to a temporary file and then renamed) so that the cache can be
+    shared safely across runner threads, and across concurrent runs. Entries read or compiled in the process are also
+    held in memory, so sources precompiled by the runner are served to tests without touching disk. Hit and miss counts
+    are held at the class level so that they can be reported by the runner on completion.
+    """
+    CACHE_DIR = os.path.join(str(Path.home()), '.tentest', 'solc_cache')
+    IMPORT_REGEX = re.compile(r'^\s*import\s+(?:[^;]*?from\s+)?["\'](?P<path>[^"\']+)["\']', re.M)
+
+    hits = 0                        # number of compilations served from the cache
+    misses = 0                      # number of compilations requiring a call to solc
+    _lock = threading.Lock()        # guards the counters, versions and key locks
+    _key_locks = {}                 # per key locks so the same source is only compiled once in the process
+    _versions = {}                  # solc binary path to version string
+    _memory = {}                    # key to compiled output for entries already seen in the process
+
+    @classmethod
+    def compile(cls, source, solc_binary, output_values=('abi', 'bin')):
+        """Compile a solidity source file returning the compiled output, using the cache where possible.
+
+        The returned value is as would be returned from solcx.compile_source, i.e. a dictionary keyed on
+        '<stdin>:<contract name>' for each contract in the source.
+        """
+        output_values = sorted(output_values)
+        key = cls.key(source, solc_binary, output_values)
+        with cls._lock: key_lock = cls._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            compiled = cls._memory.get(key)
+            if compiled is None: compiled = cls._read(key)
+            if compiled is not None:
+                with cls._lock: cls.hits += 1
+                cls._memory[key] = compiled
+                return compiled
+
+            compiled = _compile(source, solc_binary, output_values)
+            cls._store(key, compiled)
+            with cls._lock: cls.misses += 1
+            return compiled
+
+    @classmethod
+    def precompile(cls, sources, solc_binary, output_values=('abi', 'bin'), max_workers=None):
+        """Compile a set of source files in a process pool, populating the in memory and on disk cache.
+
+        Sources already in the on disk cache are loaded into memory without compilation. Returns a list of tuples of
+        the source, the time taken to compile in seconds (None if loaded from the cache) and any error raised.
+        """
+        output_values = sorted(output_values)
+        results, pending = [], {}
+        for source in sorted(set(sources)):
+            key = cls.key(source, solc_binary, output_values)
+            compiled = cls._read(key)
+            if compiled is not None:
+                cls._memory[key] = compiled
+                results.append((source, None, None))
+            else:
+                pending[source] = key
+
+        if len(pending) > 0:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {source: executor.submit(_timed_compile, source, solc_binary, output_values)
+                           for source in pending}
+                for source, future in futures.items():
+                    try:
+                        compiled, duration = future.result()
+                        cls._store(pending[source], compiled)
+                        with cls._lock: cls.misses += 1
+                        results.append((source, duration, None))
+                    except Exception as e:
+                        results.append((source, None, e))
+        return results
+
+    @classmethod
+    def key(cls, source, solc_binary, output_values):
+        """Return the cache key for a source file, solc binary and set of output values."""
+        sha = hashlib.sha256()
+        sha.update(cls.solc_version(solc_binary).encode('utf-8'))
+        sha.update(','.join(output_values).encode('utf-8'))
+        for path, content in cls.sources(source):
+            sha.update(path.encode('utf-8'))
+            sha.update(content)
+        return sha.hexdigest()
+
+    @classmethod
+    def sources(cls, source):
+        """Return the (relative path, content) of a source file and all its transitively imported sources."""
+        base_path = os.path.dirname(source)
+        sources, pending, seen = [], [os.path.abspath(source)], set()
+        while len(pending) > 0:
+            path = pending.pop()
+            if path in seen: continue
+            seen.add(path)
+
+            with open(path, 'rb') as fp: content = fp.read()
+            sources.append((os.path.relpath(path, base_path), content))
+            for match in cls.IMPORT_REGEX.finditer(content.decode('utf-8', errors='ignore')):
+                imported = cls.__resolve(match.group('path'), os.path.dirname(path), base_path)
+                if imported is not None: pending.append(imported)
+        return sorted(sources)
+
+    @classmethod
+    def solc_version(cls, solc_binary):
+        """Return the version string of a solc binary, determined once per binary."""
+        with cls._lock:
+            if solc_binary not in cls._versions:
+                output = subprocess.run([solc_binary, '--version'], capture_output=True, text=True).stdout
+                cls._versions[solc_binary] = output.strip()
+            return cls._versions[solc_binary]
+
+    @classmethod
+    def stats(cls):
+        """Return a tuple of the cache hits and misses."""
+        with cls._lock: return cls.hits, cls.misses
+
+    @classmethod
+    def _store(cls, key, compiled):
+        """Store a compiled output in memory and on disk."""
+        cls._memory[key] = compiled
+        cls._write(key, compiled)
+
+    @classmethod
+    def _read(cls, key):
+        """Read an entry from the cache, returning None if it does not exist or is unreadable."""
+        path = os.path.join(cls.CACHE_DIR, '%s.json' % key)
+        if not os.path.exists(path): return None
+        try:
+            with open(path, 'r') as fp: return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def _write(cls, key, compiled):
+        """Atomically write an entry into the cache."""
+        os.makedirs(cls.CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cls.CACHE_DIR, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as fp: json.dump(compiled, fp)
+            os.replace(tmp, os.path.join(cls.CACHE_DIR, '%s.json' % key))
+        except OSError:
+            if os.path.exists(tmp): os.remove(tmp)
+
+    @staticmethod
+    def __resolve(imported, source_dir, base_path):
+        """Resolve an import path relative to the importing file, or to the base path used for compilation."""
+        for candidate in [os.path.join(source_dir, imported), os.path.join(base_path, imported),
+                          os.path.join(base_path, os.path.basename(imported))]:
+            candidate = os.path.abspath(candidate)
+            if os.path.exists(candidate): return candidate
+        return None
+
+
+def _compile(source, solc_binary, output_values):
+    """Compile a solidity source file using solc."""
+    with open(source, 'r') as fp:
+        return compile_source(source=fp.read(), output_values=output_values, solc_binary=solc_binary,
+                              base_path=os.path.dirname(source))
+
+
+def _timed_compile(source, solc_binary, output_values):
+    """Compile a solidity source file returning the output and the time taken, for use in a process pool."""
+    start = time.perf_counter()
+    compiled = _compile(source, solc_binary, output_values)
+    return compiled, time.perf_counter() - start
@@ -9,4 +9,12 @@ class TransactionTimeOut(Exception):
 
 class TransactionError(Exception):
     """Returned when a transaction was rejected by the mempool. """
-    pass
\ No newline at end of file
+    pass
+
+class BatchRequestError(Exception):
+    """Returned in place of the result of a request in a JSON-RPC batch that failed. """
+    def __init__(self, method, message, code=None):
+        super().__init__('%s failed: %s' % (method, message))
+        self.method = method
+        self.message = message
+        self.code = code
@@ -0,0 +1,139 @@
+import json, math
+
+
+class LatencyHistogram:
+    """A high dynamic range histogram of latencies recorded in constant memory.
+
+    Latencies are recorded in seconds, and held as integer counts in log-linear buckets at a resolution of a
+    microsecond, so that the value of any percentile is reported to within the number of significant digits given
+    (three by default, i.e. within 0.1%) regardless of how many samples are recorded. Only the buckets holding samples
+    are stored. Histograms with the same number of significant digits can be merged, e.g. across clients, and can be
+    written to and read from file to merge across processes.
+
+    Closed loop clients that wait on each request before sending the next under-report latency when the network
+    stalls, as the requests that would have been sent during the stall are never made (coordinated omission). Where
+    the interval at which requests were intended to be sent is known, recording with the expected interval adds the
+    samples for those missing requests, with latencies decreasing by the interval down to the interval. Open loop
+    clients should instead record the latency from the time each request was scheduled to be sent.
+    """
+    RESOLUTION = 1e6                # recorded units per second, i.e. microseconds
+    PERCENTILES = [('p50', 50.0), ('p90', 90.0), ('p99', 99.0), ('p99.9', 99.9)]
+
+    def __init__(self, digits=3):
+        """Create an empty histogram to a number of significant digits. """
+        self.digits = digits
+        self.magnitude = int(math.ceil(math.log2(2 * 10**digits)))
+        self.half_count = 2**(self.magnitude - 1)
+        self.counts = {}            # bucket index to count
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, latency, count=1):
+        """Record a latency in seconds, optionally as a number of samples of the same value. """
+        index = self.__index(int(max(0.0, latency) * self.RESOLUTION))
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += latency * count
+        self.min = latency if self.min is None else min(self.min, latency)
+        self.max = latency if self.max is None else max(self.max, latency)
+
+    def record_corrected(self, latency, expected_interval, count=1):
+        """Record a latency, correcting for coordinated omission against the expected interval between requests. """
+        self.record(latency, count)
+        if expected_interval is None or expected_interval <= 0: return
+        missing = latency - expected_interval
+        while missing >= expected_interval:
+            self.record(missing, count)
+            missing -= expected_interval
+
+    def corrected(self, expected_interval):
+        """Return a copy of the histogram corrected for coordinated omission against the expected interval. """
+        histogram = LatencyHistogram(self.digits)
+        for value, count in self.values(): histogram.record_corrected(value, expected_interval, count)
+        return histogram
+
+    def merge(self, other):
+        """Add the samples from another histogram to this one, returning self. """
+        if other.digits != self.digits: raise ValueError('Unable to merge histograms of different precision')
+        for index, count in other.counts.items(): self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None: self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None: self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def mean(self):
+        """Return the mean latency in seconds. """
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def percentile(self, percentile):
+        """Return the latency in seconds at a percentile between 0 and 100. """
+        if self.count == 0: return 0.0
+        target = max(1, int(math.ceil(self.count * percentile / 100.0)))
+        seen = 0
+        for index in sorted(self.counts.keys()):
+            seen += self.counts[index]
+            if seen >= target: return min(self.max, self.__highest(index) / self.RESOLUTION)
+        return self.max
+
+    def percentiles(self):
+        """Return a dictionary of the p50, p90, p99, p99.9 and max latencies in seconds. """
+        summary = dict([(name, self.percentile(percentile)) for name, percentile in self.PERCENTILES])
+        summary['max'] = self.max if self.max is not None else 0.0
+        return summary
+
+    def values(self):
+        """Yield the (latency, count) of each non-empty bucket in increasing order of latency. """
+        for index in sorted(self.counts.keys()):
+            yield self.__lowest(index) / self.RESOLUTION, self.counts[index]
+
+    def bins(self, width=None, num_bins=40):
+        """Return a list of (start, count) for linear bins, either of a given width or a number across the range. """
+        if self.count == 0: return []
+        if width is None:
+            start, width = self.min, (self.max - self.min) / num_bins or 1.0 / self.RESOLUTION
+        else:
+            start = math.floor(self.min / width) * width
+            num_bins = int((self.max - start) / width) + 1
+        counts = [0] * num_bins
+        for value, count in self.values():
+            counts[min(len(counts) - 1, max(0, int((value - start) / width)))] += count
+        return [(start + i * width, count) for i, count in enumerate(counts)]
+
+    def write(self, path):
+        """Write the histogram to a file, so that it can be read and merged by another process. """
+        with open(path, 'w') as fp:
+            json.dump({'digits': self.digits, 'count': self.count, 'total': self.total, 'min': self.min,
+                       'max': self.max, 'counts': self.counts}, fp)
+
+    @classmethod
+    def read(cls, path):
+        """Read a histogram written to a file. """
+        with open(path, 'r') as fp: data = json.load(fp)
+        histogram = LatencyHistogram(data['digits'])
+        histogram.counts = dict([(int(index), count) for index, count in data['counts'].items()])
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.min = data['min']
+        histogram.max = data['max']
+        return histogram
+
+    def __index(self, value):
+        """Return the bucket index for a value in recorded units. """
+        if value < 2 * self.half_count: return value
+        shift = value.bit_length() - self.magnitude
+        return shift * self.half_count + (value >> shift)
+
+    def __lowest(self, index):
+        """Return the lowest value in recorded units held in a bucket. """
+        if index < 2 * self.half_count: return index
+        shift = index // self.half_count - 1
+        return (index - shift * self.half_count) << shift
+
+    def __highest(self, index):
+        """Return the highest value in recorded units held in a bucket. """
+        if index < 2 * self.half_count: return index
+        shift = index // self.half_count - 1
+        return ((index - shift * self.half_count + 1) << shift) - 1
@@ -3,6 +3,7 @@ from pathlib import Path
 from pysys.constants import *
 from pysys.exceptions import FileNotFoundException
 from ten.test.utils.threading import thread_num
+from ten.test.utils.accounts import AccountPool
 
 
 class Properties:
@@ -76,6 +77,10 @@ class Properties:
             raise FileNotFoundException('npx binary not found at default location %s' % path)
         return path
 
+    # pooled http sessions
+    def http_pool_size(self): return int(self.get('network.http', 'PoolSize'))
+    def http_keep_alive(self): return self.get('network.http', 'KeepAlive').lower() == 'true'
+
     # common to all environments
     def block_time_secs(self, key):
         return self.get('env.'+key, 'BlockTimeSecs')
@@ -85,15 +90,28 @@ class Properties:
         return [
             self.fundacntpk,
             self.account1_1pk, self.account2_1pk, self.account3_1pk, self.account4_1pk,
-            self.account2_2pk, self.account2_2pk, self.account3_2pk, self.account4_2pk,
+            self.account1_2pk, self.account2_2pk, self.account3_2pk, self.account4_2pk,
             self.account1_3pk, self.account2_3pk, self.account3_3pk, self.account4_3pk
         ]
 
     def fundacntpk(self): return self.get('env.all', 'FundAcntPK')
-    def account1pk(self): return getattr(self, "account1_%dpk" % thread_num())()
-    def account2pk(self): return getattr(self, "account2_%dpk" % thread_num())()
-    def account3pk(self): return getattr(self, "account3_%dpk" % thread_num())()
-    def account4pk(self): return getattr(self, "account4_%dpk" % thread_num())()
+    def account1pk(self, test=None): return self.__account_pk(1, test)
+    def account2pk(self, test=None): return self.__account_pk(2, test)
+    def account3pk(self, test=None): return self.__account_pk(3, test)
+    def account4pk(self, test=None): return self.__account_pk(4, test)
+
+    # accounts 1 to 4 from the set leased to the test, or to the calling thread if no test is supplied, or by thread
+    # number if the account pool is not in use
+    def __account_pk(self, index, test=None):
+        pk = AccountPool.key(index, getattr(test, 'account_slot', None))
+        if pk is not None: return pk
+        num = thread_num()
+        if num > len(self.account_sets()): raise Exception('No account set is configured for thread %d' % num)
+        return getattr(self, "account%d_%dpk" % (index, num))()
+
+    # the account sets configured in the properties, from which the account pool is seeded
+    def account_sets(self):
+        return [[getattr(self, "account%d_%dpk" % (index, num))() for index in range(1, 5)] for num in range(1, 4)]
 
     # accounts 1 to 4 used by thread-1 or the main thread
     def account1_1pk(self): return self.get('env.all', 'Account1PK')
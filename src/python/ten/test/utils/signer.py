@@ -0,0 +1,110 @@
+import os, time, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from eth_account import Account
+
+_account = None                     # the account used to sign in a worker process
+_template = None                    # the transaction template used in a worker process
+
+
+def _initialise(private_key, template):
+    """Initialise a worker process with the signing account and any template, so neither is sent per chunk. """
+    global _account, _template
+    _account = Account.from_key(private_key)
+    _template = template
+
+
+def _sign(txs):
+    """Sign a chunk of transaction dictionaries in a worker process, returning the times taken and raw bytes. """
+    start = time.time()
+    raw = [bytes(_account.sign_transaction(tx).rawTransaction) for tx in txs]
+    return start, time.time(), raw
+
+
+def _sign_template(fields):
+    """Sign a chunk of (nonce, to, value) tuples against the template in a worker process. """
+    start = time.time()
+    raw = []
+    for nonce, to, value in fields:
+        tx = dict(_template)
+        tx['nonce'] = nonce
+        if to is not None: tx['to'] = to
+        if value is not None: tx['value'] = value
+        raw.append(bytes(_account.sign_transaction(tx).rawTransaction))
+    return start, time.time(), raw
+
+
+class BulkSigner:
+    """Signs large numbers of transactions for a single account over a pool of worker processes.
+
+    Signing is CPU bound ECDSA and RLP encoding in pure python, so when pre-signing a backlog of transactions to be
+    bulk loaded into the network it dominates the time to set up. Transactions are split into chunks which are signed
+    across the pool, with the raw signed bytes streamed back in the order the transactions were supplied, i.e. in
+    nonce order when supplied that way. In template mode only the nonce, recipient and value are sent to the workers
+    per transaction, with the rest of the transaction dictionary sent once when the pool starts. The number of
+    signatures and time spent signing are recorded so that the rate can be reported, the time being that during which
+    any worker was signing, and hence excluding time the caller spends between consuming results. Workers are spawned
+    rather than forked, as the signer is used from multi-threaded processes where a forked child could inherit locks
+    held by other threads. Use as a context manager, or call close when done, to stop the pool.
+    """
+    CHUNK_SIZE = 250                # number of transactions signed per task
+
+    def __init__(self, private_key, template=None, processes=None, chunk_size=CHUNK_SIZE):
+        """Create the signer, starting a pool of processes (defaulting to the CPU count) for the key and template. """
+        self.chunk_size = chunk_size
+        self.signed = 0             # number of signatures made
+        self.duration = 0.0         # time in seconds spent signing
+        self._executor = ProcessPoolExecutor(max_workers=processes or os.cpu_count(),
+                                             mp_context=multiprocessing.get_context('spawn'),
+                                             initializer=_initialise, initargs=(private_key, template))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Stop the worker processes. """
+        self._executor.shutdown()
+
+    def sign(self, txs):
+        """Sign a list of transaction dictionaries, yielding the raw signed bytes in the order supplied. """
+        chunks = [txs[i:i+self.chunk_size] for i in range(0, len(txs), self.chunk_size)]
+        yield from self.__stream(_sign, chunks)
+
+    def sign_template(self, nonces, recipients=None, values=None):
+        """Sign a transaction per nonce from the template, yielding the raw signed bytes in the order supplied.
+
+        Recipients and values are optional lists in the same order as the nonces, overriding those in the template.
+        """
+        nonces = list(nonces)
+        recipients = recipients if recipients is not None else [None] * len(nonces)
+        values = values if values is not None else [None] * len(nonces)
+        fields = list(zip(nonces, recipients, values))
+        chunks = [fields[i:i+self.chunk_size] for i in range(0, len(fields), self.chunk_size)]
+        yield from self.__stream(_sign_template, chunks)
+
+    def rate(self):
+        """Return the number of signatures per second made by the signer so far. """
+        return self.signed / self.duration if self.duration > 0 else 0.0
+
+    def __stream(self, function, chunks):
+        """Sign the chunks across the pool, yielding results in order as each chunk completes. """
+        intervals = []
+        try:
+            for start, end, raw in self._executor.map(function, chunks):
+                intervals.append((start, end))
+                self.signed += len(raw)
+                yield from raw
+        finally:
+            self.duration += self.__busy(intervals)
+
+    @staticmethod
+    def __busy(intervals):
+        """Return the time covered by the union of a list of (start, end) intervals. """
+        busy, last = 0.0, None
+        for start, end in sorted(intervals):
+            if last is not None and start < last: start = last
+            if end > start: busy += end - start
+            last = end if last is None else max(last, end)
+        return busy
@@ -1,6 +1,6 @@
 import threading, re
 
-REGEX = re.compile('Thread-(?P<num>\d$)', re.M)
+REGEX = re.compile(r'Thread-(?P<num>\d+)', re.M)
 
 
 def thread_num():
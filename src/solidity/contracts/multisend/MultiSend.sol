@@ -0,0 +1,20 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.0;
+
+contract MultiSend {
+    event Sent(uint count, uint total);
+
+    function multiSend(address payable[] calldata recipients, uint[] calldata amounts) external payable {
+        require(recipients.length == amounts.length, "Recipients and amounts differ in length");
+
+        uint total = 0;
+        for (uint i = 0; i < amounts.length; i++) total += amounts[i];
+        require(total == msg.value, "Value sent does not match the total amount");
+
+        for (uint i = 0; i < recipients.length; i++) {
+            (bool sent, ) = recipients[i].call{value: amounts[i]}("");
+            require(sent, "Failed to send Ether");
+        }
+        emit Sent(recipients.length, total);
+    }
+}
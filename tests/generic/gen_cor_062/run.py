@@ -26,10 +26,13 @@ class PySysTest(GenericNetworkTest):
         self.run_python(script, stdout, stderr, args)
         self.waitForGrep(file=stdout, expr='Starting to run the polling loop', timeout=10)
 
-        # transfer from account1 into account2
-        for i in range(0, 5):
-            self.log.info('Account1 balance = %d ', erc20.contract.functions.balanceOf(account1.address).call())
-            network.transact(self, web3, erc20.contract.functions.transfer(account2.address, 1), account1, erc20.GAS_LIMIT)
+        # transfer from account1 into account2, logging the balance after each transfer from the receipts
+        balance = erc20.contract.functions.balanceOf(account1.address).call()
+        self.log.info('Account1 balance = %d ', balance)
+        targets = [erc20.contract.functions.transfer(account2.address, 1) for _ in range(0, 5)]
+        for receipt in network.transact_many(self, web3, targets, account1, erc20.GAS_LIMIT):
+            balance = balance - 1
+            self.log.info('Account1 balance = %d after transfer in block %d', balance, receipt.blockNumber)
 
         self.waitForGrep(file=stdout, expr='New balance = 5', timeout=20)
         self.assertGrep(file=stdout, expr='New balance = 5')
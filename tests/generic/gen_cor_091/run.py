@@ -19,12 +19,8 @@ class PySysTest(GenericNetworkTest):
         self.run_subscriber(network, emitter, id_filter=1)
 
         # make some transactions
-        network.transact(self, web3_2, emitter.contract.functions.emitSimpleEvent(1, 'one'), account_2, emitter.GAS_LIMIT)
-        network.transact(self, web3_2, emitter.contract.functions.emitSimpleEvent(1, 'two'), account_2, emitter.GAS_LIMIT)
-        network.transact(self, web3_2, emitter.contract.functions.emitSimpleEvent(1, 'three'), account_2, emitter.GAS_LIMIT)
-        network.transact(self, web3_2, emitter.contract.functions.emitSimpleEvent(1, 'four'), account_2, emitter.GAS_LIMIT)
-        network.transact(self, web3_2, emitter.contract.functions.emitSimpleEvent(1, 'five'), account_2, emitter.GAS_LIMIT)
-        network.transact(self, web3_2, emitter.contract.functions.emitSimpleEvent(1, 'six'), account_2, emitter.GAS_LIMIT)
+        targets = [emitter.contract.functions.emitSimpleEvent(1, x) for x in ['one', 'two', 'three', 'four', 'five', 'six']]
+        network.transact_many(self, web3_2, targets, account_2, emitter.GAS_LIMIT)
 
         # wait for the poller to have made 6 attempts
         self.waitForSignal(os.path.join(self.output, 'poller.log'), expr='Getting past SimpleEvent events', condition=">=6")
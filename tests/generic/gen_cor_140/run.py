@@ -0,0 +1,49 @@
+import asyncio
+from web3 import Web3
+from pysys.constants import PASSED, FAILED
+from ten.test.basetest import GenericNetworkTest
+from ten.test.networks.gateway import GatewayCache
+
+
+class PySysTest(GenericNetworkTest):
+    ACCOUNTS = 4              # number of concurrent accounts
+    TRANSACTIONS = 5          # number of transactions per account
+
+    def execute(self):
+        # get an async connection to the network, and some funded ephemeral accounts
+        network = self.get_async_network_connection()
+        keys = self.get_ephemeral_keys(self.ACCOUNTS, 0.01)
+        recipient = Web3().eth.account.create().address
+
+        # drive all accounts concurrently from a single event loop
+        results = asyncio.run(self.transact(network, keys, recipient))
+
+        failures = 0
+        for address, sent, receipts in results:
+            statuses = [receipt.status if receipt is not None else None for receipt in receipts]
+            self.log.info('Account %s transactions sent %d, statuses %s', address, sent, statuses)
+            if sent != self.TRANSACTIONS + 1 or statuses != [1] * (self.TRANSACTIONS + 1): failures += 1
+
+        if failures == 0: self.addOutcome(PASSED)
+        else: self.addOutcome(FAILED, outcomeReason='%d accounts did not complete all transactions' % failures)
+
+    async def transact(self, network, keys, recipient):
+        """Connect all accounts and transact from each concurrently, returning the number sent and receipts. """
+        try:
+            connections = await asyncio.gather(*[network.connect(self, key, check_funds=False, verbose=False)
+                                                 for key in keys])
+            return await asyncio.gather(*[self.transact_account(network, web3, account, recipient)
+                                          for web3, account in connections])
+        finally:
+            await GatewayCache.close_sessions()
+
+    async def transact_account(self, network, web3, account, recipient):
+        """Send a single transaction and then a pipeline of transactions from an account. """
+        gas_price = await web3.eth.gas_price
+        start = await web3.eth.get_transaction_count(account.address)
+        tx = {'to': recipient, 'value': 1, 'gas': 21000, 'gasPrice': gas_price}
+        receipt = await network.tx(self, web3, dict(tx), account, verbose=False)
+        receipts = await network.tx_many(self, web3, [dict(tx) for _ in range(self.TRANSACTIONS)], account,
+                                         verbose=False)
+        end = await web3.eth.get_transaction_count(account.address)
+        return account.address, end - start, [receipt] + receipts
@@ -1,10 +1,12 @@
 import secrets, os, time
 from datetime import datetime
-from collections import OrderedDict
 from web3.exceptions import TimeExhausted
 from pysys.constants import FAILED, PASSED
 from ten.test.basetest import TenNetworkTest
+from ten.test.networks.timings import TimingCollector
 from ten.test.utils.gnuplot import GnuplotHelper
+from ten.test.utils.analysis import Throughput
+from ten.test.utils.signer import BulkSigner
 
 
 class PySysTest(TenNetworkTest):
@@ -47,15 +49,18 @@ class PySysTest(TenNetworkTest):
         # bulk load transactions, and wait for the last
         self.log.info('')
         self.log.info('Creating and signing %d transactions', self.ITERATIONS)
-        txs = []
-        for nonce in range(0, self.ITERATIONS):
-            txs.append((self.create_signed_tx(network, account_send, nonce, account_recv.address), nonce))
+        template = {'to': account_recv.address, 'value': self.value, 'gas': self.gas_limit,
+                    'gasPrice': self.gas_price, 'chainId': self.chain_id}
+        with BulkSigner(account_send.key, template) as signer:
+            txs = [(raw, nonce) for nonce, raw in enumerate(signer.sign_template(range(0, self.ITERATIONS)))]
+        self.log.info('Signed at %.1f signatures per second', signer.rate())
 
         self.log.info('Bulk sending transactions to the network')
         balance_before = web3_send.eth.get_balance(account_send.address)
+        start = web3_send.eth.block_number
         tx_hashes = []
-        for tx in txs:
-            tx_hashes.append((network.send_transaction(self, web3_send, tx[1], account_send, tx[0], False, verbose=False), tx[1]))
+        for raw, nonce in txs:
+            tx_hashes.append((web3_send.eth.send_raw_transaction(raw), nonce))
         balance_after_send = web3_send.eth.get_balance(account_send.address)
 
         self.log.info('Waiting for last transaction to be mined')
@@ -84,23 +89,18 @@ class PySysTest(TenNetworkTest):
         # bin the data into timestamp intervals and log out to file
         self.log.info('')
         self.log.info('Constructing binned data from the transaction receipts and graphing')
-        bins = OrderedDict()
-        for tx_hash, nonce in tx_hashes:
-            block_number_deploy = web3_send.eth.get_transaction(tx_hash).blockNumber
-            timestamp = int(web3_send.eth.get_block(block_number_deploy).timestamp)
-            bins[timestamp] = 1 if timestamp not in bins else bins[timestamp] + 1
-
-        times = list(bins)
-        first = times[0]
-        with open(os.path.join(self.output, 'data.bin'), 'w') as fp:
-            for i in range(times[0], times[-1]+1):
-                num = bins[i] if i in bins else 0
-                fp.write('%d %d\n' % ((i - first), num))
+        collector = TimingCollector(web3_send.provider.endpoint_uri)
+        collector.collect([tx_hash for tx_hash, _ in tx_hashes], start)
+        inclusions = [collector.inclusion(tx_hash) for tx_hash, _ in tx_hashes]
+        self.log.info('Timing collector made %d requests over %d blocks', collector.requests, len(collector.blocks))
+
+        throughput = Throughput([[inclusion.timestamp for inclusion in inclusions if inclusion is not None]])
+        throughput.write_total(os.path.join(self.output, 'data.bin'))
 
         # graph the output
         branch = GnuplotHelper.buildInfo().branch
         date = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
-        duration = times[-1]-times[0]
+        duration = throughput.duration()
         average = float(self.ITERATIONS) / float(duration) if duration != 0 else 0
         GnuplotHelper.graph(self, os.path.join(self.input, 'gnuplot.in'), branch, date,
                             str(self.mode), str(self.ITERATIONS), str(duration), '%.3f'%average)
@@ -110,14 +110,3 @@ class PySysTest(TenNetworkTest):
 
         # passed if no failures (though pdf output should be reviewed manually)
         self.addOutcome(PASSED)
-
-    def create_signed_tx(self, network, account, nonce, address):
-        """Creates a signed transaction ready for the sending of funds to an account. """
-        tx = {'nonce': nonce,
-              'to': address,
-              'value': self.value,
-              'gas': self.gas_limit,
-              'gasPrice': self.gas_price,
-              'chainId': self.chain_id
-              }
-        return network.sign_transaction(self, tx, nonce, account, persist_nonce=False)
@@ -1,6 +1,7 @@
 from web3 import Web3
 import secrets, time
 import logging, random, argparse, sys
+from ten.test.networks.receipts import ReceiptTracker
 
 logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', stream=sys.stdout, level=logging.INFO)
 
@@ -55,16 +56,19 @@ def run(name, chainId, web3, sending_accounts, num_accounts, num_iterations, amo
     duration = end_time - start_time
     logging.info('Time to send all transactions was %.4f', duration)
 
-    logging.info('Waiting for last transaction')
-    web3.eth.wait_for_transaction_receipt(receipts[-1][0], timeout=600)
+    logging.info('Waiting for all transactions')
+    tracker = ReceiptTracker(web3.provider.endpoint_uri)
+    tx_receipts = tracker.wait_all([receipt[0] for receipt in receipts], timeout=600)
+    logging.info('Receipt tracker made %d requests', tracker.requests)
 
     logging.info('Constructing binned data from the transaction receipts')
     with open('%s.log' % name, 'w') as fp:
-        for receipt in receipts:
-            web3.eth.wait_for_transaction_receipt(receipt[0], timeout=30)
-            block_number_deploy = web3.eth.get_transaction(receipt[0]).blockNumber
-            timestamp = int(web3.eth.get_block(block_number_deploy).timestamp)
-            fp.write('%d %d %d\n' % (receipt[1], block_number_deploy, timestamp))
+        for receipt, tx_receipt in zip(receipts, tx_receipts):
+            if tx_receipt is None: continue
+            if tx_receipt.blockNumber not in tracker.timestamps:
+                tracker.timestamps[tx_receipt.blockNumber] = web3.eth.get_block(tx_receipt.blockNumber).timestamp
+            timestamp = int(tracker.timestamps[tx_receipt.blockNumber])
+            fp.write('%d %d %d\n' % (receipt[1], tx_receipt.blockNumber, timestamp))
 
     for account in nonces.keys():
         balance = web3.eth.get_balance(account)
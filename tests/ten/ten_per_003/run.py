@@ -1,9 +1,9 @@
 import os, secrets, time, re
 from datetime import datetime
-from collections import OrderedDict
 from pysys.constants import PASSED, FAILED
 from ten.test.basetest import TenNetworkTest
 from ten.test.utils.gnuplot import GnuplotHelper
+from ten.test.utils.analysis import Throughput
 
 
 class PySysTest(TenNetworkTest):
@@ -39,21 +39,15 @@ class PySysTest(TenNetworkTest):
             self.ratio_failures(file=os.path.join(self.output, 'client_%s.out' % i))
 
         # process and graph the output
-        data = [self.load_data('client_%s.log' % i) for i in self.clients]
-        first = int(data[0][0][1])
-        last = int(data[-1][-1][1])
-
-        data_binned = [self.bin_data(first, last, d, OrderedDict()) for d in data]
+        throughput = Throughput.load([os.path.join(self.output, 'client_%s.log' % i) for i in self.clients], column=2)
         for i in self.clients:
-            with open(os.path.join(self.output, 'client_%s.bin' % i), 'w') as fp:
-                for key, value in data_binned[self.clients.index(i)].items(): fp.write('%d %d\n' % (key, value))
-
-        with open(os.path.join(self.output, 'clients.bin'), 'w') as fp:
-            for t in range(0, last + 1 - first):
-                fp.write('%d %d\n' % (t, sum([d[t] for d in data_binned])))
+            throughput.write_client(os.path.join(self.output, 'client_%s.bin' % i), self.clients.index(i))
+        throughput.write_total(os.path.join(self.output, 'clients.bin'))
+        rate, interval = throughput.interval()
+        self.log.info('Steady state throughput %.2f +/- %.2f (transactions/sec)', rate, interval)
 
         branch = GnuplotHelper.buildInfo().branch
-        duration = last - first
+        duration = throughput.duration()
         average = float(len(self.clients) * self.ITERATIONS) / float(duration) if duration != 0 else 0
         date = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
         GnuplotHelper.graph(self, os.path.join(self.input, 'gnuplot.in'),
@@ -94,19 +88,3 @@ class PySysTest(TenNetworkTest):
         args.extend(['--gas_limit', '%d' % self.gas_limit])
         self.run_python(script, stdout, stderr, args)
         self.waitForSignal(file=stdout, expr='Starting client %s' % name)
-
-    def load_data(self, file):
-        """Load a client transaction log into memory. """
-        data = []
-        with open(os.path.join(self.output, file), 'r') as fp:
-            for line in fp.readlines():
-                nonce, block_nume, timestamp = line.split()
-                data.append((nonce, int(timestamp)))
-        return data
-
-    def bin_data(self, first, last, data, binned_data):
-        """Bin a client transaction data and offset the time. """
-        b = OrderedDict()
-        for _, t in data: b[t] = 1 if t not in b else b[t] + 1
-        for t in range(first, last + 1): binned_data[t - first] = 0 if t not in b else b[t]
-        return binned_data
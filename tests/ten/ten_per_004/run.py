@@ -1,15 +1,17 @@
 import os, secrets, time, re
 from datetime import datetime
-from collections import OrderedDict
-from pysys.constants import PASSED, FAILED
+from pysys.constants import PASSED, FAILED, PROJECT
 from ten.test.basetest import TenNetworkTest
 from ten.test.utils.gnuplot import GnuplotHelper
+from ten.test.utils.analysis import Throughput
 
 
 class PySysTest(TenNetworkTest):
     ITERATIONS = 1024      # iterations per client
     CLIENTS = 4            # the number of concurrent clients
     ACCOUNTS = 8           # number of different accounts that receive the funds per client
+    RATE = 0               # rate of transactions offered per second per client, or 0 to bulk load
+    GATEWAYS = 1           # the number of gateways the clients are spread across
 
     def __init__(self, descriptor, outsubdir, runner):
         super().__init__(descriptor, outsubdir, runner)
@@ -28,34 +30,27 @@ class PySysTest(TenNetworkTest):
         self.gas_limit = web3.eth.estimate_gas({'to': account.address, 'value': self.value, 'gasPrice': self.gas_price})
         funds_needed = 1.1 * self.ITERATIONS * (self.gas_price*self.gas_limit + self.value)
 
-        # run the clients
-        setup = [self.setup_client('client_%d' % i, funds_needed) for i in range(self.CLIENTS)]
+        # run the clients, spread across the gateways if more than one
+        gateways = self.get_network_connection(gateways=self.GATEWAYS) if self.GATEWAYS > 1 else None
+        setup = [self.setup_client('client_%d' % i, funds_needed, gateways) for i in range(self.CLIENTS)]
         for i in range(self.CLIENTS): self.run_client('client_%d' % i, setup[i][0], setup[i][1])
         for i in range(self.CLIENTS):
             self.waitForGrep(file='client_%d.out' % i, expr='Client client_%d completed' % i, timeout=900)
             self.ratio_failures(file=os.path.join(self.output, 'client_%d.out' % i))
+            self.assertGrep(file='client_%d.out' % i, expr='unconfirmed transactions = 0$')
 
         # process and graph the output
-        data = [self.load_data('client_%d.log' % i) for i in range(self.CLIENTS)]
-        first = int(data[0][0][1])
-        last = int(data[-1][-1][1])
-
-        data_binned = [self.bin_data(first, last, d, OrderedDict()) for d in data]
-        with open(os.path.join(self.output, 'clients_all.bin'), 'w') as fp:
-            for t in range(0, last + 1 - first):
-                fp.write('%d %s\n' % (t, ' '.join([str(d[t]) for d in data_binned])))
-
-        heights = []
-        with open(os.path.join(self.output, 'clients.bin'), 'w') as fp:
-            for t in range(0, last + 1 - first):
-                height = sum([d[t] for d in data_binned])
-                heights.append(height)
-                fp.write('%d %d\n' % (t, height))
-        average = '%.2f' % (float(sum(heights)) / len(heights))
+        files = [os.path.join(self.output, 'client_%d.log' % i) for i in range(self.CLIENTS)]
+        throughput = Throughput.load(files, column=1)
+        throughput.write_clients(os.path.join(self.output, 'clients_all.bin'))
+        throughput.write_total(os.path.join(self.output, 'clients.bin'))
+        average = '%.2f' % (float(throughput.total()) / throughput.bins.size)
+        rate, interval = throughput.interval()
+        self.log.info('Steady state throughput %.2f +/- %.2f (transactions/sec)', rate, interval)
 
         # plot out the results
         branch = GnuplotHelper.buildInfo().branch
-        duration = last - first
+        duration = throughput.duration()
         date = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
         GnuplotHelper.graph(self, os.path.join(self.input, 'gnuplot.in'),
                             branch, date,
@@ -67,18 +62,21 @@ class PySysTest(TenNetworkTest):
         # passed if no failures (though pdf output should be reviewed manually)
         self.addOutcome(PASSED)
 
-    def setup_client(self, name, funds_needed):
+    def setup_client(self, name, funds_needed, gateways=None):
         pk = secrets.token_hex(32)
-        network = self.get_network_connection()
+        network = self.get_network_connection() if gateways is None else gateways
         web3, account = network.connect(self, private_key=pk, check_funds=False)
         self.distribute_native(account, web3.from_wei(funds_needed, 'ether'))
+        if gateways is not None:
+            network = gateways.gateway(account.address)
+            self.log.info('Client %s using gateway %s', name, network.gateway_url())
         return pk, network
 
     def run_client(self, name, pk, network):
         """Run a background load client. """
         stdout = os.path.join(self.output, '%s.out' % name)
         stderr = os.path.join(self.output, '%s.err' % name)
-        script = os.path.join(self.input, 'client.py')
+        script = os.path.join(PROJECT.root, 'src', 'python', 'scripts', 'transfer_client.py')
         args = []
         args.extend(['--network_http', network.connection_url()])
         args.extend(['--chainId', '%s' % network.chain_id()])
@@ -88,21 +86,6 @@ class PySysTest(TenNetworkTest):
         args.extend(['--client_name', name])
         args.extend(['--amount', '%d' % self.value])
         args.extend(['--gas_limit', '%d' % self.gas_limit])
+        args.extend(['--rate', '%d' % self.RATE])
         self.run_python(script, stdout, stderr, args)
         self.waitForSignal(file=stdout, expr='Starting client %s' % name)
-
-    def load_data(self, file):
-        """Load a client transaction log into memory. """
-        data = []
-        with open(os.path.join(self.output, file), 'r') as fp:
-            for line in fp.readlines():
-                nonce, timestamp = line.split()
-                data.append((nonce, int(timestamp)))
-        return data
-
-    def bin_data(self, first, last, data, binned_data):
-        """Bin a client transaction data and offset the time. """
-        b = OrderedDict()
-        for _, t in data: b[t] = 1 if t not in b else b[t] + 1
-        for t in range(first, last + 1): binned_data[t - first] = 0 if t not in b else b[t]
-        return binned_data
@@ -1,6 +1,7 @@
 from web3 import Web3
 import logging, random
 import argparse, json, sys, time
+from ten.test.utils.histogram import LatencyHistogram
 
 logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', stream=sys.stdout, level=logging.INFO)
 
@@ -61,10 +62,10 @@ if __name__ == "__main__":
     logging.info('Client running')
     account = web3.eth.account.from_key(args.pk_to_register)
 
-    with open(args.output_file, 'w') as fp:
-        for i in range(0, int(args.num_iterations)):
-            fp.write('%.4f\n' % store_value(random.randint(0,100), web3, account, contract, int(args.gas_limit)))
-            fp.flush()
+    latency = LatencyHistogram()
+    for i in range(0, int(args.num_iterations)):
+        latency.record(store_value(random.randint(0,100), web3, account, contract, int(args.gas_limit)))
+    latency.write(args.output_file)
     logging.info('Client completed')
     logging.shutdown()
 
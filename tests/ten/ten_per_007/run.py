@@ -6,6 +6,7 @@ from pysys.constants import PASSED, FAILED
 from ten.test.contracts.storage import KeyStorage
 from ten.test.basetest import TenNetworkTest
 from ten.test.utils.gnuplot import GnuplotHelper
+from ten.test.utils.histogram import LatencyHistogram
 
 
 class PySysTest(TenNetworkTest):
@@ -68,33 +69,36 @@ class PySysTest(TenNetworkTest):
         self.run_javascript(script, stdout, stderr, args)
 
     def graph(self):
-        # load the latency values and sort
-        l = []
+        # merge the client latency histograms
+        histogram = LatencyHistogram()
         for i in range(0, self.CLIENTS):
-            with open(os.path.join(self.output, 'client_%d.log' % i), 'r') as fp:
-                for line in fp.readlines(): l.append(float(line.strip()))
-        l.sort()
-        self.log.info('Average latency = %.2f', (sum(l) / len(l)))
-        self.log.info('Median latency = %.2f', l[int(len(l) / 2)])
+            histogram.merge(self.load_latency(os.path.join(self.output, 'client_%d.log' % i)))
+        self.log.info('Average latency = %.2f', histogram.mean())
+        self.log.info('Median latency = %.2f', histogram.percentile(50))
 
-        # bin into intervals and write to file
-        bins = OrderedDict()
-        bin_inc = 20  # 0.05 intervals
-        bin = lambda x: int(math.floor(bin_inc*x))
+        for name, value in histogram.percentiles().items(): self.log.info('Latency %s = %.2f', name, value)
 
-        for i in range(bin(l[0]), bin(l[len(l)-1])+1): bins[i] = 0
-        for v in l: bins[bin(v)] = bins[bin(v)] + 1
+        # bin into intervals and write to file
         with open(os.path.join(self.output, 'bins.log'), 'w') as fp:
-            for k in bins.keys(): fp.write('%.2f %d\n' % (k/float(bin_inc), bins[k]))
+            for start, count in histogram.bins(width=0.05): fp.write('%.2f %d\n' % (start, count))
             fp.flush()
 
         # plot out the results
         branch = GnuplotHelper.buildInfo().branch
         date = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
-        latency = '%.2f' % (sum(l) / len(l))
+        latency = '%.2f' % histogram.mean()
         GnuplotHelper.graph(self, os.path.join(self.input, 'gnuplot.in'),
                             branch, date,
-                            str(self.mode), str(len(l)), '%d' % self.CLIENTS, latency)
+                            str(self.mode), str(histogram.count), '%d' % self.CLIENTS, latency)
 
         # persist the result
-        self.results_db.insert_result(self.descriptor.id, self.mode, int(time.time()), latency)
+        now = int(time.time())
+        self.results_db.insert_result(self.descriptor.id, self.mode, now, latency)
+        self.results_db.insert_latency(self.descriptor.id, self.mode, now, histogram)
+
+    def load_latency(self, file):
+        """Load the latency values written one per line by a client into a histogram. """
+        histogram = LatencyHistogram()
+        with open(file, 'r') as fp:
+            for line in fp.readlines(): histogram.record(float(line.strip()))
+        return histogram
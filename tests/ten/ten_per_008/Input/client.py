@@ -1,5 +1,6 @@
 import logging, argparse, sys, time, os
 from web3 import Web3
+from ten.test.utils.histogram import LatencyHistogram
 
 logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', stream=sys.stdout, level=logging.INFO)
 
@@ -7,7 +8,7 @@ logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', stream=sys.s
 def run(name, web3, num_iterations, start):
     address = Web3().eth.account.from_key(args.pk).address
 
-    latency = []
+    latency = LatencyHistogram()
     num_requests = 0
     throughput = []
     stats = [0,0]
@@ -16,7 +17,7 @@ def run(name, web3, num_iterations, start):
             start_time = time.perf_counter_ns()
             web3.eth.get_balance(address)
             end_time = time.perf_counter_ns()
-            latency.append((end_time - start_time)/1e6)
+            latency.record((end_time - start_time)/1e9)
             num_requests = num_requests + 1
             throughput.append(((end_time - start)/1e9, num_requests))
             stats[0] += 1
@@ -26,8 +27,7 @@ def run(name, web3, num_iterations, start):
     logging.warning('Ratio failures = %.2f', float(stats[1]) / sum(stats))
 
     logging.info('Logging latency for the RPC requests')
-    with open('%s_latency.log' % name, 'w') as fp:
-        for l in latency: fp.write('%d\n' % l)
+    latency.write('%s_latency.hdr' % name)
 
     logging.info('Logging throughput for the RPC requests')
     with open('%s_throughput.log' % name, 'w') as fp:
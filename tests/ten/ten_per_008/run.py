@@ -1,64 +1,105 @@
 import os, time, secrets, math, re
-import numpy as np
 from web3 import Web3
 from datetime import datetime
-from collections import OrderedDict
 from pysys.constants import PASSED, FAILED
 from ten.test.basetest import TenNetworkTest
 from ten.test.utils.gnuplot import GnuplotHelper
+from ten.test.utils.histogram import LatencyHistogram
+from ten.test.utils.analysis import Throughput
+from ten.test.load.search import SaturationSearch
 
 
 class PySysTest(TenNetworkTest):
-    ITERATIONS = 2*1024  # iterations per client
+    ITERATIONS = 2*1024         # iterations per client
+    CLIENTS = [1,2,4,8,16,20]   # numbers of clients to run for, unless searching
+    SEARCH = False              # search for the maximum sustainable throughput rather than run for a fixed set
+    MAX_CLIENTS = 64            # maximum number of clients when searching
+    LATENCY_SLO = 1.0           # p99 latency in seconds above which a number of clients is not sustainable
+    ERROR_SLO = 0.05            # ratio of failures above which a number of clients is not sustainable
+
+    def __init__(self, descriptor, outsubdir, runner):
+        super().__init__(descriptor, outsubdir, runner)
+        self.latency = None
 
     def execute(self):
         # connect to the network and determine constants and funds required to run the test
         network = self.get_network_connection()
 
-        # run the clients and wait for their completion
-        results = []
+        # run the clients and wait for their completion, either for each number of clients or searching over them
+        results = {}
+        if self.SEARCH:
+            search = SaturationSearch(lambda clients: self.run_clients(network, clients, results, check=False),
+                                      start=1, maximum=self.MAX_CLIENTS, error_ratio=self.ERROR_SLO,
+                                      latency=self.LATENCY_SLO, log=self.log)
+            best = search.run()
+        else:
+            for clients in self.CLIENTS: self.run_clients(network, clients, results)
+
         results_file = os.path.join(self.output, 'results.log')
         with open(results_file, 'w') as fp:
-            for clients in [1,2,4,8,16,20]:
-                self.log.info(' ')
-                self.log.info('Running for %d clients' % clients)
-                out_dir = os.path.join(self.output, 'clients_%d' % clients)
-                start_ns = time.perf_counter_ns()
-                signal = os.path.join(out_dir, '.signal')
-                for i in range(0, clients):
-                    self.run_client('client_%s' % i, network, self.ITERATIONS, start_ns, out_dir, signal)
-
-                with open(signal, 'w') as sig: sig.write('go')
-                for i in range(0, clients):
-                    self.waitForGrep(file=os.path.join(out_dir, 'client_%s.out' % i),
-                                     expr='Client client_%s completed' % i, timeout=300)
-                    self.ratio_failures(file=os.path.join(out_dir, 'client_%s.out' % i))
-
-                end_ns = time.perf_counter_ns()
-                bulk_throughput = float(clients * self.ITERATIONS) / float((end_ns-start_ns)/1e9)
-                avg_latency, mode_latency = self.process_latency(clients, out_dir)
-                throughput = self.process_throughput(clients, out_dir, start_ns, end_ns)
-                self.log.info('Bulk rate throughput %.2f (requests/sec)' % bulk_throughput)
-                self.log.info('Approx. throughput %.2f (requests/sec)' % throughput)
-                self.log.info('Average latency %.2f (ms)' % avg_latency)
-                self.log.info('Modal latency %.2f (ms)' % mode_latency)
+            for clients in sorted(results.keys()):
+                throughput, avg_latency, mode_latency, _ = results[clients]
                 fp.write('%d %.2f %.2f %.2f\n' % (clients, throughput, avg_latency, mode_latency))
-                results.append(throughput)
-
-                # graph the output for the single run of 4 clients
-                if clients == 4:
-                    throughput_4_clients = throughput
-                    self.graph_four_clients(throughput, avg_latency, mode_latency)
 
         # plot the summary graph
-        self.graph_all_clients(throughput_4_clients)
-
-        # persist the result (average of the last three clients)
-        self.results_db.insert_result(self.descriptor.id, self.mode, int(time.time()), '%.2f' % (sum(results[-3:])/3.0))
+        if 4 in results: self.graph_all_clients(results[4][0])
+
+        # persist the result, either the maximum sustainable throughput or the average of the last three clients
+        if self.SEARCH:
+            if best is None:
+                self.addOutcome(FAILED, outcomeReason='No number of clients is sustainable within the objectives')
+                return
+            percentiles = best.latency.percentiles()
+            self.log.info('Maximum sustainable throughput %.2f (requests/sec) with %d clients' %
+                          (best.throughput, best.load))
+            self.log.info('Latency at maximum p50 %.2f, p99 %.2f, max %.2f (ms)' %
+                          (1000*percentiles['p50'], 1000*percentiles['p99'], 1000*percentiles['max']))
+            self.results_db.insert_result(self.descriptor.id, self.mode, int(time.time()), '%.2f' % best.throughput)
+            self.results_db.insert_latency(self.descriptor.id, self.mode, int(time.time()), best.latency)
+        else:
+            throughputs = [results[clients][0] for clients in self.CLIENTS]
+            self.results_db.insert_result(self.descriptor.id, self.mode, int(time.time()),
+                                          '%.2f' % (sum(throughputs[-3:])/3.0))
+            self.results_db.insert_latency(self.descriptor.id, self.mode, int(time.time()), self.latency)
 
         # passed if no failures (though pdf output should be reviewed manually)
         self.addOutcome(PASSED)
 
+    def run_clients(self, network, clients, results, check=True):
+        """Run a number of concurrent clients, returning the throughput, ratio of failures and latency histogram.
+
+        Failures are only checked against the threshold for the test outcome if check is true.
+        """
+        self.log.info(' ')
+        self.log.info('Running for %d clients' % clients)
+        out_dir = os.path.join(self.output, 'clients_%d' % clients)
+        start_ns = time.perf_counter_ns()
+        signal = os.path.join(out_dir, '.signal')
+        for i in range(0, clients):
+            self.run_client('client_%s' % i, network, self.ITERATIONS, start_ns, out_dir, signal)
+
+        with open(signal, 'w') as sig: sig.write('go')
+        ratios = []
+        for i in range(0, clients):
+            self.waitForGrep(file=os.path.join(out_dir, 'client_%s.out' % i),
+                             expr='Client client_%s completed' % i, timeout=300)
+            file = os.path.join(out_dir, 'client_%s.out' % i)
+            ratios.append(self.ratio_failures(file=file) if check else self.get_ratio_failures(file))
+
+        end_ns = time.perf_counter_ns()
+        bulk_throughput = float(clients * self.ITERATIONS) / float((end_ns-start_ns)/1e9)
+        avg_latency, mode_latency = self.process_latency(clients, out_dir)
+        throughput = self.process_throughput(clients, out_dir, start_ns, end_ns)
+        self.log.info('Bulk rate throughput %.2f (requests/sec)' % bulk_throughput)
+        self.log.info('Approx. throughput %.2f (requests/sec)' % throughput)
+        self.log.info('Average latency %.2f (ms)' % avg_latency)
+        self.log.info('Modal latency %.2f (ms)' % mode_latency)
+        results[clients] = (throughput, avg_latency, mode_latency, self.latency)
+
+        # graph the output for the single run of 4 clients
+        if clients == 4: self.graph_four_clients(throughput, avg_latency, mode_latency)
+        return throughput, sum(ratios) / len(ratios), self.latency
+
     def run_client(self, name, network, num_iterations, start, out_dir, signal_file):
         pk = secrets.token_hex(32)
         account = Web3().eth.account.from_key(pk)
@@ -80,54 +121,39 @@ class PySysTest(TenNetworkTest):
         self.waitForSignal(file=stdout, expr='Starting client %s' % name)
 
     def process_latency(self, num_clients, out_dir):
-        data = []
+        """Merge the client latency histograms, returning the average and modal latency in ms.
+
+        The merged histogram is retained so that the percentiles of the final run are persisted. As the clients are
+        closed loop with no intended interval between requests, the histogram is not corrected for coordinated omission.
+        """
+        histogram = LatencyHistogram()
         for i in range(0, num_clients):
-            with open(os.path.join(out_dir, 'client_%s_latency.log' % i), 'r') as fp:
-                for line in fp.readlines(): data.append(float(line.strip()))
-        data.sort()
-        avg_latency = (sum(data) / len(data))
+            histogram.merge(LatencyHistogram.read(os.path.join(out_dir, 'client_%s_latency.hdr' % i)))
+        for name, value in histogram.percentiles().items(): self.log.info('Latency %s %.2f (ms)' % (name, 1000*value))
+        self.latency = histogram
 
-        bins = self.bin_array(data)
         max_value = 0
         mode_latency = 0
         with open(os.path.join(out_dir, 'binned_latency.log'), 'w') as fp:
-            for b,v in bins:
+            for b,v in histogram.bins(num_bins=40):
                 if v > max_value:
                     max_value = v
-                    mode_latency = b
-                fp.write('%.2f %d\n' % (b, v))
+                    mode_latency = 1000*b
+                fp.write('%.2f %d\n' % (1000*b, v))
             fp.flush()
-        return avg_latency, mode_latency
+        return 1000*histogram.mean(), mode_latency
 
     def process_throughput(self, num_clients, out_dir, start, end):
-        client_bins = []       # bins for a given client
-        bins = OrderedDict()   # total binned data across all clients
-        for x in range(0, int((end-start)/1e9) + 1): bins[x] = 0
-        for i in range(0, num_clients):
-            client_times = []
-            with open(os.path.join(out_dir, 'client_%s_throughput.log' % i), 'r') as fp:
-                for line in fp.readlines():
-                    time = math.floor(float(line.strip().split()[0]))
-                    client_times.append(time)
-                    bins[time] = bins[time]+1
-                client_bins.append(client_times)
-
-        # reduce to the overlap and find best zero gradient fit
-        included = self.find_overlap(client_bins)
-        bins_steady = {key: value for key, value in bins.items() if key in included}
-        bins_ramp = {key: value for key, value in bins.items() if key not in included}
-        throughput = self.find_best_fit(bins_steady)
-
-        with open(os.path.join(out_dir, 'binned_throughput_all.log'), 'w') as fp:
-            for t in bins.keys(): fp.write('%d %d\n' % (t, bins[t]))
+        """Bin the client request times, writing the binned data and returning the steady state throughput. """
+        files = [os.path.join(out_dir, 'client_%s_throughput.log' % i) for i in range(0, num_clients)]
+        throughput = Throughput.load(files, column=0, start=0)
+        rate, interval = throughput.interval()
+        self.log.info('Steady state throughput %.2f +/- %.2f (requests/sec)' % (rate, interval))
 
-        with open(os.path.join(out_dir, 'binned_throughput_steady.log'), 'w') as fp:
-            for t in bins_steady.keys(): fp.write('%d %d %.2f\n' % (t, bins_steady[t], throughput))
-
-        with open(os.path.join(out_dir, 'binned_throughput_ramp.log'), 'w') as fp:
-            for t in bins_ramp.keys(): fp.write('%d %d\n' % (t, bins_ramp[t]))
-
-        return throughput
+        throughput.write_total(os.path.join(out_dir, 'binned_throughput_all.log'))
+        throughput.write_steady(os.path.join(out_dir, 'binned_throughput_steady.log'))
+        throughput.write_ramp(os.path.join(out_dir, 'binned_throughput_ramp.log'))
+        return rate
 
     def graph_four_clients(self, throughput, avg_latency, mode_latency):
         branch = GnuplotHelper.buildInfo().branch
@@ -139,33 +165,3 @@ class PySysTest(TenNetworkTest):
         branch = GnuplotHelper.buildInfo().branch
         date = datetime.now().strftime('%Y/%m/%d %H:%M:%S')
         GnuplotHelper.graph(self, os.path.join(self.input, 'all_clients.in'), branch, date, str(self.mode), '%.2f' % throughput)
-
-    def bin_array(self, data, num_bins=40):
-        min_val = min(data)
-        max_val = max(data)
-        bin_width = (max_val - min_val) / num_bins
-        bin_counts = [0] * num_bins
-
-        for val in data:
-            bin_index = min(int((val - min_val) / bin_width), num_bins - 1)
-            bin_counts[bin_index] += 1
-
-        bins = []
-        for i in range(num_bins):
-            bin_start = min_val + i * bin_width
-            bins.append((bin_start, bin_counts[i]))
-
-        return bins
-
-    def find_overlap(self, lists):
-        if len(lists) == 0: return []
-        overlap = np.array(lists[0])
-        for l in lists[1:]: overlap = np.intersect1d(overlap, np.array(l))
-        return overlap.tolist()[1:-1]
-
-    def find_best_fit(self, data):
-        x_values = np.array(np.array(list(data.keys())))
-        y_values = np.array(np.array(list(data.values())))
-        coeffs = np.polyfit(x_values, y_values, deg=0)
-        best_fit_y_values = np.full_like(y_values, fill_value=coeffs[0])
-        return best_fit_y_values[0]
@@ -1,6 +1,7 @@
 from web3 import Web3
 import secrets, time, os
 import logging, random, argparse, sys
+from ten.test.networks.timings import TimingCollector
 
 logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', stream=sys.stdout, level=logging.INFO)
 
@@ -33,37 +34,35 @@ def run(name, chainId, web3, account, num_accounts, num_iterations, amount, gas_
         scale = scale + increment
 
     logging.info('Bulk sending transactions to the network')
-    receipts = []
+    start = web3.eth.block_number
+    tx_hashes = []
     stats = [0,0]
     for tx in txs:
         try:
-            receipt = web3.eth.send_raw_transaction(tx[0].rawTransaction)
-            receipts.append((receipt, tx[1]))
+            tx_hashes.append(web3.eth.send_raw_transaction(tx[0].rawTransaction))
             logging.info('Sent %d', tx[1])
             stats[0] += 1
         except Exception as e:
-            logging.info('Error sending raw transaction, sent = %d', len(receipts))
+            logging.info('Error sending raw transaction, sent = %d', len(tx_hashes))
             logging.error(e)
             stats[1] += 1
 
     logging.info('Waiting for transactions')
-    for receipt in receipts:
-        try:
-            web3.eth.wait_for_transaction_receipt(receipt[0], timeout=30)
-            logging.info('Received tx receipt for %d' % receipt[1])
-            stats[0] += 1
-        except Exception as e:
-            logging.error('Timedout waiting for %d' % receipt[1])
-            logging.error(e)
-            stats[1] += 1
+    collector = TimingCollector(web3.provider.endpoint_uri)
+    missing = collector.collect(tx_hashes, start, timeout=30)
+    for tx_hash in missing: logging.error('Timedout waiting for %s' % tx_hash)
+    stats[0] += len(tx_hashes) - len(missing)
+    stats[1] += len(missing)
     logging.warning('Ratio failures = %.2f',  float(stats[1]) / sum(stats))
+    logging.info('Timing collector made %d requests over %d blocks', collector.requests, len(collector.blocks))
+    fill = collector.fill(tx_hashes)
+    logging.info('Transactions per block mean %.2f max %d over %d blocks', fill['mean'], fill['max'], fill['blocks'])
 
     logging.info('Logging the timestamps of each transaction')
     with open('%s_throughput.log' % name, 'w') as fp:
-        for receipt in receipts:
-            block_number_deploy = web3.eth.get_transaction(receipt[0]).blockNumber
-            timestamp = int(web3.eth.get_block(block_number_deploy).timestamp)
-            fp.write('%d\n' % timestamp)
+        for tx_hash in tx_hashes:
+            inclusion = collector.inclusion(tx_hash)
+            if inclusion is not None: fp.write('%d\n' % inclusion.timestamp)
 
     logging.info('Client %s completed', name)
     logging.shutdown()
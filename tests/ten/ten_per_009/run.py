@@ -1,15 +1,19 @@
 import os, time, secrets, sys, re
-import numpy as np
 from datetime import datetime
-from collections import OrderedDict
 from pysys.constants import PASSED, FAILED
 from ten.test.basetest import TenNetworkTest
 from ten.test.utils.gnuplot import GnuplotHelper
+from ten.test.utils.analysis import Throughput
+from ten.test.load.search import SaturationSearch
 
 
 class PySysTest(TenNetworkTest):
     ITERATIONS = 1024      # iterations per client
     ACCOUNTS = 8           # number of different accounts that receive the funds per client
+    CLIENTS = [2,3,4]      # numbers of clients to run for, unless searching
+    SEARCH = False         # search for the maximum sustainable throughput rather than run for a fixed set
+    MAX_CLIENTS = 32       # maximum number of clients when searching
+    ERROR_SLO = 0.05       # ratio of failures above which a number of clients is not sustainable
 
     def __init__(self, descriptor, outsubdir, runner):
         super().__init__(descriptor, outsubdir, runner)
@@ -35,48 +39,72 @@ class PySysTest(TenNetworkTest):
             funds_needed = funds_needed + (self.gas_price*(int(scale*self.gas_limit)) + self.value)
             scale = scale + increment
 
-        # run the clients and wait for their completion
+        # run the clients and wait for their completion, either for each number of clients or searching over them
+        results = {}
+        funds = web3.from_wei(1.1*funds_needed, 'ether')
+        if self.SEARCH:
+            search = SaturationSearch(lambda clients: self.run_clients(clients, funds, results, check=False),
+                                      start=2, maximum=self.MAX_CLIENTS, error_ratio=self.ERROR_SLO, log=self.log)
+            best = search.run()
+        else:
+            for clients in self.CLIENTS: self.run_clients(clients, funds, results)
+
         results_file = os.path.join(self.output, 'results.log')
         with open(results_file, 'w') as fp:
-            for clients in [2,3,4]:
-                self.log.info(' ')
-                self.log.info('Running for %d clients' % clients)
-
-                out_dir = os.path.join(self.output, 'clients_%d' % clients)
-                signal = os.path.join(out_dir, '.signal')
-                for i in range(0, clients):
-                    self.run_client('client_%s' % i, 1.1*funds_needed, out_dir, signal)
-
-                start_ns = time.perf_counter_ns()
-                with open(signal, 'w') as sig: sig.write('go')
-                for i in range(0, clients):
-                    self.waitForGrep(file=os.path.join(out_dir, 'client_%s.out' % i),
-                                     expr='Client client_%s completed' % i, timeout=300)
-                    self.ratio_failures(file=os.path.join(out_dir, 'client_%s.out' % i))
-                end_ns = time.perf_counter_ns()
-
-                bulk_throughput = float(clients * self.ITERATIONS) / float((end_ns - start_ns) / 1e9)
-                throughput = self.process_throughput(clients, out_dir)
-                self.log.info('Bulk rate throughput %.2f (requests/sec)' % bulk_throughput)
-                self.log.info('Approx. throughput %.2f (requests/sec)' % throughput)
-                fp.write('%d %.2f\n' % (clients, throughput))
-
-                # persist the result
-                if clients == 4:
-                    self.results_db.insert_result(self.descriptor.id, self.mode, int(time.time()), '%.2f' % throughput)
+            for clients in sorted(results.keys()): fp.write('%d %.2f\n' % (clients, results[clients]))
+
+        # persist the result, either the maximum sustainable throughput or the throughput for 4 clients
+        if self.SEARCH:
+            if best is None:
+                self.addOutcome(FAILED, outcomeReason='No number of clients is sustainable within the objectives')
+                return
+            self.log.info('Maximum sustainable throughput %.2f (requests/sec) with %d clients' %
+                          (best.throughput, best.load))
+            self.results_db.insert_result(self.descriptor.id, self.mode, int(time.time()), '%.2f' % best.throughput)
+        else:
+            self.results_db.insert_result(self.descriptor.id, self.mode, int(time.time()), '%.2f' % results[4])
 
         # plot the summary graph
-        self.graph_all_clients()
+        if 3 in results and 4 in results: self.graph_all_clients()
 
         # passed if no failures (though pdf output should be reviewed manually)
         self.addOutcome(PASSED)
 
-    def run_client(self, name, funds_needed, out_dir, signal_file):
-        """Run a background load client. """
-        pk = secrets.token_hex(32)
+    def run_clients(self, clients, funds, results, check=True):
+        """Run a number of concurrent clients, returning the throughput and ratio of failures.
+
+        Failures are only checked against the threshold for the test outcome if check is true.
+        """
+        self.log.info(' ')
+        self.log.info('Running for %d clients' % clients)
+
+        out_dir = os.path.join(self.output, 'clients_%d' % clients)
+        signal = os.path.join(out_dir, '.signal')
+        pks = self.get_ephemeral_keys(clients, funds)
+        for i in range(0, clients):
+            self.run_client('client_%s' % i, pks[i], out_dir, signal)
+
+        start_ns = time.perf_counter_ns()
+        with open(signal, 'w') as sig: sig.write('go')
+        ratios = []
+        for i in range(0, clients):
+            self.waitForGrep(file=os.path.join(out_dir, 'client_%s.out' % i),
+                             expr='Client client_%s completed' % i, timeout=300)
+            file = os.path.join(out_dir, 'client_%s.out' % i)
+            ratios.append(self.ratio_failures(file=file) if check else self.get_ratio_failures(file))
+        end_ns = time.perf_counter_ns()
+
+        bulk_throughput = float(clients * self.ITERATIONS) / float((end_ns - start_ns) / 1e9)
+        throughput = self.process_throughput(clients, out_dir)
+        self.log.info('Bulk rate throughput %.2f (requests/sec)' % bulk_throughput)
+        self.log.info('Approx. throughput %.2f (requests/sec)' % throughput)
+        results[clients] = throughput
+        return throughput, sum(ratios) / len(ratios), None
+
+    def run_client(self, name, pk, out_dir, signal_file):
+        """Run a background load client using a funded account. """
         network = self.get_network_connection()
-        web3, account = network.connect(self, private_key=pk, check_funds=False)
-        self.distribute_native(account, web3.from_wei(funds_needed, 'ether'))
+        network.connect(self, private_key=pk, check_funds=False)
 
         if not os.path.exists(out_dir): os.mkdir(out_dir)
         stdout = os.path.join(out_dir, '%s.out' % name)
@@ -96,60 +124,20 @@ class PySysTest(TenNetworkTest):
         self.waitForSignal(file=stdout, expr='Starting client %s' % name)
 
     def process_throughput(self, num_clients, out_dir):
-        # store the binned data for each client and the timestamps
-        start_time = sys.maxsize
-        end_time = 0
-        throughput = 0
-        list_client_bins = []
-        list_client_times = []
-        for i in range(0, num_clients):
-            client_bins = OrderedDict()
-            with open(os.path.join(out_dir, 'client_%s_throughput.log' % i), 'r') as fp:
-                for line in fp.readlines():
-                    timestamp = int(line.strip())
-                    if timestamp < start_time: start_time = timestamp
-                    if timestamp > end_time: end_time = timestamp
-                    if timestamp not in client_bins: client_bins[timestamp] = 0
-                    else: client_bins[timestamp] = client_bins[timestamp] + 1
-                list_client_bins.append(client_bins)
-                list_client_times.append(list(client_bins.keys()))
-
-        # bin the data
-        bins = OrderedDict()
-        for x in range(start_time, end_time + 1): bins[x] = 0
-        for client_bins in list_client_bins:
-            for timestamp in client_bins.keys():
-                bins[timestamp] = bins[timestamp] + client_bins[timestamp]
-
-        # reduce to the overlap and find best zero gradient fit
-        min, max = self.find_overlap(list_client_times)
-        included = [i for i in range(min, max+1, 1)]
-        if len(included) > 0:
-            bins_steady = {key: value for key, value in bins.items() if key in included}
-            bins_ramp = {key: value for key, value in bins.items() if key not in included}
-            throughput = float(sum(bins_steady.values())) / float((included[-1] - included[0]))
-
-            with open(os.path.join(out_dir, 'binned_throughput_all.log'), 'w') as fp:
-                for t in bins.keys(): fp.write('%d %d\n' % (t-start_time, bins[t]))
-
-            with open(os.path.join(out_dir, 'binned_throughput_steady.log'), 'w') as fp:
-                for t in bins_steady.keys(): fp.write('%d %d %.2f\n' % (t-start_time, bins_steady[t], throughput))
-
-            with open(os.path.join(out_dir, 'binned_throughput_ramp.log'), 'w') as fp:
-                for t in bins_ramp.keys(): fp.write('%d %d\n' % (t-start_time, bins_ramp[t]))
+        """Bin the client transaction timestamps, writing the binned data and returning the steady state throughput. """
+        files = [os.path.join(out_dir, 'client_%s_throughput.log' % i) for i in range(0, num_clients)]
+        throughput = Throughput.load(files, column=0)
+        rate, interval = throughput.interval()
+        if throughput.last > throughput.first:
+            self.log.info('Steady state throughput %.2f +/- %.2f (requests/sec)' % (rate, interval))
+            throughput.write_total(os.path.join(out_dir, 'binned_throughput_all.log'))
+            throughput.write_steady(os.path.join(out_dir, 'binned_throughput_steady.log'))
+            throughput.write_ramp(os.path.join(out_dir, 'binned_throughput_ramp.log'))
         else:
             self.log.warn('No overlap of all clients detected')
-
-        return throughput
+        return rate
 
     def graph_all_clients(self):
         branch = GnuplotHelper.buildInfo().branch
         date = datetime.now().strftime('%Y/%m/%d %H:%M:%S')
         GnuplotHelper.graph(self, os.path.join(self.input, 'gnuplot.in'), branch, date, str(self.mode))
-
-    def find_overlap(self, lists):
-        if len(lists) == 0: return []
-        overlap = np.array(lists[0])
-        for l in lists[1:]: overlap = np.intersect1d(overlap, np.array(l))
-        return overlap.tolist()[0], overlap.tolist()[-1]
-
@@ -28,8 +28,8 @@ class PySysTest(TenNetworkTest):
         for i in range(0, self.NUM_HAMMERS): self.hammer(network, secrets.token_hex(32), i)
 
         # perform some transactions
-        for i in range(0, self.NUM_TRANSACTIONS):
-            network.transact(self, web3, storage.contract.functions.store(i), account, storage.GAS_LIMIT)
+        targets = [storage.contract.functions.store(i) for i in range(0, self.NUM_TRANSACTIONS)]
+        network.transact_many(self, web3, targets, account, storage.GAS_LIMIT)
 
         # all permanent subscribers should see all events - note waitForGrep does not apply a PASSED result if
         # successful (will apply FAILED if timedout), so explicitly do this so the test is verified with a result
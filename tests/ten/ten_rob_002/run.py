@@ -17,7 +17,6 @@ class PySysTest(TenNetworkTest):
     def __init__(self, descriptor, outsubdir, runner):
         super().__init__(descriptor, outsubdir, runner)
         self.clients = []
-        self.client_connections = []
 
     def execute(self):
         # connect to the network on the primary gateway
@@ -25,7 +24,6 @@ class PySysTest(TenNetworkTest):
         web3, account = network.connect_account1(self)
 
         # deploy the contracts and create a new connection on the primary gateway for each client
-        funders = [secrets.token_hex() for _ in range(0, self.NUM_FUNDS)]
         funders_connection = self.get_network_connection()
 
         guesser = Guesser(self, web3, 0, 100)
@@ -40,16 +38,20 @@ class PySysTest(TenNetworkTest):
         error.deploy(network, account)
         error_connection = self.get_network_connection()
 
+        # get funded ephemeral accounts for the funds and storage clients, reusing those from earlier runs
+        keys = self.get_ephemeral_keys(self.NUM_FUNDS + self.NUM_STORAGE, network.ETH_ALLOC_EPHEMERAL)
+        funders, storers = keys[:self.NUM_FUNDS], keys[self.NUM_FUNDS:]
+
         # create the clients and get them running concurrently
         for i in range(0, len(funders)):
             recipients = [Web3().eth.account.from_key(x).address for x in funders if x != funders[i]]
-            self.funds_client(network, funders[i], recipients, i, funders_connection)
+            self.funds_client(funders[i], recipients, i, funders_connection)
 
         for i in range(0, self.NUM_GUESSERS):
             self.guesser_client(guesser.address, guesser.abi_path, i, guesser_connection)
 
         for i in range(0, self.NUM_STORAGE):
-            self.storage_client(storage.address, storage.abi_path, i, storage_connection)
+            self.storage_client(storage.address, storage.abi_path, i, storage_connection, storers[i])
 
         for i in range(0, self.NUM_ERROR):
             self.error_client(error.address, error.abi_path, i, error_connection)
@@ -66,9 +68,8 @@ class PySysTest(TenNetworkTest):
         self.log.info('Call shows value %d', storage.contract.functions.retrieve().call())
         self.assertTrue(value == 1812)
 
-    def funds_client(self, network, pk, recipients, num, funders_connection):
-        web3, account = funders_connection.connect(self, private_key=pk, check_funds=False)
-        self.distribute_native(account, network.ETH_ALLOC_EPHEMERAL)
+    def funds_client(self, pk, recipients, num, funders_connection):
+        funders_connection.connect(self, private_key=pk, check_funds=False)
 
         stdout = os.path.join(self.output, 'funds_%d.out' % num)
         stderr = os.path.join(self.output, 'funds_%d.err' % num)
@@ -81,20 +82,16 @@ class PySysTest(TenNetworkTest):
         self.waitForGrep(file=stdout, expr='Client running', timeout=10)
 
     def guesser_client(self, address, abi_path, num, network):
-        self._client(address, abi_path, 'guesser_client', num, network, False)
+        self._client(address, abi_path, 'guesser_client', num, network, secrets.token_hex(32))
 
-    def storage_client(self, address, abi_path, num, network):
-        self._client(address, abi_path, 'storage_client', num, network)
+    def storage_client(self, address, abi_path, num, network, pk):
+        self._client(address, abi_path, 'storage_client', num, network, pk)
 
     def error_client(self, address, abi_path, num, network):
-        self._client(address, abi_path, 'error_client', num, network, False)
+        self._client(address, abi_path, 'error_client', num, network, secrets.token_hex(32))
 
-    def _client(self, address, abi_path, name, num, network, fund=True):
-        pk = secrets.token_hex(32)
-        web3, account = network.connect(self, private_key=pk, check_funds=False)
-        if fund:
-            self.distribute_native(account, network.ETH_ALLOC_EPHEMERAL)
-            self.client_connections.append((web3, account, network))
+    def _client(self, address, abi_path, name, num, network, pk):
+        network.connect(self, private_key=pk, check_funds=False)
 
         stdout = os.path.join(self.output, '%s_%d.out' % (name, num))
         stderr = os.path.join(self.output, '%s_%d.err' % (name, num))
@@ -108,7 +105,6 @@ class PySysTest(TenNetworkTest):
         self.waitForGrep(file=stdout, expr='Client running', timeout=10)
 
     def _stop_and_drain(self):
-        self.log.info('Stopping all concurrent clients and drain accounts')
-        for client in self.clients: client.stop()
-        # for web3, account, network in self.client_connections:
-        #      self.drain_native(web3, account, network)
\ No newline at end of file
+        # remaining funds in the ephemeral accounts are recorded on cleanup and drained by the runner
+        self.log.info('Stopping all concurrent clients')
+        for client in self.clients: client.stop()
\ No newline at end of file